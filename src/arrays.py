@@ -0,0 +1,126 @@
+from collections.abc import Callable
+from operator import add, floordiv, mul, pow, sub, truediv
+
+"""
+Element-wise counterparts of the interpreter's arithmetic and builtins
+for `ValueType.ARRAY` values.  They follow the scalar semantics where
+NumPy's differ: division by zero raises instead of producing inf/nan,
+and integers raised to negative integer powers give floats.  Integer
+arrays are int64; an operation on them that could overflow, or that a
+bits budget limits, is computed element by element on Python ints with
+the interpreter's own operator, into an array of objects.  So are
+negative bases raised to fractional powers, which give complex numbers.
+
+NumPy is optional; without it `ndarray` matches nothing and arrays
+cannot be created.
+"""
+
+try:
+    import numpy
+    from numpy import ndarray
+except ImportError:
+    numpy = None
+    class ndarray:
+        __slots__ = ()
+
+def _is_integer(x: object) -> bool:
+    return isinstance(x, int) or isinstance(x, ndarray) and x.dtype.kind in "iu"
+
+def asarray(x: object) -> int | float | ndarray:
+    if isinstance(x, int | float | ndarray):
+        return x
+    if numpy is None:
+        raise TypeError(f"expected a number, got {x!r}")
+    x = numpy.asarray(x)
+    if x.dtype.kind not in "iuf":
+        raise TypeError(f"expected numbers, got {x.dtype}")
+    return x if x.ndim else x.item()
+
+def _is_object(x: object) -> bool:
+    return isinstance(x, ndarray) and x.dtype.kind == "O"
+
+# int64 holds results of at most this many bits
+_BITS = 63
+
+# the largest absolute value in `x`, as a Python int
+def _magnitude(x: int | ndarray) -> int:
+    if isinstance(x, ndarray):
+        return max(-int(x.min()), int(x.max())) if x.size else 0
+    return abs(x)
+
+# whether op(lhs, rhs) of integers could overflow int64, `rhs` is not negative for `pow`
+def _overflows(op: Callable[[object, object], object], lhs: int | ndarray, rhs: int | ndarray) -> bool:
+    m, n = _magnitude(lhs), _magnitude(rhs)
+    if op is add or op is sub:
+        return (m + n).bit_length() > _BITS
+    if op is mul:
+        return (m * n).bit_length() > _BITS
+    if op is pow:
+        # m ** n < 2 ** (n * m.bit_length())
+        return m > 1 and n * m.bit_length() > _BITS
+    # only -2**63 // -1
+    return m.bit_length() > _BITS
+
+def _elementwise(op: Callable[[object, object], object], lhs: object, rhs: object) -> ndarray:
+    return numpy.frompyfunc(op, 2, 1)(lhs, rhs)
+
+# `op` is the plain operator, `exact` the interpreter's own for numbers,
+# which checks the bits budget
+def operate(op: Callable[[object, object], object], lhs: object, rhs: object, exact: Callable[[object, object], object]) -> ndarray:
+    if op is truediv or op is floordiv:
+        if numpy.any(rhs == 0):
+            raise ZeroDivisionError("division by zero")
+    if _is_object(lhs) or _is_object(rhs):
+        return _elementwise(exact, lhs, rhs)
+    if _is_integer(lhs) and _is_integer(rhs):
+        if op is pow and numpy.any(rhs < 0):
+            lhs = numpy.asarray(lhs, dtype=float)
+        elif exact is not op or op is not truediv and _overflows(op, lhs, rhs):
+            return _elementwise(exact, lhs, rhs)
+    elif op is pow and numpy.any((lhs < 0) & (rhs % 1 != 0)):
+        return _elementwise(exact, lhs, rhs)
+    return op(lhs, rhs)
+
+def equal(x: object, y: object) -> bool:
+    return bool(numpy.array_equal(x, y))
+
+def maximum(x: object, y: object) -> ndarray:
+    return numpy.where(y < x, x, y)
+
+def minimum(x: object, y: object) -> ndarray:
+    return numpy.where(x < y, x, y)
+
+def all_less(x: object, y: object) -> bool:
+    return bool(numpy.all(x < y))
+
+def clamp(x: object, lo: object, hi: object) -> ndarray:
+    return numpy.where(~(lo < x), lo, numpy.where(~(x < hi), hi, x))
+
+def sign(x: ndarray) -> ndarray:
+    if numpy.any(x == 0):
+        raise ZeroDivisionError("division by zero")
+    return abs(x) // x
+
+def to_int(x: ndarray) -> ndarray:
+    if x.dtype.kind == "O":
+        return numpy.frompyfunc(int, 1, 1)(x)
+    if not numpy.all(numpy.isfinite(x)):
+        raise ValueError("cannot convert non-finite values to integer")
+    return x.astype(numpy.int64)
+
+def to_float(x: ndarray) -> ndarray:
+    return x.astype(numpy.float64)
+
+# `func` applied to all of the float `points` at once, as a list, or None
+# if that raises or does not give one finite number per point
+def evaluate(func: Callable[[ndarray], object], points: list[float]) -> list | None:
+    with numpy.errstate(all="ignore"):
+        try:
+            y = func(numpy.array(points))
+        except Exception:
+            return None
+    if isinstance(y, int | float):
+        return [y] * len(points) if numpy.isfinite(y) else None
+    if not isinstance(y, ndarray) or y.shape != (len(points),) or y.dtype.kind not in "iuf" or not numpy.all(numpy.isfinite(y)):
+        return None
+    return y.tolist()
@@ -0,0 +1,129 @@
+from __future__ import annotations
+from argparse import ArgumentParser
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from compiler import compile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from interpreter import Budget, Interpreter, Value
+from itertools import islice
+from nodes import NodeType
+from parser import Parser
+import os
+import sys
+from tokenizer import Tokenizer
+
+"""
+Evaluates many independent one-line queries against a shared prelude.
+
+The prelude runs once, in the calling process.  Its bindings are pickled
+once per worker process, which evaluates chunks of queries against them;
+chunks are submitted a few at a time, so neither the queries nor the
+results are ever held in memory all at once, and results come back in
+input order.  A query that assigns sees its own assignments, but the
+worker restores the prelude's bindings before the next query.  The
+limits of a `budget` option apply to each query as a whole.
+"""
+
+@dataclass(frozen=True, slots=True)
+class Result:
+    output: str | None # the values left on the stack, space separated
+    error: str | None = None
+
+    def __str__(self) -> str:
+        return f"error: {self.error}" if self.error is not None else self.output
+
+def prepare(prelude: str, **options) -> Interpreter:
+    interpreter = Interpreter(**options)
+    for statement in Parser(Tokenizer(prelude)):
+        interpreter.execute(compile(statement, compact=True))
+    interpreter.take_stack()
+    return interpreter
+
+# `restore` undoes the assignments of a query that made any
+def evaluate_query(interpreter: Interpreter, query: str, restore: Callable[[], object]) -> Result:
+    assigned = False
+    try:
+        with interpreter.evaluation():
+            for statement in Parser(Tokenizer(query)):
+                assigned |= statement.type in (NodeType.ASSIGNMENT, NodeType.DEFINITION)
+                interpreter.execute(compile(statement, compact=True))
+        return Result(" ".join(map(str, interpreter.take_stack())))
+    # besides the language's errors, a query may run into MemoryError, and
+    # ints too long for str() raise ValueError; none of them stop the batch
+    except Exception as e:
+        interpreter.take_stack()
+        return Result(None, f"{type(e).__name__}: {e}")
+    finally:
+        if assigned:
+            restore()
+
+# state of a worker process
+_interpreter: Interpreter | None = None
+_restore: Callable[[], object] | None = None
+
+def _initialize(bindings: dict[str, Value], options: dict):
+    global _interpreter, _restore
+    _interpreter = Interpreter(**options)
+    _interpreter.rebind(bindings)
+    _restore = partial(_interpreter.rebind, bindings)
+
+def _evaluate_chunk(queries: list[str]) -> list[Result]:
+    return [evaluate_query(_interpreter, q, _restore) for q in queries]
+
+def _chunks(queries: Iterable[str], size: int) -> Iterator[list[str]]:
+    queries = iter(queries)
+    while chunk := list(islice(queries, size)):
+        yield chunk
+
+# `workers` defaults to the number of CPUs, 1 evaluates in this process
+def evaluate(prelude: str, queries: Iterable[str], workers: int | None = None, chunk_size: int = 1000, **options) -> Iterator[Result]:
+    interpreter = prepare(prelude, **options)
+    bindings = interpreter.bindings()
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        restore = partial(interpreter.rebind, bindings)
+        for q in queries:
+            yield evaluate_query(interpreter, q, restore)
+        return
+    with ProcessPoolExecutor(workers, initializer=_initialize, initargs=(bindings, options)) as pool:
+        pending = deque()
+        for chunk in _chunks(queries, chunk_size):
+            pending.append(pool.submit(_evaluate_chunk, chunk))
+            if len(pending) > 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+# command line options for the limits of a `Budget`, shared with the server
+def add_budget_arguments(parser: ArgumentParser):
+    parser.add_argument("--max-instructions", type=int, default=None, help="instructions run per evaluation")
+    parser.add_argument("--timeout", type=float, default=None, metavar="SECONDS", help="wall-clock time per evaluation")
+    parser.add_argument("--max-depth", type=int, default=None, help="user function calls active at once")
+    parser.add_argument("--max-bits", type=int, default=None, help="size of int results of `*` and `**`")
+
+def budget_from(args) -> Budget | None:
+    limits = args.max_instructions, args.timeout, args.max_depth, args.max_bits
+    return None if limits == (None,) * 4 else Budget(*limits)
+
+def main():
+    parser = ArgumentParser(description="evaluate one query per line against a prelude, in parallel")
+    parser.add_argument("prelude", help="file with definitions to run first")
+    parser.add_argument("queries", nargs="?", default="-", help="file with one query per line, - for stdin")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to the number of CPUs")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="queries sent to a worker at once")
+    parser.add_argument("--native", action="store_true", help="run user functions as native Python functions")
+    parser.add_argument("--memo", type=int, default=0, metavar="SIZE", help="cache results of pure user functions")
+    add_budget_arguments(parser)
+    args = parser.parse_args()
+    with open(args.prelude) as f:
+        prelude = f.read()
+    queries = sys.stdin if args.queries == "-" else open(args.queries)
+    with queries:
+        lines = (line.rstrip("\n") for line in queries)
+        for r in evaluate(prelude, lines, args.workers, args.chunk_size, native=args.native, memo_size=args.memo, budget=budget_from(args)):
+            print(r)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+from __future__ import annotations
+from array import array
+from collections.abc import Iterable, Iterator
+from instructions import Instruction, InstructionType, Operation
+
+"""
+A compact encoding of instruction lists.
+
+Each instruction is one opcode byte, the index of its `InstructionType`,
+and one unsigned 32-bit operand:
+LOAD, STORE          index into `names`
+PARAM, CALL,
+STORE_LOCAL,
+LOAD_LOCAL           the argument itself
+OPERATION,
+ARITHMETIC           index of the `Operation`
+INT, FLOAT, FUNCTION index into `constants`, functions are stored as
+                     `(argc, Code)` so their bodies are compact too
+
+Both pools are deduplicated, which also makes a function's value the same
+object every time its FUNCTION instruction runs.
+"""
+
+TYPES = tuple(InstructionType)
+OPERATIONS = tuple(Operation)
+
+LOAD, STORE, PARAM, CALL, OPERATION, INT, FLOAT, FUNCTION, STORE_LOCAL, LOAD_LOCAL, ARITHMETIC = range(len(TYPES))
+
+_OPCODES = {t: i for i, t in enumerate(TYPES)}
+_OPERATION_INDICES = {o: i for i, o in enumerate(OPERATIONS)}
+
+class Code:
+    __slots__ = "opcodes", "operands", "constants", "names"
+
+    def __init__(self, opcodes: bytes, operands: array, constants: tuple, names: tuple[str, ...]):
+        self.opcodes = opcodes
+        self.operands = operands
+        self.constants = constants
+        self.names = names
+
+    def __len__(self) -> int:
+        return len(self.opcodes)
+
+    def __iter__(self) -> Iterator[Instruction]:
+        return map(self.instruction, range(len(self.opcodes)))
+
+    def __repr__(self) -> str:
+        return f"Code({len(self)} instructions)"
+
+    def instruction(self, index: int) -> Instruction:
+        op, arg = self.opcodes[index], self.operands[index]
+        if op == LOAD or op == STORE:
+            arg = self.names[arg]
+        elif op == OPERATION or op == ARITHMETIC:
+            arg = OPERATIONS[arg]
+        elif op == INT or op == FLOAT or op == FUNCTION:
+            arg = self.constants[arg]
+        return Instruction(TYPES[op], arg)
+
+    def decode(self) -> list[Instruction]:
+        return list(self)
+
+    def nbytes(self) -> int:
+        return len(self.opcodes) + self.operands.itemsize * len(self.operands)
+
+class Assembler:
+    __slots__ = "_opcodes", "_operands", "_constants", "_indices", "_names"
+
+    def __init__(self):
+        self._opcodes = bytearray()
+        self._operands = array("I")
+        self._constants = []
+        self._indices: dict[tuple, int] = {}
+        self._names: dict[str, int] = {}
+
+    def emit(self, type: InstructionType, argument: object):
+        match type:
+            case InstructionType.LOAD | InstructionType.STORE:
+                argument = self._names.setdefault(argument, len(self._names))
+            case InstructionType.OPERATION | InstructionType.ARITHMETIC:
+                argument = _OPERATION_INDICES[argument]
+            case InstructionType.INT | InstructionType.FLOAT | InstructionType.FUNCTION:
+                argument = self.constant(argument)
+        self._opcodes.append(_OPCODES[type])
+        self._operands.append(argument)
+
+    def constant(self, val: object) -> int:
+        # 0.0 and -0.0 are equal but must stay apart, so floats are keyed by
+        # their bits; functions are never merged
+        match val:
+            case float():
+                key = float, val.hex()
+            case tuple():
+                key = tuple, id(val)
+            case _:
+                key = type(val), val
+        if (index := self._indices.get(key)) is None:
+            index = self._indices[key] = len(self._constants)
+            self._constants.append(val)
+        return index
+
+    def assemble(self) -> Code:
+        return Code(bytes(self._opcodes), self._operands, tuple(self._constants), tuple(self._names))
+
+def encode(instructions: Iterable[Instruction]) -> Code:
+    assembler = Assembler()
+    for i in instructions:
+        arg = i.argument
+        if i.type is InstructionType.FUNCTION and not isinstance(arg[1], Code):
+            arg = arg[0], encode(arg[1]), *arg[2:]
+        assembler.emit(i.type, arg)
+    return assembler.assemble()
@@ -0,0 +1,169 @@
+from __future__ import annotations
+from array import array
+from bytecode import Code, FLOAT, FUNCTION, INT, LOAD, OPERATIONS, STORE, TYPES
+from compiler import compile
+from dataclasses import dataclass
+from hashlib import sha256
+import marshal
+import os
+from parser import Parser
+import sys
+from tempfile import mkstemp
+from tokenizer import Tokenizer
+
+"""
+A persistent cache of compiled scripts.
+
+Entries are named after a hash of the source, the compiler options and
+FORMAT_VERSION, and hold the compact `Code` of every statement, encoded
+with `marshal` under a digest of the encoding.  They are written to a
+temporary file in the same directory and renamed into place, so readers
+only ever see complete entries no matter how many processes share the
+directory.  Entries that cannot be read back (unreadable, truncated,
+corrupt, written by another Python or format version) count as misses
+and are replaced.
+"""
+
+# bump whenever the encoding of `Code` or the compiler's output changes;
+# entries also record the opcode and operation tables they were written with
+FORMAT_VERSION = 3
+
+_HEADER = (
+    "calculator-cache", FORMAT_VERSION, marshal.version, sys.byteorder, array("I").itemsize,
+    tuple(t.name for t in TYPES), tuple(o.name for o in OPERATIONS),
+)
+
+@dataclass(slots=True)
+class ScriptCacheStatistics:
+    hits: int = 0
+    misses: int = 0
+    rejected: int = 0 # unreadable entries, also counted as misses
+    writes: int = 0
+
+# All statements and function bodies of a script share one opcode buffer,
+# one operand buffer and one pool of constants, so reading an entry back
+# only slices the buffers.  Statements share one pool of names too, each
+# function has its own, since the interpreter links every name of a body's
+# pool.  Functions are stored as (pool index, argc, start, end, names).
+# Inlined bodies are guarded by the identity of functions from other
+# statements, which does not survive a restart, so they are not stored.
+def _dump(programs: list[Code]) -> tuple:
+    opcodes = bytearray()
+    operands = array("I")
+    constants = []
+    indices = {}
+    functions = []
+    bodies = []
+
+    def constant(val: object) -> int:
+        match val:
+            case float():
+                key = float, val.hex()
+            case tuple() if len(val) > 2:
+                raise ValueError("functions with inlined bodies cannot be cached")
+            case tuple():
+                key = tuple, id(val)
+            case _:
+                key = type(val), val
+        if (index := indices.get(key)) is None:
+            index = indices[key] = len(constants)
+            constants.append(None if key[0] is tuple else val)
+            if key[0] is tuple:
+                bodies.append((index, val))
+        return index
+
+    def append(code: Code, names: dict[str, int]) -> tuple[int, int]:
+        start = len(opcodes)
+        opcodes.extend(code.opcodes)
+        for op, arg in zip(code.opcodes, code.operands):
+            if op == LOAD or op == STORE:
+                arg = names.setdefault(code.names[arg], len(names))
+            elif op == INT or op == FLOAT or op == FUNCTION:
+                arg = constant(code.constants[arg])
+            operands.append(arg)
+        return start, len(opcodes)
+
+    names = {}
+    bounds = tuple(append(code, names) for code in programs)
+    while bodies:
+        index, (argc, body) = bodies.pop()
+        own = {}
+        functions.append((index, argc, *append(body, own), tuple(own)))
+    return bytes(opcodes), operands.tobytes(), tuple(constants), tuple(names), tuple(functions), bounds
+
+def _load(data: tuple) -> list[Code]:
+    opcodes, operands, constants, names, functions, bounds = data
+    operands = array("I", operands)
+    constants = list(constants)
+    codes = []
+    for index, argc, start, end, own in functions:
+        code = Code(opcodes[start:end], operands[start:end], (), own)
+        constants[index] = argc, code
+        codes.append(code)
+    constants = tuple(constants)
+    for code in codes:
+        code.constants = constants
+    return [Code(opcodes[start:end], operands[start:end], constants, names) for start, end in bounds]
+
+def compile_script(text: str, optimize: bool = True) -> list[Code]:
+    return [compile(s, optimize, compact=True) for s in Parser(Tokenizer(text))]
+
+class ScriptCache:
+    __slots__ = "directory", "statistics"
+
+    def __init__(self, directory: str | os.PathLike):
+        self.directory = os.fspath(directory)
+        self.statistics = ScriptCacheStatistics()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, text: str, optimize: bool = True) -> str:
+        key = sha256(f"{FORMAT_VERSION}:{int(optimize)}:".encode())
+        key.update(text.encode())
+        return os.path.join(self.directory, f"{key.hexdigest()}.code")
+
+    def load(self, text: str, optimize: bool = True) -> list[Code]:
+        path = self.path(text, optimize)
+        if (programs := self._read(path)) is not None:
+            self.statistics.hits += 1
+            return programs
+        self.statistics.misses += 1
+        programs = compile_script(text, optimize)
+        try:
+            self._write(path, programs)
+        except OSError:
+            pass # a read-only or full cache directory only costs the next start
+        return programs
+
+    def _read(self, path: str) -> list[Code] | None:
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        except OSError:
+            self.statistics.rejected += 1
+            return None
+        try:
+            header, digest, image = marshal.loads(data)
+            if header != _HEADER or sha256(image).digest() != digest:
+                raise ValueError(header)
+            return _load(marshal.loads(image))
+        # whatever a damaged entry decodes to
+        except Exception:
+            self.statistics.rejected += 1
+            return None
+
+    def _write(self, path: str, programs: list[Code]):
+        image = marshal.dumps(_dump(programs))
+        data = marshal.dumps((_HEADER, sha256(image).digest(), image))
+        fd, temp = mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp, path)
+        except BaseException:
+            os.unlink(temp)
+            raise
+        self.statistics.writes += 1
@@ -1,65 +1,110 @@
+from bytecode import Assembler, Code
+from collections.abc import Iterator
+from inliner import Inlined, Inliner
 from instructions import Instruction, InstructionType, Operation
-from nodes import Node, NodeType
+from itertools import islice
+from nodes import Node, NodeType, Tree
+from inference import specialize as _specialize
+from optimizer import optimize as _optimize, Statistics
+from sharing import share
 
-def compile(node: Node) -> list[Instruction]:
-    match node.type:
-        case NodeType.ASSIGNMENT:
-            name, node = node.data
-            store = Instruction(InstructionType.STORE, name)
-            instructions = compile(node)
-            instructions.append(store)
-            return instructions
-        case NodeType.DEFINITION:
-            name, args, node = node.data
-            store = Instruction(InstructionType.STORE, name)
-            instructions = compile(node)
-            for i, instr in enumerate(instructions):
-                if instr.type is not InstructionType.LOAD:
-                    continue
-                try:
-                    j = args.index(instr.argument)
-                    new = Instruction(InstructionType.PARAM, j)
-                    instructions[i] = new
-                except ValueError:
-                    pass
-            func = (len(args), instructions)
-            func = Instruction(InstructionType.FUNCTION, func)
-            return [func, store]
-        case NodeType.ADDITION:
-            operation = Operation.ADD
-        case NodeType.SUBTRACTION:
-            operation = Operation.SUB
-        case NodeType.MULTIPLICATION:
-            operation = Operation.MULT
-        case NodeType.DIVISION:
-            operation = Operation.DIV
-        case NodeType.IDIVISION:
-            operation = Operation.IDIV
-        case NodeType.NEGATION:
-            instructions = compile(node.data)
-            neg = Instruction(InstructionType.OPERATION, Operation.NEG)
-            instructions.append(neg)
-            return instructions
-        case NodeType.POWER:
-            operation = Operation.POW
-        case NodeType.IDENTIFIER:
-            name = node.data
-            return [Instruction(InstructionType.LOAD, name)]
-        case NodeType.CALL:
-            id, params = node.data
-            instructions = sum(map(compile, params), [])
-            load = Instruction(InstructionType.LOAD, id)
-            call = Instruction(InstructionType.CALL, len(params))
-            return instructions + [load, call]
-        case NodeType.INT:
-            int = node.data
-            int = Instruction(InstructionType.INT, int)
-            return [int]
-        case NodeType.FLOAT:
-            float = node.data
-            float = Instruction(InstructionType.FLOAT, float)
-            return [float]
-    lhs, rhs = map(compile, node.data)
-    lhs += rhs
-    lhs.append(Instruction(InstructionType.OPERATION, operation))
-    return lhs
+_OPERATIONS = {
+    NodeType.ADDITION:       Operation.ADD,
+    NodeType.SUBTRACTION:    Operation.SUB,
+    NodeType.MULTIPLICATION: Operation.MULT,
+    NodeType.DIVISION:       Operation.DIV,
+    NodeType.IDIVISION:      Operation.IDIV,
+    NodeType.POWER:          Operation.POW,
+    NodeType.NEGATION:       Operation.NEG,
+}
+
+# `cse` computes repeated subexpressions once, see sharing.py, and
+# `specialize` skips the checks of operations on numbers, see inference.py
+def compile(node: Node | Tree, optimize: bool = True, statistics: Statistics | None = None, compact: bool = False, inliner: Inliner | None = None, cse: bool = False, specialize: bool = False) -> list[Instruction] | Code:
+    tree = node if node.__class__ is Tree else Tree.of(node)
+    if optimize:
+        tree = _optimize(tree, statistics)
+    if inliner is not None:
+        if tree.type is NodeType.DEFINITION:
+            return _define(tree, inliner, optimize, compact, cse, specialize, statistics)
+        if tree.type is NodeType.ASSIGNMENT:
+            inliner.forget(tree.data[-1])
+    if tree.type is NodeType.DEFINITION:
+        name, params = tree.data[-1]
+        build = _assemble_body if compact else _body
+        func = len(params), build(params, tree, len(tree) - 1, cse, specialize, statistics)
+        instructions = (InstructionType.FUNCTION, func), (InstructionType.STORE, name)
+    else:
+        instructions = _instructions(tree, len(tree), (), cse, statistics)
+    if not compact:
+        return [Instruction(type, arg) for type, arg in instructions]
+    out = Assembler()
+    for type, arg in instructions:
+        out.emit(type, arg)
+    return out.assemble()
+
+def _define(tree: Tree, inliner: Inliner, optimize: bool, compact: bool, cse: bool, specialize: bool, statistics: Statistics | None) -> list[Instruction] | Code:
+    name, params = tree.data[-1]
+    build = _assemble_body if compact else _body
+    func = len(params), build(params, tree, len(tree) - 1, cse, specialize, statistics)
+    body = Tree(tree.types[:-1], tree.data[:-1])
+    inlined, guards = inliner.inline(params, body, optimize)
+    if guards:
+        func += Inlined(guards, (len(params), build(params, inlined, None, cse, specialize))),
+    inliner.define(name, params, inlined, guards, func)
+    if not compact:
+        return [Instruction(InstructionType.FUNCTION, func), Instruction(InstructionType.STORE, name)]
+    out = Assembler()
+    out.emit(InstructionType.FUNCTION, func)
+    out.emit(InstructionType.STORE, name)
+    return out.assemble()
+
+def _assemble_body(params: tuple[str, ...], tree: Tree, stop: int | None = None, cse: bool = False, specialize: bool = False, statistics: Statistics | None = None) -> Code:
+    body = Assembler()
+    for type, arg in _body_instructions(params, tree, stop, cse, specialize, statistics):
+        body.emit(type, arg)
+    return body.assemble()
+
+def _body(params: tuple[str, ...], tree: Tree, stop: int | None = None, cse: bool = False, specialize: bool = False, statistics: Statistics | None = None) -> list[Instruction]:
+    return [Instruction(type, arg) for type, arg in _body_instructions(params, tree, stop, cse, specialize, statistics)]
+
+def _body_instructions(params: tuple[str, ...], tree: Tree, stop: int | None, cse: bool, specialize: bool, statistics: Statistics | None) -> Iterator[tuple[InstructionType, object]]:
+    instructions = _instructions(tree, len(tree) if stop is None else stop, params, cse, statistics)
+    return _specialize(instructions, statistics) if specialize else instructions
+
+# The instructions of the first `stop` nodes, which contain no DEFINITION.
+# Nodes are in postorder, which is already the order a stack machine needs.
+def _instructions(tree: Tree, stop: int, params: tuple[str, ...], cse: bool = False, statistics: Statistics | None = None) -> Iterator[tuple[InstructionType, object]]:
+    stores = loads = None
+    if cse and (sharing := share(tree, stop, params)) is not None:
+        stores, loads = sharing.stores, sharing.loads
+        if statistics is not None:
+            statistics.shared += len(loads)
+    skip = -1 # the last node of a repeated subtree that was loaded instead
+    for i, (type, data) in enumerate(zip(islice(tree.types, stop), tree.data)):
+        if i <= skip:
+            continue
+        if loads and (load := loads.get(i)) is not None:
+            skip, slot = load
+            yield InstructionType.LOAD_LOCAL, slot
+            continue
+        if (operation := _OPERATIONS.get(type)) is not None:
+            yield InstructionType.OPERATION, operation
+        elif type is NodeType.IDENTIFIER:
+            yield _name(data, params)
+        elif type is NodeType.CALL:
+            yield _name(data[0], params)
+            yield InstructionType.CALL, data[1]
+        elif type is NodeType.INT:
+            yield InstructionType.INT, data
+        elif type is NodeType.FLOAT:
+            yield InstructionType.FLOAT, data
+        else: # ASSIGNMENT
+            yield InstructionType.STORE, data
+        if stores and (slot := stores.get(i)) is not None:
+            yield InstructionType.STORE_LOCAL, slot
+
+def _name(name: str, params: tuple[str, ...]) -> tuple[InstructionType, str | int]:
+    if name in params:
+        return InstructionType.PARAM, params.index(name)
+    return InstructionType.LOAD, name
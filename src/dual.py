@@ -0,0 +1,136 @@
+from __future__ import annotations
+from math import log, nan
+from operator import add, sub
+
+"""
+Dual numbers for forward-mode automatic differentiation.
+
+A `Dual` carries a number together with its partial derivatives with
+respect to the parameters of the function being differentiated.  Duals
+support the interpreter's arithmetic and comparisons, so they flow
+through the value stack, native translations and builtins like any
+other number, and a function called with `seed()`ed parameters returns
+its value and its gradient in one run.
+
+Piecewise builtins (`abs`, `min`, `max`, `clamp`, `sign`, `int`) take
+the derivative of the branch they pick, so at a kink it is the
+derivative of the branch chosen for ties.  `//` has derivative 0.  Where
+the derivative itself does not exist, like that of `x**0.5` at 0, the
+power raises ZeroDivisionError; the derivative of `x**y` with respect to
+`y` is nan for negative `x`.
+
+Duals have no `__float__`, so builtins that are not written against
+plain operators raise instead of silently dropping the derivatives.
+"""
+
+class Dual:
+    __slots__ = "value", "partials"
+
+    def __init__(self, value: int | float, partials: tuple[int | float, ...]):
+        self.value = value
+        self.partials = partials
+
+    def __repr__(self) -> str:
+        return f"Dual({self.value!r}, {self.partials!r})"
+
+    def __add__(self, other: Dual | int | float) -> Dual:
+        if other.__class__ is Dual:
+            return Dual(self.value + other.value, tuple(map(add, self.partials, other.partials)))
+        return Dual(self.value + other, self.partials)
+
+    __radd__ = __add__
+
+    def __sub__(self, other: Dual | int | float) -> Dual:
+        if other.__class__ is Dual:
+            return Dual(self.value - other.value, tuple(map(sub, self.partials, other.partials)))
+        return Dual(self.value - other, self.partials)
+
+    def __rsub__(self, other: int | float) -> Dual:
+        return Dual(other - self.value, tuple(-d for d in self.partials))
+
+    def __mul__(self, other: Dual | int | float) -> Dual:
+        a = self.value
+        if other.__class__ is Dual:
+            b = other.value
+            return Dual(a * b, tuple(b * x + a * y for x, y in zip(self.partials, other.partials)))
+        return Dual(a * other, tuple(other * x for x in self.partials))
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other: Dual | int | float) -> Dual:
+        if other.__class__ is Dual:
+            b = other.value
+            v = self.value / b
+            return Dual(v, tuple((x - v * y) / b for x, y in zip(self.partials, other.partials)))
+        v = self.value / other
+        return Dual(v, tuple(x / other for x in self.partials))
+
+    def __rtruediv__(self, other: int | float) -> Dual:
+        b = self.value
+        v = other / b
+        return Dual(v, tuple(-v * y / b for y in self.partials))
+
+    def __floordiv__(self, other: Dual | int | float) -> Dual:
+        return Dual(self.value // (other.value if other.__class__ is Dual else other), (0,) * len(self.partials))
+
+    def __rfloordiv__(self, other: int | float) -> Dual:
+        return Dual(other // self.value, (0,) * len(self.partials))
+
+    def __pow__(self, other: Dual | int | float) -> Dual:
+        a = self.value
+        if other.__class__ is not Dual:
+            v = a ** other
+            if not other:
+                return Dual(v, (0,) * len(self.partials))
+            d = other * a ** (other - 1)
+            return Dual(v, tuple(d * x for x in self.partials))
+        b = other.value
+        v = a ** b
+        d = b * a ** (b - 1) if b else 0
+        e = v * _log(a, v)
+        return Dual(v, tuple(d * x + e * y if y else d * x for x, y in zip(self.partials, other.partials)))
+
+    def __rpow__(self, other: int | float) -> Dual:
+        v = other ** self.value
+        e = v * _log(other, v)
+        return Dual(v, tuple(e * y if y else 0 for y in self.partials))
+
+    def __neg__(self) -> Dual:
+        return Dual(-self.value, tuple(-d for d in self.partials))
+
+    def __abs__(self) -> Dual:
+        return -self if self.value < 0 else self
+
+    def __lt__(self, other: Dual | int | float) -> bool:
+        return self.value < (other.value if other.__class__ is Dual else other)
+
+    def __gt__(self, other: Dual | int | float) -> bool:
+        return self.value > (other.value if other.__class__ is Dual else other)
+
+    def __int__(self) -> int:
+        return int(self.value)
+
+    # `float()` of the language keeps the derivatives
+    def float(self) -> Dual:
+        return Dual(float(self.value), self.partials)
+
+# the factor log(a) of the derivative of a**y with respect to y, where a**y is `v`
+def _log(a: int | float, v: int | float) -> float:
+    if a > 0:
+        return log(a)
+    # a**y is 0 for positive y, and stays 0 nearby
+    return 0.0 if not v else nan
+
+# the parameters to differentiate a function at, one partial derivative per parameter
+def seed(args: tuple[int | float, ...]) -> list[Dual]:
+    for x in args:
+        if x.__class__ is not int and x.__class__ is not float:
+            raise TypeError(f"expected a number, got {x!r}")
+    n = len(args)
+    return [Dual(x, tuple(int(i == j) for j in range(n))) for i, x in enumerate(args)]
+
+# the value and gradient of a result computed from `n` seeded parameters
+def split(val: Dual | int | float, n: int) -> tuple[int | float, tuple[int | float, ...]]:
+    if val.__class__ is Dual:
+        return val.value, val.partials
+    return val, (0,) * n
@@ -0,0 +1,150 @@
+from __future__ import annotations
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from instructions import Instruction, InstructionType, Operation
+
+"""
+Bookkeeping for the interpreter's incremental mode.
+
+Every value on the top-level stack remembers where the instructions that
+produced it start, so a STORE knows its recipe: the instructions that
+computed the stored value.  A recipe's LOADs are its dependencies, split
+into direct ones (evaluated by the recipe itself) and deferred ones
+(inside the bodies of the functions it creates, evaluated when called).
+
+When a name is reassigned, everything that transitively depends on it is
+visited in topological order.  A name is recomputed if one of its direct
+dependencies changed; a function whose deferred dependencies changed is
+not recomputed but counts as changed for its own dependents.  Cycles
+(`a = 1; b = a + 1; a = b * 2`) are cut where the traversal meets them,
+and the reassigned name itself is never recomputed.
+"""
+
+@dataclass(slots=True)
+class UpdateStatistics:
+    updates: int = 0
+    recomputed: int = 0
+    notifications: int = 0
+
+Subscriber = Callable[[str, object], None]
+
+def _popped(instruction: Instruction) -> int:
+    match instruction.type:
+        # STORE_LOCAL pushes back what it popped
+        case InstructionType.STORE | InstructionType.STORE_LOCAL:
+            return 1
+        case InstructionType.CALL:
+            return instruction.argument + 1
+        case InstructionType.OPERATION | InstructionType.ARITHMETIC:
+            return 1 if instruction.argument is Operation.NEG else 2
+    return 0
+
+def _loads(recipe: list[Instruction]) -> tuple[frozenset[str], frozenset[str]]:
+    direct = set()
+    deferred = set()
+    bodies = []
+    for i in recipe:
+        if i.type is InstructionType.LOAD:
+            direct.add(i.argument)
+        elif i.type is InstructionType.FUNCTION:
+            bodies.append(i.argument[1])
+    while bodies:
+        for i in bodies.pop():
+            if i.type is InstructionType.LOAD:
+                deferred.add(i.argument)
+            elif i.type is InstructionType.FUNCTION:
+                bodies.append(i.argument[1])
+    return frozenset(direct), frozenset(deferred)
+
+class Sheet:
+    __slots__ = "statistics", "_log", "_origins", "_recipes", "_loads", "_dependents", "_subscribers"
+
+    def __init__(self):
+        self.statistics = UpdateStatistics()
+        self._log: list[Instruction] = []
+        # start in _log of each top-level stack entry, None if unknown
+        self._origins: list[int | None] = []
+        self._recipes: dict[str, list[Instruction]] = {}
+        self._loads: dict[str, tuple[frozenset[str], frozenset[str]]] = {}
+        # insertion ordered, so updates are deterministic
+        self._dependents: dict[str, dict[str, None]] = {}
+        self._subscribers: list[tuple[Subscriber, frozenset[str] | None]] = []
+
+    # forgets all recipes, subscribers stay
+    def reset(self):
+        self._log.clear()
+        self._origins.clear()
+        self._recipes.clear()
+        self._loads.clear()
+        self._dependents.clear()
+
+    # called after each top-level instruction that ran on a stack of `depth` entries
+    def track(self, instruction: Instruction, depth: int) -> list[Instruction] | None:
+        origins = self._origins
+        # an instruction that raised leaves the stack in an unknown state
+        if len(origins) > depth:
+            del origins[depth:]
+        elif len(origins) < depth:
+            origins.extend([None] * (depth - len(origins)))
+        if not depth:
+            self._log.clear()
+        count = _popped(instruction)
+        start = len(self._log)
+        if count:
+            popped = origins[len(origins) - count:]
+            del origins[len(origins) - count:]
+            start = None if None in popped else popped[0]
+        self._log.append(instruction)
+        if instruction.type is not InstructionType.STORE:
+            origins.append(start)
+            return None
+        return None if start is None else self._log[start:-1]
+
+    def record(self, name: str, recipe: list[Instruction] | None):
+        for dependency in frozenset().union(*self._loads.pop(name, ())):
+            self._dependents[dependency].pop(name, None)
+        if recipe is None:
+            self._recipes.pop(name, None)
+            return
+        self._recipes[name] = recipe
+        self._loads[name] = loads = _loads(recipe)
+        for dependency in sorted(loads[0] | loads[1]):
+            self._dependents.setdefault(dependency, {})[name] = None
+
+    def recipe(self, name: str) -> list[Instruction] | None:
+        return self._recipes.get(name)
+
+    def dependencies(self, name: str) -> tuple[frozenset[str], frozenset[str]]:
+        return self._loads.get(name, (frozenset(), frozenset()))
+
+    # names that transitively depend on `name`, dependencies before dependents
+    def affected(self, name: str) -> list[str]:
+        order = []
+        visited = {name}
+        stack = [(name, iter(self._dependents.get(name, ())))]
+        while stack:
+            current, dependents = stack[-1]
+            for dependent in dependents:
+                if dependent not in visited:
+                    visited.add(dependent)
+                    stack.append((dependent, iter(self._dependents.get(dependent, ()))))
+                    break
+            else:
+                stack.pop()
+                order.append(current)
+        order.pop() # `name` itself
+        order.reverse()
+        return order
+
+    def subscribe(self, subscriber: Subscriber, names: Iterable[str] | None = None):
+        self._subscribers.append((subscriber, None if names is None else frozenset(names)))
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers = [s for s in self._subscribers if s[0] is not subscriber]
+
+    def notify(self, changes: list[tuple[str, object]]):
+        for name, value in changes:
+            for subscriber, names in self._subscribers:
+                if names is None or name in names:
+                    self.statistics.notifications += 1
+                    subscriber(name, value)
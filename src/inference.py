@@ -0,0 +1,72 @@
+from collections.abc import Iterable, Iterator
+from instructions import InstructionType, Operation
+from optimizer import Statistics
+
+"""
+Infers which operands of a function body's OPERATIONs are numbers, and
+turns those OPERATIONs into ARITHMETIC, which skips the interpreter's
+checks for callables and for the stack depth.
+
+Bodies are straight-line code, so one forward pass over the instructions
+suffices.  A value is known to be a number if it is a literal or the
+result of an operation, and a parameter, local or global is known to be
+one after an operation on it has succeeded, since operations raise on
+callables.  Globals stay known until the next CALL, which may run a
+builtin that rebinds them; parameters and locals belong to the frame.
+
+Numbers may still be arrays, and ARITHMETIC still hands operations on
+arrays to `arrays.operate`.
+"""
+
+# stack entries are (known to be a number, the parameter, local or global it was pushed from)
+_RESULT = True, None
+
+def specialize(instructions: Iterable[tuple[InstructionType, object]], statistics: Statistics | None = None) -> Iterator[tuple[InstructionType, object]]:
+    stack = []
+    known = set() # ("param", index), ("local", slot) and ("name", name)
+    locals = {} # slot -> whether it holds a number
+    calls = 0 # globals loaded before a CALL prove nothing about later LOADs
+    instructions = iter(instructions)
+    for type, arg in instructions:
+        match type:
+            case InstructionType.INT | InstructionType.FLOAT:
+                stack.append(_RESULT)
+            case InstructionType.PARAM:
+                source = "param", arg
+                stack.append((source in known, source))
+            case InstructionType.LOAD:
+                stack.append((("name", arg) in known, ("name", arg, calls)))
+            case InstructionType.LOAD_LOCAL:
+                source = "local", arg
+                stack.append((source in known or locals.get(arg, False), source))
+            case InstructionType.STORE_LOCAL if stack:
+                number, source = stack[-1]
+                locals[arg] = number
+                if source is None:
+                    stack[-1] = number, ("local", arg)
+            case InstructionType.OPERATION if len(stack) >= (count := 1 if arg is Operation.NEG else 2):
+                operands = stack[len(stack) - count:]
+                del stack[len(stack) - count:]
+                if all(number for number, _ in operands):
+                    type = InstructionType.ARITHMETIC
+                    if statistics is not None:
+                        statistics.specialized += 1
+                else:
+                    for _, source in operands:
+                        if source is None or len(source) == 3 and source[2] != calls:
+                            continue
+                        known.add(source[:2])
+                stack.append(_RESULT)
+            case InstructionType.CALL if len(stack) > arg:
+                del stack[len(stack) - arg - 1:]
+                calls += 1
+                known = {source for source in known if source[0] != "name"}
+                stack.append((False, None))
+            case InstructionType.FUNCTION:
+                stack.append((False, None))
+            case _:
+                # malformed code keeps its checks
+                yield type, arg
+                yield from instructions
+                return
+        yield type, arg
@@ -0,0 +1,155 @@
+from __future__ import annotations
+from collections.abc import Mapping
+from dataclasses import dataclass
+from nodes import NodeType, Tree
+from optimizer import optimize
+
+"""
+Inlines calls of small user functions into the bodies of other user
+functions.
+
+The compiler hands every statement to an `Inliner` in program order, so
+it knows the latest definition of each name.  A call inside a function
+body is replaced by the callee's body when
+- the callee is a known definition of at most `max_size` nodes, called
+  with its own number of arguments,
+- every argument is a literal or a parameter of the caller, so nothing
+  is evaluated more often, less often or in another order than before,
+- the callee's free names are not parameters of the caller.
+The substituted body is folded again, so constant arguments disappear
+where they can.
+
+Bindings are late, so the callee may be rebound before the caller runs.
+An inlined body is therefore compiled next to the original one, together
+with guards: the names it was inlined under and the exact function
+objects they were bound to.  The interpreter runs the inlined body only
+while every guard holds and the original body, with its real calls,
+otherwise.
+"""
+
+_LITERALS = NodeType.INT, NodeType.FLOAT
+
+@dataclass(frozen=True, slots=True)
+class Inlined:
+    guards: tuple[tuple[str, tuple], ...] # (name, function it must be bound to)
+    function: tuple # (argc, body with the calls inlined)
+
+    def holds(self, namespace: Mapping[str, object]) -> bool:
+        for name, func in self.guards:
+            if getattr(namespace.get(name), "inner", None) is not func:
+                return False
+        return True
+
+@dataclass(slots=True)
+class InliningStatistics:
+    inlined: int = 0 # call sites
+    guarded: int = 0 # function bodies compiled twice
+
+@dataclass(frozen=True, slots=True)
+class _Definition:
+    params: tuple[str, ...]
+    body: Tree
+    guards: tuple[tuple[str, tuple], ...]
+    function: tuple
+    free: frozenset[str] # names the body loads or calls, other than its parameters
+
+def _shape(tree: Tree, names: set[str]) -> int:
+    size = len(tree)
+    for type, data in zip(tree.types, tree.data):
+        match type:
+            case NodeType.IDENTIFIER:
+                names.add(data)
+            case NodeType.CALL:
+                names.add(data[0])
+                size += 1
+    return size
+
+# None where a parameter used as a callee would be replaced by a literal;
+# parameters are bound to single nodes, as (type, data)
+def _substitute(tree: Tree, bindings: dict[str, tuple[NodeType, object]]) -> Tree | None:
+    result = Tree()
+    types, data = result.types, result.data
+    for type, d in zip(tree.types, tree.data):
+        if type is NodeType.IDENTIFIER and (target := bindings.get(d)) is not None:
+            type, d = target
+        elif type is NodeType.CALL and (target := bindings.get(d[0])) is not None:
+            if target[0] is not NodeType.IDENTIFIER:
+                return None
+            d = target[1], d[1]
+        types.append(type)
+        data.append(d)
+    return result
+
+class Inliner:
+    __slots__ = "max_size", "statistics", "_definitions"
+
+    def __init__(self, max_size: int = 32):
+        self.max_size = max_size
+        self.statistics = InliningStatistics()
+        self._definitions: dict[str, _Definition] = {}
+
+    # the body to compile next to `body`, and the guards it needs (none if nothing was inlined)
+    def inline(self, params: tuple[str, ...], body: Tree, fold: bool = True) -> tuple[Tree, tuple[tuple[str, tuple], ...]]:
+        guards = {}
+        inlined = self._inline(body, frozenset(params), guards)
+        if not guards:
+            return body, ()
+        self.statistics.guarded += 1
+        return optimize(inlined) if fold else inlined, tuple(guards.items())
+
+    def define(self, name: str, params: tuple[str, ...], body: Tree, guards: tuple[tuple[str, tuple], ...], function: tuple):
+        names = set()
+        if _shape(body, names) > self.max_size:
+            self._definitions.pop(name, None)
+            return
+        self._definitions[name] = _Definition(tuple(params), body, guards, function, frozenset(names.difference(params)))
+
+    def forget(self, name: str):
+        self._definitions.pop(name, None)
+
+    # Copies the nodes in postorder, and replaces each call that can be
+    # inlined, after its arguments, by the callee's body.  The start of
+    # every operand in the result is on a stack until its parent is done.
+    def _inline(self, tree: Tree, params: frozenset[str], guards: dict[str, tuple]) -> Tree:
+        result = Tree()
+        types, data = result.types, result.data
+        operands = []
+        for type, d in zip(tree.types, tree.data):
+            match type:
+                case NodeType.INT | NodeType.FLOAT | NodeType.IDENTIFIER:
+                    operands.append(len(types))
+                case NodeType.NEGATION:
+                    pass
+                case NodeType.CALL:
+                    id, count = d
+                    start = operands[-count] if count else len(types)
+                    del operands[len(operands) - count:]
+                    operands.append(start)
+                    # only arguments of one node each can be substituted
+                    if id not in params and (definition := self._definitions.get(id)) is not None and len(types) - start == count:
+                        args = list(zip(types[start:], data[start:]))
+                        if (body := self._expand(id, args, definition, params, guards)) is not None:
+                            del types[start:], data[start:]
+                            types.extend(body.types)
+                            data.extend(body.data)
+                            continue
+                case _:
+                    operands.pop()
+            types.append(type)
+            data.append(d)
+        return result
+
+    def _expand(self, id: str, args: list[tuple[NodeType, object]], definition: _Definition, params: frozenset[str], guards: dict[str, tuple]) -> Tree | None:
+        if len(args) != len(definition.params) or not definition.free.isdisjoint(params):
+            return None
+        if not all(type in _LITERALS or type is NodeType.IDENTIFIER and d in params for type, d in args):
+            return None
+        required = definition.guards + ((id, definition.function),)
+        # the same name inlined under two bindings could never run inlined
+        if any(guards.get(name, func) is not func for name, func in required):
+            return None
+        if (body := _substitute(definition.body, dict(zip(definition.params, args)))) is None:
+            return None
+        guards.update(required)
+        self.statistics.inlined += 1
+        return body
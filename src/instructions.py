@@ -11,15 +11,24 @@ class Operation(Enum):
     NEG  = auto()
     POW  = auto()
 
+    # members are singletons, so identity hashing is enough and keeps the
+    # interpreter's dispatch tables out of Enum.__hash__
+    __hash__ = object.__hash__
+
 class InstructionType(Enum):
-    LOAD      = auto() # str
-    STORE     = auto() # str
-    PARAM     = auto() # int
-    CALL      = auto() # int
-    OPERATION = auto() # Operation
-    INT       = auto() # int
-    FLOAT     = auto() # float
-    FUNCTION  = auto() # tuple[int, list[Instruction]]
+    LOAD        = auto() # str
+    STORE       = auto() # str
+    PARAM       = auto() # int
+    CALL        = auto() # int
+    OPERATION   = auto() # Operation
+    INT         = auto() # int
+    FLOAT       = auto() # float
+    FUNCTION    = auto() # tuple[int, list[Instruction] | bytecode.Code]
+    STORE_LOCAL = auto() # int, copies the top of the stack to a local slot of the frame or statement
+    LOAD_LOCAL  = auto() # int
+    ARITHMETIC  = auto() # Operation, an OPERATION on operands known to be numbers, see inference.py
+
+    __hash__ = object.__hash__
 
 @dataclass(frozen=True, slots=True)
 class Instruction:
@@ -28,5 +37,5 @@ class Instruction:
 
     def __repr__(self) -> str:
         arg = self.argument
-        arg = arg.name if self.type is InstructionType.OPERATION else repr(arg)
+        arg = arg.name if self.type is InstructionType.OPERATION or self.type is InstructionType.ARITHMETIC else repr(arg)
         return f"Instruction({self.type}, {arg})"
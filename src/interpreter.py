@@ -1,33 +1,55 @@
 from __future__ import annotations
-from collections.abc import Callable
+from arrays import ndarray
+from bytecode import ARITHMETIC, CALL, Code, encode, FLOAT, FUNCTION, INT, LOAD, LOAD_LOCAL, OPERATION, OPERATIONS, PARAM, STORE, STORE_LOCAL
+from collections.abc import Callable, Iterable, Iterator, Mapping, MutableMapping
 from dataclasses import dataclass
+from dual import Dual, seed, split
 from enum import auto, Enum
-from inspect import signature
+from incremental import Sheet, Subscriber, UpdateStatistics
+from inspect import Parameter, signature
 from instructions import Instruction, InstructionType, Operation
+from math import inf, log2
+from memo import CacheStatistics, Memo
+from namespace import Namespace
+from native import translate, Translation
+import numeric
+from operator import add, floordiv, mul, pow, sub, truediv
+from profiler import Profiler
+from time import perf_counter
+import arrays
 
 class ValueType(Enum):
     INT      = auto() # int
     FLOAT    = auto() # float
-    FUNCTION = auto() # tuple[int, list[Instruction]]
+    ARRAY    = auto() # numpy.ndarray
+    FUNCTION = auto() # tuple[int, list[Instruction] | Code], with an inliner.Inlined third if calls were inlined
     BUILTIN  = auto() # Callable[[Value, ...], Value]
 
     def is_callable(self) -> bool:
         return self.value >= ValueType.FUNCTION.value
 
-@dataclass(frozen=True, slots=True)
+@dataclass(frozen=True, slots=True, init=False)
 class Value:
     type: ValueType
-    inner: int | float | tuple[int, list[Instruction]] | Callable[[Value, ...], Value]
+    inner: int | float | ndarray | tuple[int, list[Instruction]] | Callable[[Value, ...], Value]
+
+    # see Token.__init__
+    def __init__(self, type: ValueType, inner: int | float | ndarray | tuple[int, list[Instruction]] | Callable[[Value, ...], Value]):
+        _set_type(self, type)
+        _set_inner(self, inner)
 
     def __str__(self) -> str:
         match self.type:
-            case ValueType.INT | ValueType.FLOAT:
+            case ValueType.INT | ValueType.FLOAT | ValueType.ARRAY:
                 return str(self.inner)
             case ValueType.FUNCTION:
                 return "<function object>"
             case ValueType.BUILTIN:
                 return f"<builtin function>"
 
+_set_type = Value.type.__set__
+_set_inner = Value.inner.__set__
+
 @dataclass(frozen=True, slots=True)
 class InterpreterError(Exception):
     explaination: str
@@ -35,19 +57,45 @@ class InterpreterError(Exception):
     def __str__(self) -> str:
         return self.explaination
 
+# raised for runaway recursion, in the frames or in Python's own stack
+class CallDepthError(InterpreterError):
+    __slots__ = ()
+
+# raised when an evaluation exceeds a limit of the interpreter's `Budget`
+class BudgetExceeded(InterpreterError):
+    __slots__ = ()
+
+# Limits on one evaluation, None for no limit.  An evaluation is a call of
+# `execute`, `call` or `gradient`, or everything inside `evaluation()`.
+@dataclass(frozen=True, slots=True)
+class Budget:
+    instructions: int | None = None # counted by function body as it starts, bodies have no jumps
+    seconds: float | None = None    # checked as function bodies start
+    depth: int | None = None        # active user function calls
+    bits: int | None = None         # of int results of `*` and `**`, estimated before computing them
+
 def _max(x: Value, y: Value, /) -> Value:
     if x.type.is_callable() or y.type.is_callable():
         raise InterpreterError("arguments to `max()` cannot be callable")
+    if x.type is ValueType.ARRAY or y.type is ValueType.ARRAY:
+        return _wrap_value(arrays.maximum(x.inner, y.inner))
     return _wrap_value(x.inner if y.inner < x.inner else y.inner)
 
 def _min(x: Value, y: Value, /) -> Value:
     if x.type.is_callable() or y.type.is_callable():
         raise InterpreterError("arguments to `min()` cannot be callable")
+    if x.type is ValueType.ARRAY or y.type is ValueType.ARRAY:
+        return _wrap_value(arrays.minimum(x.inner, y.inner))
     return _wrap_value(x.inner if x.inner < y.inner else y.inner)
 
 def _clamp(x: Value, /, lo: Value, hi: Value) -> Value:
     if x.type.is_callable() or lo.type.is_callable() or hi.type.is_callable():
         raise InterpreterError("arguments to `clamp()` cannot be callable")
+    if ValueType.ARRAY in (x.type, lo.type, hi.type):
+        x, lo, hi = x.inner, lo.inner, hi.inner
+        if not arrays.all_less(lo, hi):
+            raise InterpreterError(f"cannot `clamp()` between {lo=} and {hi=}")
+        return _wrap_value(arrays.clamp(x, lo, hi))
     x, lo, hi = x.inner, lo.inner, hi.inner
     if not lo < hi:
         raise InterpreterError(f"cannot `clamp()` between {lo=} and {hi=}")
@@ -61,18 +109,47 @@ def _abs(x: Value, /) -> Value:
 def _sign(x: Value, /) -> Value:
     if x.type.is_callable():
         raise InterpreterError("argument to `sign()` cannot be callable")
+    if x.type is ValueType.ARRAY:
+        return _wrap_value(arrays.sign(x.inner))
     return _wrap_value(abs(x.inner) // x.inner)
 
 def _int(x: Value, /) -> Value:
     if x.type.is_callable():
         raise InterpreterError("argument to `int()` cannot be callable")
+    if x.type is ValueType.ARRAY:
+        return _wrap_value(arrays.to_int(x.inner))
     return Value(ValueType.INT, int(x.inner))
 
 def _float(x: Value, /) -> Value:
     if x.type.is_callable():
         raise InterpreterError("argument to `float()` cannot be callable")
+    if x.type is ValueType.ARRAY:
+        return _wrap_value(arrays.to_float(x.inner))
+    if x.inner.__class__ is Dual:
+        return Value(ValueType.FLOAT, x.inner.float())
     return Value(ValueType.FLOAT, float(x.inner))
 
+def _number(x: Value, builtin: str) -> float:
+    if x.type is not ValueType.INT and x.type is not ValueType.FLOAT:
+        raise InterpreterError(f"bounds of `{builtin}()` must be numbers")
+    return float(x.inner)
+
+def _integrate(f: Value, a: Value, b: Value, /, *, caller: Caller) -> Value:
+    return Value(ValueType.FLOAT, numeric.integrate(caller.batch(f), _number(a, "integrate"), _number(b, "integrate")))
+
+def _solve(f: Value, lo: Value, hi: Value, /, *, caller: Caller) -> Value:
+    function = caller.function(f, 1)
+    def g(x: float) -> object:
+        if (y := function(x)).__class__ is Value:
+            raise InterpreterError("function returned a callable")
+        return y
+    return _wrap_value(numeric.solve(g, _number(lo, "solve"), _number(hi, "solve")))
+
+def _sum(f: Value, start: Value, stop: Value, /, *, caller: Caller) -> Value:
+    if start.type is not ValueType.INT or stop.type is not ValueType.INT:
+        raise InterpreterError("bounds of `sum()` must be integers")
+    return _wrap_value(numeric.total(caller.batch(f), start.inner, stop.inner))
+
 # def _bin(x: Value, /):
 #     if x.type is not ValueType.INT:
 #         raise InterpreterError("argument to `bin()` must be an integer")
@@ -88,20 +165,166 @@ def _float(x: Value, /) -> Value:
 #         raise InterpreterError("argument to `oct()` must be an integer")
 #     print(oct(x.inner))
 
-def _wrap_value(x: int | float, /) -> Value:
-    type = ValueType.INT if isinstance(x, int) else ValueType.FLOAT
-    return Value(type, x)
+# carries an error of user code that a builtin called back out of the builtin
+class _CallbackError(Exception):
+    __slots__ = "error",
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+# Errors a builtin raises itself are wrapped once.  Those of the user code
+# it calls back were wrapped where they came from, if at all, and pass
+# unchanged, however deeply builtins nest.
+def _call_builtin(func: Callable[..., Value], params: list[object], caller: Caller | None) -> object:
+    try:
+        if caller is not None:
+            return _unbox(func(*map(_box, params), caller=caller))
+        return _unbox(func(*map(_box, params)))
+    except _CallbackError as e:
+        raise e.error from None
+    except (BudgetExceeded, RecursionError):
+        raise
+    except Exception as e:
+        raise InterpreterError(f"builtin raised {e!r}")
+
+# the number of positional parameters of a builtin, and whether it takes a `caller`
+def _arity(func: Callable[..., Value]) -> tuple[int, bool]:
+    parameters = signature(func).parameters
+    higher_order = "caller" in parameters and parameters["caller"].kind is Parameter.KEYWORD_ONLY
+    return len(parameters) - higher_order, higher_order
+
+def _wrap_value(x: int | float | ndarray, /) -> Value:
+    if isinstance(x, int):
+        return Value(ValueType.INT, x)
+    if isinstance(x, ndarray):
+        return Value(ValueType.ARRAY, x)
+    return Value(ValueType.FLOAT, x)
+
+# Inside the interpreter numbers and arrays are kept raw, on the stacks and
+# in the namespace; only callables are `Value`s.  Values are boxed where they
+# leave the interpreter: builtins, the stack, bindings and subscribers.
+def _box(x: int | float | ndarray | Value, /) -> Value:
+    return x if x.__class__ is Value else _wrap_value(x)
+
+def _unbox(val: Value, /) -> int | float | ndarray | Value:
+    return val if val.type in _CALLABLES else val.inner
 
 def _check_parameter_count(actual: int, expected: int):
     if actual != expected:
         raise InterpreterError("call with {actual} parameters instead of {expected}")
 
+_OPERATORS = {
+    Operation.ADD:  add,
+    Operation.SUB:  sub,
+    Operation.MULT: mul,
+    Operation.DIV:  truediv,
+    Operation.IDIV: floordiv,
+    Operation.POW:  pow,
+}
+
+_CALLABLES = ValueType.FUNCTION, ValueType.BUILTIN
+
+# indexed like bytecode.OPERATIONS
+_OPERATOR_LIST = tuple(_OPERATORS.get(o) for o in OPERATIONS)
+_OPERATOR_INDEX = {o: i for i, o in enumerate(OPERATIONS)}
+_NEG = _OPERATOR_INDEX[Operation.NEG]
+
+# frames on top of the first one in _execute; the stack of frames lives on
+# the heap, this only stops runaway recursion before memory runs out, with
+# a CallDepthError
+_MAX_DEPTH = 100_000
+
+# entries in the tables of compiled functions, keyed by id(function), before
+# the first collection of functions that no global reaches any more
+_COLLECT_AT = 256
+
+# `*` and `**` that raise before computing an int of more than `bits` bits
+def _sized_operators(bits: int) -> tuple[Callable[[object, object], object], Callable[[object, object], object]]:
+    def multiply(x: object, y: object) -> object:
+        # x * y has at least x.bit_length() + y.bit_length() - 1 bits
+        if x.__class__ is int and y.__class__ is int and x and y and x.bit_length() + y.bit_length() - 1 > bits:
+            raise BudgetExceeded("integer size limit exceeded")
+        return x * y
+    def power(x: object, y: object) -> object:
+        # x ** y has floor(y * log2(abs(x))) + 1 bits, at least y + 1; the
+        # estimates in ints come first, y * log2(...) overflows a float
+        if x.__class__ is int and y.__class__ is int and y > 1 and (x > 1 or x < -1):
+            if y >= bits or y * (abs(x).bit_length() - 1) >= bits or y * log2(abs(x)) >= bits:
+                raise BudgetExceeded("integer size limit exceeded")
+        return x ** y
+    return multiply, power
+
+# the budget left in the running evaluation
+class _Meter:
+    __slots__ = "instructions", "deadline", "depth", "max_depth"
+
+    def __init__(self, budget: Budget):
+        self.instructions = inf if budget.instructions is None else budget.instructions
+        self.deadline = inf if budget.seconds is None else perf_counter() + budget.seconds
+        self.depth = 0
+        self.max_depth = inf if budget.depth is None else budget.depth
+
+    def charge(self, instructions: int):
+        self.instructions -= instructions
+        if self.instructions < 0:
+            raise BudgetExceeded("instruction limit exceeded")
+        if self.deadline < inf and perf_counter() > self.deadline:
+            raise BudgetExceeded("time limit exceeded")
+
+    # a user function with a body of `instructions` starts
+    def enter(self, instructions: int):
+        if self.depth >= self.max_depth:
+            raise BudgetExceeded("call depth limit exceeded")
+        self.depth += 1
+        self.charge(instructions)
+
+# the higher-order builtins are as pure as the functions they call, which
+# the memo checks like any other loaded global
+_PURE_BUILTINS = _max, _min, _clamp, _abs, _sign, _int, _float, _integrate, _solve, _sum
+
+def _memo_key(params: list[object]) -> tuple | None:
+    for p in params:
+        if p.__class__ is float:
+            if not p: # 0.0 == -0.0
+                return None
+        elif p.__class__ is not int:
+            return None
+    # 1 == 1.0, the types keep them apart
+    return *params, *map(type, params)
+
+def _same(x: object | None, y: object | None) -> bool:
+    if x is None or y is None or x.__class__ is not y.__class__:
+        return x is y
+    if x.__class__ is ndarray:
+        return arrays.equal(x, y)
+    if x.__class__ is Value:
+        return x.type is y.type and x.inner == y.inner
+    return x == y
+
 class Interpreter:
-    __slots__ = "_value_stack", "_call_stack", "_namespace"
+    __slots__ = "_value_stack", "_namespace", "_arity", "_handlers", "_native", "_bodies", "_runtime", "_memo", "_sheet", "_profiler", "_code_handlers", "_names", "_constants", "_locals", "_caller", "_budget", "_meter", "_operators", "_options", "_snapshot", "_collect_at"
 
-    def __init__(self, builtins: Iterable[tuple[str, Callable[[Value, ...], Value]]] = None):
+    def __init__(self, builtins: Iterable[tuple[str, Callable[[Value, ...], Value]]] = None, native: bool = False, memo_size: int = 0, incremental: bool = False, profiler: Profiler | None = None, budget: Budget | None = None):
         self._value_stack = []
-        self._call_stack = []
+        # for contexts made from snapshots, which run without the profiler
+        self._options = {"native": native, "memo_size": memo_size, "incremental": incremental, "budget": budget}
+        self._snapshot = None
+        # bits are checked by the operators, the other limits by a meter per evaluation
+        self._budget = None if budget is None or budget.instructions is None and budget.seconds is None and budget.depth is None else budget
+        self._meter = None
+        # indexed like bytecode.OPERATIONS, arrays.operate gets the plain operators too
+        self._operators = _OPERATOR_LIST
+        if budget is not None and budget.bits is not None:
+            multiply, power = _sized_operators(budget.bits)
+            self._operators = tuple(multiply if f is mul else power if f is pow else f for f in _OPERATOR_LIST)
+        # id(function) -> (function, Translation and the function bound from it, or None twice if it cannot be translated)
+        self._native = {} if native else None
+        self._runtime = None
+        # id(function) -> (function, its body as Code, the body's operands linked against the namespace)
+        self._bodies = {}
+        self._memo = Memo(memo_size, _PURE_BUILTINS) if memo_size > 0 else None
+        self._collect_at = _COLLECT_AT
+        self._sheet = Sheet() if incremental else None
         if builtins is None:
             builtins = (
                 ("max", _max),
@@ -111,103 +334,802 @@ class Interpreter:
                 ("sign", _sign),
                 ("int", _int),
                 ("float", _float),
+                ("integrate", _integrate),
+                ("solve", _solve),
+                ("sum", _sum),
                 # ("bin", _bin),
                 # ("hex", _hex),
                 # ("oct", _oct),
             )
-        self._namespace = {name: Value(ValueType.BUILTIN, f) for name, f in builtins}
+        builtins = tuple(builtins)
+        self._namespace = Namespace((name, Value(ValueType.BUILTIN, f)) for name, f in builtins)
+        self._profiler = profiler
+        if profiler is not None:
+            profiler.namespace = self._namespace
+        self._arity = {f: _arity(f) for _, f in builtins}
+        self._caller = Caller(self)
+        self._handlers = {
+            InstructionType.LOAD:      self._load,
+            InstructionType.STORE:     self._store,
+            InstructionType.PARAM:     self._param,
+            InstructionType.CALL:      self._call,
+            InstructionType.OPERATION: self._operation,
+            InstructionType.INT:       self._number,
+            InstructionType.FLOAT:     self._number,
+            InstructionType.FUNCTION:  self._function,
+            InstructionType.STORE_LOCAL: self._store_local,
+            InstructionType.LOAD_LOCAL:  self._load_local,
+            InstructionType.ARITHMETIC:  self._operation,
+        }
+        # indexed by opcode, operands are resolved against the pools of the running code
+        self._code_handlers = (
+            self._load_name,
+            self._store_name,
+            self._param,
+            self._call,
+            self._operation_index,
+            self._number_constant,
+            self._number_constant,
+            self._function_constant,
+            self._store_local,
+            self._load_local,
+            self._operation_index,
+        )
+        self._names = self._constants = ()
+        # the local slots of top-level code, a fresh list for each `Code` run
+        self._locals = []
 
     def interpret(self, instruction: Instruction):
-        arg = instruction.argument
-        match instruction.type:
-            case InstructionType.LOAD:
-                if (val := self._namespace.get(arg)) is None:
-                    raise InterpreterError(f"unknown name `{arg}`")
-                self._value_stack.append(val)
-            case InstructionType.STORE:
-                if not self._value_stack:
-                    raise InterpreterError("store with empty stack")
-                val = self._value_stack.pop()
-                self._namespace[arg] = val
-            case InstructionType.PARAM:
-                if not self._call_stack or len(self._call_stack[-1]) <= arg:
+        if self._budget is not None:
+            if self._meter is None:
+                return self._evaluate(self.interpret, instruction)
+            self._meter.charge(1)
+        if self._profiler is not None:
+            self._profiler.instruction(instruction.type, instruction.argument)
+        if self._sheet is None:
+            self._handlers[instruction.type](instruction.argument)
+            return
+        depth = len(self._value_stack)
+        store = instruction.type is InstructionType.STORE
+        if store:
+            old = self._namespace.get(instruction.argument)
+        self._handlers[instruction.type](instruction.argument)
+        recipe = self._sheet.track(instruction, depth)
+        if store:
+            self._update(instruction.argument, recipe, old)
+
+    def execute(self, code: Code | Iterable[Instruction]):
+        if self._meter is None and self._budget is not None:
+            return self._evaluate(self.execute, code)
+        if self._sheet is not None or code.__class__ is not Code:
+            for i in code:
+                self.interpret(i)
+            return
+        self._run(code)
+
+    # Starts an evaluation that the limits of the budget apply to as a whole,
+    # for requests made of several `execute` and `call`s.  Nested
+    # evaluations belong to the outermost one.
+    def evaluation(self) -> Evaluation:
+        return Evaluation(self)
+
+    # runs an entry point as an evaluation of its own
+    def _evaluate(self, entry: Callable[..., object], *args: object) -> object:
+        self._meter = _Meter(self._budget)
+        try:
+            return entry(*args)
+        finally:
+            self._meter = None
+
+    # top-level code runs once, so it looks names up instead of linking them
+    def _run(self, code: Code):
+        names, constants, locals = self._names, self._constants, self._locals
+        self._names, self._constants, self._locals = code.names, code.constants, []
+        if self._profiler is not None:
+            self._profiler.execute(code)
+        if self._meter is not None:
+            self._meter.charge(len(code.opcodes))
+        try:
+            handlers = self._code_handlers
+            for op, arg in zip(code.opcodes, code.operands):
+                handlers[op](arg)
+        finally:
+            self._names, self._constants, self._locals = names, constants, locals
+
+    # the operands of `code` with names replaced by their slots
+    def _link(self, code: Code) -> list[int]:
+        if not code.names:
+            return list(code.operands)
+        slots = list(map(self._namespace.slot, code.names))
+        return [slots[arg] if op == LOAD or op == STORE else arg for op, arg in zip(code.opcodes, code.operands)]
+
+    def _update(self, name: str, recipe: list[Instruction] | None, old: object | None):
+        sheet = self._sheet
+        sheet.statistics.updates += 1
+        sheet.record(name, recipe)
+        new = self._namespace.get(name)
+        if _same(old, new):
+            return
+        changed = {name}
+        changes = [(name, new)]
+        for dependent in sheet.affected(name):
+            direct, deferred = sheet.dependencies(dependent)
+            if direct.isdisjoint(changed):
+                # functions are late bound, only their results changed
+                if not deferred.isdisjoint(changed):
+                    changed.add(dependent)
+                continue
+            old = self._namespace.get(dependent)
+            new = self._recompute(sheet.recipe(dependent))
+            sheet.statistics.recomputed += 1
+            if new is None:
+                self._namespace.pop(dependent, None)
+            else:
+                self._namespace[dependent] = new
+            if self._memo is not None:
+                self._memo.invalidate(dependent)
+            if not _same(old, new):
+                changed.add(dependent)
+                changes.append((dependent, new))
+        sheet.notify([(name, _box(val)) for name, val in changes])
+
+    # None if the recipe fails, the name is then unbound until it succeeds again
+    def _recompute(self, recipe: list[Instruction]) -> object | None:
+        stack, locals = self._value_stack, self._locals
+        self._value_stack, self._locals = [], []
+        try:
+            handlers = self._handlers
+            for i in recipe:
+                handlers[i.type](i.argument)
+            return self._value_stack[-1]
+        except BudgetExceeded:
+            raise
+        except (InterpreterError, ArithmeticError):
+            return None
+        finally:
+            self._value_stack, self._locals = stack, locals
+
+    def subscribe(self, subscriber: Subscriber, names: Iterable[str] | None = None):
+        self._incremental().subscribe(subscriber, names)
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._incremental().unsubscribe(subscriber)
+
+    def dependencies(self, name: str) -> frozenset[str]:
+        direct, deferred = self._incremental().dependencies(name)
+        return direct | deferred
+
+    def _incremental(self) -> Sheet:
+        if self._sheet is None:
+            raise InterpreterError("incremental mode is off")
+        return self._sheet
+
+    def _load(self, name: str):
+        namespace = self._namespace
+        if (slot := namespace.slots.get(name)) is None or (val := namespace.values[slot]) is None:
+            raise InterpreterError(f"unknown name `{name}`")
+        self._value_stack.append(val)
+
+    def _store(self, name: str):
+        if not self._value_stack:
+            raise InterpreterError("store with empty stack")
+        self._namespace[name] = self._value_stack.pop()
+        if self._memo is not None:
+            self._memo.invalidate(name)
+        if self._tables() > self._collect_at:
+            self._collect()
+
+    def _store_local(self, slot: int):
+        if not self._value_stack:
+            raise InterpreterError("store with empty stack")
+        if slot >= len(self._locals):
+            self._locals.extend([None] * (slot + 1 - len(self._locals)))
+        self._locals[slot] = self._value_stack[-1]
+
+    def _load_local(self, slot: int):
+        if slot >= len(self._locals) or (val := self._locals[slot]) is None:
+            raise InterpreterError("invalid local access")
+        self._value_stack.append(val)
+
+    def _param(self, index: int):
+        # function bodies run in _execute, there are no parameters here
+        raise InterpreterError("invalid parameter access")
+
+    # entry point for embedders, a user function runs once for a whole array
+    def call(self, name: str, *args: int | float | ndarray) -> int | float | ndarray:
+        if self._meter is None and self._budget is not None:
+            return self._evaluate(self.call, name, *args)
+        if (func := self._namespace.get(name)) is None:
+            raise InterpreterError(f"unknown name `{name}`")
+        val = self._enter(func, [arrays.asarray(x) for x in args])
+        if val.__class__ is Value:
+            raise InterpreterError(f"`{name}` returned a callable")
+        return val
+
+    # entry point for embedders, the value of a user function and its partial
+    # derivatives by parameter, computed in one run on dual numbers
+    def gradient(self, name: str, *args: int | float) -> tuple[int | float, tuple[int | float, ...]]:
+        if self._meter is None and self._budget is not None:
+            return self._evaluate(self.gradient, name, *args)
+        if (func := self._namespace.get(name)) is None:
+            raise InterpreterError(f"unknown name `{name}`")
+        if func.__class__ is not Value or func.type is not ValueType.FUNCTION:
+            raise InterpreterError(f"`{name}` is not a user function")
+        val = self._enter(func, seed(args))
+        if val.__class__ is Value:
+            raise InterpreterError(f"`{name}` returned a callable")
+        return split(val, len(args))
+
+    def _call(self, count: int):
+        stack = self._value_stack
+        if len(stack) <= count:
+            raise InterpreterError("call with insufficient stack")
+        val = self._enter(stack[-1], stack[-count-1:-1])
+        if count:
+            del stack[-count:]
+        stack[-1] = val
+
+    # Calls from top-level code and embedders.  Native translations and
+    # builtins call back through Python's stack, whose limit then acts as
+    # the call depth limit, and as the depth limit of a budget below it.
+    def _enter(self, func: object, params: list[object]) -> object:
+        try:
+            return self._invoke(func, params)
+        except RecursionError:
+            if self._meter is not None and self._meter.max_depth < inf:
+                raise BudgetExceeded("call depth limit exceeded") from None
+            raise CallDepthError("maximum call depth exceeded") from None
+
+    def _invoke(self, func: object, params: list[object]) -> object:
+        if func.__class__ is not Value:
+            raise InterpreterError("called non-callable")
+        match func.type:
+            case ValueType.FUNCTION:
+                _check_parameter_count(len(params), func.inner[0])
+                if self._memo is None or (results := self._memo.results(func.inner, self._namespace)) is None or (key := _memo_key(params)) is None:
+                    return self._call_function(func.inner, params)
+                if (val := self._memo.lookup(results, key)) is None:
+                    val = self._call_function(func.inner, params)
+                    self._memo.insert(results, key, val)
+                return val
+            case ValueType.BUILTIN:
+                if (arity := self._arity.get(func.inner)) is None:
+                    arity = self._arity[func.inner] = _arity(func.inner)
+                _check_parameter_count(len(params), arity[0])
+                caller = self._caller if arity[1] else None
+                if self._profiler is not None:
+                    return self._profiler.call(func.inner, _call_builtin, func.inner, params, caller)
+                return _call_builtin(func.inner, params, caller)
+            case _:
+                raise InterpreterError("called non-callable")
+
+    def _call_function(self, func: tuple[int, list[Instruction] | Code], params: list[object]) -> object:
+        if self._profiler is not None:
+            return self._profiler.call(func, self._run_function, func, params)
+        return self._run_function(func, params)
+
+    def _run_function(self, func: tuple[int, list[Instruction] | Code], params: list[object]) -> object:
+        if len(func) > 2 and func[2].holds(self._namespace):
+            func = func[2].function
+        if self._profiler is not None:
+            self._profiler.execute(self._code(func))
+        if self._meter is not None:
+            return self._metered(func, params)
+        if (native := self._native_function(func, params)) is not None:
+            return native(*params)
+        return self._execute(func, params)
+
+    # _run_function under a budget, the depth of the frames in _execute is
+    # restored when they unwind
+    def _metered(self, func: tuple[int, list[Instruction] | Code], params: list[object]) -> object:
+        meter = self._meter
+        depth = meter.depth
+        if (entry := self._bodies.get(id(func))) is None:
+            entry = self._body(func)
+        meter.enter(len(entry[1].opcodes))
+        try:
+            if (native := self._native_function(func, params)) is not None:
+                return native(*params)
+            return self._execute(func, params)
+        finally:
+            meter.depth = depth
+
+    # translations are specialised to scalars, arrays go through the frames
+    def _native_function(self, func: tuple[int, list[Instruction] | Code], params: list[object]) -> Callable[..., object] | None:
+        if self._native is None or any(p.__class__ is ndarray for p in params):
+            return None
+        return self._translate(func)
+
+    def _code(self, func: tuple[int, list[Instruction] | Code]) -> Code:
+        return self._body(func)[1]
+
+    # (function, body as Code, linked operands, number of local slots)
+    def _body(self, func: tuple[int, list[Instruction] | Code]) -> tuple[tuple, Code, list[int], int]:
+        if (entry := self._bodies.get(id(func))) is None:
+            code = body if (body := func[1]).__class__ is Code else encode(body)
+            slots = max((arg + 1 for op, arg in zip(code.opcodes, code.operands) if op == STORE_LOCAL), default=0)
+            if self._snapshot is not None and self._bodies is self._snapshot.bodies:
+                self._bodies = dict(self._bodies)
+            entry = self._bodies[id(func)] = func, code, self._link(code), slots
+        return entry
+
+    # Runs a user function and everything it calls on one value stack.
+    # A frame's parameters start at `base`, its own values at `floor`; a
+    # call saves the caller's frame and switches to the callee's code.
+    def _execute(self, func: tuple[int, list[Instruction] | Code], params: list[object]) -> object:
+        namespace = self._namespace
+        values = namespace.values
+        names = namespace.names
+        bodies = self._bodies
+        memo = self._memo
+        translated = self._native is not None
+        profiler = self._profiler
+        meter = self._meter
+        operators = self._operators
+        stack = list(params)
+        frames = []
+        _, code, operands, slots = self._body(func)
+        opcodes, constants = code.opcodes, code.constants
+        local = [None] * slots if slots else ()
+        ip = 0
+        end = len(opcodes)
+        base = 0
+        floor = len(params)
+        pending = None # (results, key) to memoize the frame's result under
+        while True:
+            if ip == end:
+                if len(stack) != floor + 1:
+                    raise InterpreterError("function did not return correctly")
+                val = stack[-1]
+                del stack[base:]
+                if pending is not None:
+                    memo.insert(*pending, val)
+                if not frames:
+                    return val
+                if profiler is not None:
+                    profiler.leave()
+                if meter is not None:
+                    meter.depth -= 1
+                opcodes, operands, constants, local, ip, end, base, floor, pending = frames.pop()
+                stack.append(val)
+                continue
+            op = opcodes[ip]
+            arg = operands[ip]
+            ip += 1
+            if op == OPERATION:
+                if arg == _NEG:
+                    if len(stack) == floor:
+                        raise InterpreterError(f"insufficient stack for {Operation.NEG}")
+                    val = stack[-1]
+                    if val.__class__ is Value:
+                        raise InterpreterError("{arg} cannot be applied to callable")
+                    stack[-1] = -val
+                    continue
+                if len(stack) - floor < 2:
+                    raise InterpreterError(f"insufficient stack for {OPERATIONS[arg]}")
+                rhs = stack.pop()
+                lhs = stack[-1]
+                if rhs.__class__ is Value or lhs.__class__ is Value:
+                    raise InterpreterError("{arg} cannot be applied to callable")
+                if lhs.__class__ is ndarray or rhs.__class__ is ndarray:
+                    stack[-1] = arrays.operate(_OPERATOR_LIST[arg], lhs, rhs, operators[arg])
+                    continue
+                stack[-1] = operators[arg](lhs, rhs)
+            elif op == ARITHMETIC:
+                if arg == _NEG:
+                    stack[-1] = -stack[-1]
+                    continue
+                rhs = stack.pop()
+                lhs = stack[-1]
+                if lhs.__class__ is ndarray or rhs.__class__ is ndarray:
+                    stack[-1] = arrays.operate(_OPERATOR_LIST[arg], lhs, rhs, operators[arg])
+                    continue
+                stack[-1] = operators[arg](lhs, rhs)
+            elif op == PARAM:
+                if arg >= floor - base:
                     raise InterpreterError("invalid parameter access")
-                val = self._call_stack[-1][arg]
-                self._value_stack.append(val)
-            case InstructionType.CALL:
-                if not self._value_stack or len(self._value_stack) <= arg:
+                stack.append(stack[base + arg])
+            elif op == INT or op == FLOAT:
+                stack.append(constants[arg])
+            elif op == LOAD:
+                if (val := values[arg]) is None:
+                    raise InterpreterError(f"unknown name `{names[arg]}`")
+                stack.append(val)
+            elif op == CALL:
+                if len(stack) - floor <= arg:
                     raise InterpreterError("call with insufficient stack")
-                *params, func = self._value_stack[-arg-1:]
-                match func.type:
-                    case ValueType.FUNCTION:
-                        arg_count, instructions = func.inner
-                        _check_parameter_count(arg, arg_count)
-                        stack = self._value_stack
-                        self._value_stack = []
-                        self._call_stack.append(params)
-                        try:
-                            for i in instructions:
-                                self.interpret(i)
-                            if len(self._value_stack) != 1:
-                                raise InterpreterError("function did not return correctly")
-                            val = self._value_stack[0]
-                        finally:
-                            self._call_stack.pop()
-                            self._value_stack = stack
-                    case ValueType.BUILTIN:
-                        arg_count = len(signature(func.inner).parameters)
-                        _check_parameter_count(arg, arg_count)
-                        try:
-                            val = func.inner(*params)
-                        except Exception as e:
-                            raise InterpreterError(f"builtin raised {e!r}")
-                    case _:
-                        raise InterpreterError("called non-callable")
-                if arg:
-                    del self._value_stack[-arg:]
-                self._value_stack[-1] = val
-            case InstructionType.OPERATION:
-                stack_err = InterpreterError(f"insufficient stack for {arg}")
-                func_err  = InterpreterError("{arg} cannot be applied to callable")
-                if arg is Operation.NEG:
-                    if not self._value_stack:
-                        raise stack_err
-                    if self._value_stack[-1].type.is_callable():
-                        raise func_err 
-                    val = self._value_stack.pop()
-                    val = Value(val.type, -val.inner)
-                    self._value_stack.append(val)
-                elif len(self._value_stack) < 2:
-                    raise stack_err
-                elif self._value_stack[-1].type.is_callable() or self._value_stack[-2].type.is_callable():
-                    raise func_err
-                else:
-                    rhs = self._value_stack.pop().inner
-                    lhs = self._value_stack.pop().inner
-                    match arg:
-                        case Operation.ADD:
-                            op = lambda x, y: x + y
-                        case Operation.SUB:
-                            op = lambda x, y: x - y
-                        case Operation.MULT:
-                            op = lambda x, y: x * y
-                        case Operation.DIV:
-                            op = lambda x, y: x / y
-                        case Operation.IDIV:
-                            op = lambda x, y: x // y
-                        case Operation.POW:
-                            op = lambda x, y: x ** y
-                    val = op(lhs, rhs)
-                    type = ValueType.INT if isinstance(val, int) else ValueType.FLOAT
-                    self._value_stack.append(Value(type, val))
-            case InstructionType.INT:
-                self._value_stack.append(Value(ValueType.INT, arg))
-            case InstructionType.FLOAT:
-                self._value_stack.append(Value(ValueType.FLOAT, arg))
-            case InstructionType.FUNCTION:
-                self._value_stack.append(Value(ValueType.FUNCTION, arg))
+                func = stack[-1]
+                if func.__class__ is not Value or func.type is not ValueType.FUNCTION:
+                    val = self._invoke(func, stack[-arg-1:-1])
+                    del stack[-arg-1:]
+                    stack.append(val)
+                    continue
+                func = func.inner
+                _check_parameter_count(arg, func[0])
+                stack.pop()
+                callee = None
+                if memo is not None and (results := memo.results(func, namespace)) is not None and (key := _memo_key(stack[len(stack) - arg:])) is not None:
+                    if (val := memo.lookup(results, key)) is not None:
+                        del stack[len(stack) - arg:]
+                        stack.append(val)
+                        continue
+                    callee = results, key
+                if profiler is not None:
+                    profiler.enter(func)
+                if len(func) > 2 and func[2].holds(namespace):
+                    func = func[2].function
+                if profiler is not None:
+                    profiler.execute(self._code(func))
+                if translated and (native := self._native_function(func, stack[len(stack) - arg:])) is not None:
+                    val = native(*stack[len(stack) - arg:]) if meter is None else self._metered(func, stack[len(stack) - arg:])
+                    del stack[len(stack) - arg:]
+                    stack.append(val)
+                    if callee is not None:
+                        memo.insert(*callee, val)
+                    if profiler is not None:
+                        profiler.leave()
+                    continue
+                if len(frames) >= _MAX_DEPTH:
+                    raise CallDepthError("maximum call depth exceeded")
+                frames.append((opcodes, operands, constants, local, ip, end, base, floor, pending))
+                if (entry := bodies.get(id(func))) is None:
+                    entry = self._body(func)
+                _, code, operands, slots = entry
+                opcodes, constants = code.opcodes, code.constants
+                local = [None] * slots if slots else ()
+                ip = 0
+                end = len(opcodes)
+                if meter is not None:
+                    meter.enter(end)
+                base = len(stack) - arg
+                floor = len(stack)
+                pending = callee
+            elif op == LOAD_LOCAL:
+                if arg >= len(local) or (val := local[arg]) is None:
+                    raise InterpreterError("invalid local access")
+                stack.append(val)
+            elif op == STORE_LOCAL:
+                if len(stack) == floor:
+                    raise InterpreterError("store with empty stack")
+                local[arg] = stack[-1]
+            elif op == FUNCTION:
+                stack.append(Value(ValueType.FUNCTION, constants[arg]))
+            else: # STORE
+                if len(stack) == floor:
+                    raise InterpreterError("store with empty stack")
+                values[arg] = stack.pop()
+                if memo is not None:
+                    memo.invalidate(names[arg])
+
+    def _translate(self, func: tuple[int, list[Instruction]]) -> Callable[..., object] | None:
+        if (entry := self._native.get(id(func))) is not None:
+            return entry[2]
+        if self._runtime is None:
+            self._runtime = {
+                "_globals": self._namespace.values,
+                "_invoke": self._invoke,
+                "_Value": Value,
+                "_Error": InterpreterError,
+            }
+            if self._operators is not _OPERATOR_LIST:
+                self._runtime["_multiply"] = self._operators[_OPERATOR_INDEX[Operation.MULT]]
+                self._runtime["_power"] = self._operators[_OPERATOR_INDEX[Operation.POW]]
+        if self._snapshot is not None and id(func) in self._snapshot.translations:
+            translation = self._snapshot.translations[id(func)]
+        else:
+            translation = translate(func[0], func[1], self._runtime, self._namespace.slot)
+        native = None if translation is None else translation.bind(self._runtime)
+        self._native[id(func)] = func, translation, native
+        return native
+
+    def _tables(self) -> int:
+        return len(self._bodies) + (0 if self._native is None else len(self._native)) + (0 if self._memo is None else len(self._memo))
+
+    # Functions are tuples, which cannot be weakly referenced, so the entries
+    # of rebound functions stay in the tables until they are collected here,
+    # each time the tables have doubled since.  A function still running, or
+    # held outside the namespace, is only compiled again.
+    def _collect(self):
+        live = set()
+        pending = [val.inner for val in self._namespace.values if val.__class__ is Value and val.type is ValueType.FUNCTION]
+        while pending:
+            if id(func := pending.pop()) in live:
+                continue
+            live.add(id(func))
+            if (body := func[1]).__class__ is Code:
+                pending.extend(body.constants[arg] for op, arg in zip(body.opcodes, body.operands) if op == FUNCTION)
+            else:
+                pending.extend(i.argument for i in body if i.type is InstructionType.FUNCTION)
+            if len(func) > 2:
+                pending.append(func[2].function)
+        # the bodies of a snapshot stay alive with it anyway
+        if self._snapshot is None or self._bodies is not self._snapshot.bodies:
+            self._bodies = {key: entry for key, entry in self._bodies.items() if key in live}
+        if self._native is not None:
+            self._native = {key: entry for key, entry in self._native.items() if key in live}
+        if self._memo is not None:
+            self._memo.retain(live)
+        self._collect_at = max(_COLLECT_AT, 2 * self._tables())
+
+    def _operation(self, op: Operation):
+        stack = self._value_stack
+        if op is Operation.NEG:
+            if not stack:
+                raise InterpreterError(f"insufficient stack for {op}")
+            val = stack[-1]
+            if val.__class__ is Value:
+                raise InterpreterError("{arg} cannot be applied to callable")
+            stack[-1] = -val
+            return
+        if len(stack) < 2:
+            raise InterpreterError(f"insufficient stack for {op}")
+        if stack[-1].__class__ is Value or stack[-2].__class__ is Value:
+            raise InterpreterError("{arg} cannot be applied to callable")
+        rhs = stack.pop()
+        lhs = stack[-1]
+        if lhs.__class__ is ndarray or rhs.__class__ is ndarray:
+            stack[-1] = arrays.operate(_OPERATORS[op], lhs, rhs, self._operators[_OPERATOR_INDEX[op]])
+            return
+        stack[-1] = self._operators[_OPERATOR_INDEX[op]](lhs, rhs)
+
+    def _load_name(self, index: int):
+        namespace = self._namespace
+        if (slot := namespace.slots.get(name := self._names[index])) is None or (val := namespace.values[slot]) is None:
+            raise InterpreterError(f"unknown name `{name}`")
+        self._value_stack.append(val)
+
+    def _store_name(self, index: int):
+        self._store(self._names[index])
+
+    def _operation_index(self, index: int):
+        self._operation(OPERATIONS[index])
+
+    def _number_constant(self, index: int):
+        self._value_stack.append(self._constants[index])
+
+    def _function_constant(self, index: int):
+        self._value_stack.append(Value(ValueType.FUNCTION, self._constants[index]))
+
+    def _number(self, val: int | float):
+        self._value_stack.append(val)
+
+    def _function(self, func: tuple[int, list[Instruction]]):
+        self._value_stack.append(Value(ValueType.FUNCTION, func))
+
+    @property
+    def memo_statistics(self) -> CacheStatistics | None:
+        return None if self._memo is None else self._memo.statistics
+
+    @property
+    def update_statistics(self) -> UpdateStatistics | None:
+        return None if self._sheet is None else self._sheet.statistics
+
+    # a live view of the global bindings, including builtins
+    @property
+    def globals(self) -> Globals:
+        return Globals(self)
+
+    # for embedders, binds like a STORE, or unbinds if `val` is None
+    def _bind(self, name: str, val: object | None):
+        old = self._namespace.get(name)
+        if val is None:
+            self._namespace.pop(name, None)
+        else:
+            self._namespace[name] = val
+        if self._memo is not None:
+            self._memo.invalidate(name)
+        if self._tables() > self._collect_at:
+            self._collect()
+        if self._sheet is not None:
+            self._update(name, None, old)
+
+    # copies of the global bindings, including builtins, for use with `rebind()`
+    def bindings(self) -> dict[str, Value]:
+        return {name: _box(val) for name, val in self._namespace.items()}
+
+    def rebind(self, bindings: Mapping[str, Value]):
+        names = self._namespace.keys() | bindings.keys()
+        self._namespace.clear()
+        self._namespace.update((name, _unbox(val)) for name, val in bindings.items())
+        if self._memo is not None:
+            for name in names:
+                self._memo.invalidate(name)
+        if self._sheet is not None:
+            self._sheet.reset()
+
+    # a frozen copy of the global bindings, with the bodies of the functions
+    # bound to them compiled and linked, see Snapshot
+    def snapshot(self) -> Snapshot:
+        bodies = {}
+        translations = {}
+        pending = [val.inner for val in self._namespace.values if val.__class__ is Value and val.type is ValueType.FUNCTION]
+        while pending:
+            if id(func := pending.pop()) in bodies:
+                continue
+            # linking gives unbound globals their slots, before the namespace is copied
+            _, code, _, _ = bodies[id(func)] = self._body(func)
+            pending.extend(code.constants[arg] for op, arg in zip(code.opcodes, code.operands) if op == FUNCTION)
+            if self._native is not None:
+                self._translate(func)
+                translations[id(func)] = self._native[id(func)][1]
+            if len(func) > 2:
+                pending.append(func[2].function)
+        return Snapshot(self._namespace.copy(), bodies, translations, dict(self._arity), self._options)
+
+    # back to the bindings of the snapshot this interpreter is a context of
+    def reset(self):
+        if self._snapshot is None:
+            raise InterpreterError("not a context of a snapshot")
+        values, names = self._namespace.values, self._namespace.names
+        frozen = self._snapshot.namespace.values
+        for slot, val in enumerate(values):
+            if val is not (old := frozen[slot] if slot < len(frozen) else None):
+                values[slot] = old
+                if self._memo is not None:
+                    self._memo.invalidate(names[slot])
+        if self._sheet is not None:
+            self._sheet.reset()
+
+    def take_stack(self) -> list[Value]:
+        stack = self._value_stack
+        self._value_stack = []
+        return list(map(_box, stack))
 
     def output_stack(self):
-        for val in self._value_stack:
+        for val in self.take_stack():
             print(val)
-        self._value_stack.clear()
+
+# see Interpreter.evaluation
+class Evaluation:
+    __slots__ = "_interpreter", "_outermost"
+
+    def __init__(self, interpreter: Interpreter):
+        self._interpreter = interpreter
+        self._outermost = False
+
+    def __enter__(self):
+        interpreter = self._interpreter
+        if interpreter._budget is not None and interpreter._meter is None:
+            interpreter._meter = _Meter(interpreter._budget)
+            self._outermost = True
+
+    def __exit__(self, *exception: object):
+        if self._outermost:
+            self._interpreter._meter = None
+            self._outermost = False
+
+# The global bindings of an interpreter and the compiled bodies of the
+# functions bound to them, never written after they are taken, so that
+# interpreters on many threads can share them.  Each thread evaluates in
+# a context of its own: an interpreter with its own stacks, memo and
+# translations, and a copy of the namespace's slots that its STOREs go
+# to.  The bodies are shared until a context compiles a function of its
+# own, which it does in a copy; native translations are compiled once and
+# bound to the runtime of each context.
+@dataclass(frozen=True, slots=True)
+class Snapshot:
+    namespace: Namespace
+    bodies: dict[int, tuple[tuple, Code, list[int], int]] # see Interpreter._body
+    translations: dict[int, Translation | None] # by id(function), if native
+    arity: dict[Callable, tuple[int, bool]]
+    options: dict[str, object]
+
+    def context(self) -> Interpreter:
+        interpreter = Interpreter((), **self.options)
+        interpreter._namespace = self.namespace.copy()
+        interpreter._bodies = self.bodies
+        interpreter._arity = dict(self.arity)
+        interpreter._snapshot = self
+        return interpreter
+
+# What builtins that call functions get: a builtin declaring a keyword-only
+# parameter `caller` is passed the `Caller` of the interpreter running it.
+# Functions are resolved once per builtin call, globals cannot be rebound
+# while it runs.
+class Caller:
+    __slots__ = "_interpreter",
+
+    def __init__(self, interpreter: Interpreter):
+        self._interpreter = interpreter
+
+    # a Python function calling `func` with `argc` plain numbers, for many calls
+    def function(self, func: Value, argc: int) -> Callable[..., object]:
+        function = self._function(func, argc)
+        def call(*args: object) -> object:
+            try:
+                return function(*args)
+            except Exception as e:
+                raise _CallbackError(e) from None
+        return call
+
+    # `function` without marking the errors of the calls as the callee's,
+    # the arity is checked here so that a mismatch is the builtin's error
+    def _function(self, func: Value, argc: int) -> Callable[..., object]:
+        interpreter = self._interpreter
+        if not func.type.is_callable():
+            raise InterpreterError("called non-callable")
+        if func.type is ValueType.BUILTIN:
+            if (arity := interpreter._arity.get(func.inner)) is None:
+                arity = interpreter._arity[func.inner] = _arity(func.inner)
+            _check_parameter_count(argc, arity[0])
+        else:
+            _check_parameter_count(argc, func.inner[0])
+        if func.type is not ValueType.FUNCTION or interpreter._memo is not None or interpreter._profiler is not None or interpreter._meter is not None:
+            invoke = interpreter._invoke
+            if interpreter._meter is None:
+                return lambda *args: invoke(func, list(args))
+            # each call costs an instruction, so that the deadline also
+            # stops loops over builtins, which run no instructions of their own
+            charge = interpreter._meter.charge
+            def metered(*args: object) -> object:
+                charge(1)
+                return invoke(func, list(args))
+            return metered
+        inner = func.inner
+        if len(inner) > 2 and inner[2].holds(interpreter._namespace):
+            inner = inner[2].function
+        if interpreter._native is not None and (native := interpreter._translate(inner)) is not None:
+            return native
+        execute = interpreter._execute
+        return lambda *args: execute(inner, args)
+
+    # evaluates `func` of one parameter at a list of points, as a list of
+    # numbers; float points go to `func` as one array where NumPy is available
+    # and `func` computes the same finite numbers on arrays, int64 arrays
+    # overflow where ints do not
+    def batch(self, func: Value) -> Callable[[list], list]:
+        function = self._function(func, 1)
+        invoke = self._interpreter._invoke
+        meter = self._interpreter._meter
+        vectorized = arrays.numpy is not None
+        def evaluate(points: list) -> list:
+            nonlocal vectorized
+            if vectorized and points and points[0].__class__ is float:
+                # a call on an array is charged like one on a number
+                if meter is not None:
+                    meter.charge(1)
+                if (values := arrays.evaluate(lambda x: invoke(func, [x]), points)) is not None:
+                    return values
+                vectorized = False
+            try:
+                values = list(map(function, points))
+            except Exception as e:
+                raise _CallbackError(e) from None
+            for y in values:
+                if y.__class__ is Value:
+                    raise InterpreterError("function returned a callable")
+            return values
+        return evaluate
+
+# The global bindings of an interpreter as a mapping of `Value`s.  Writes
+# act like STOREs of plain values: memoized results that depend on the name
+# are dropped, and in incremental mode its dependents are recomputed.
+class Globals(MutableMapping[str, Value]):
+    __slots__ = "_interpreter",
+
+    def __init__(self, interpreter: Interpreter):
+        self._interpreter = interpreter
+
+    def __getitem__(self, name: str) -> Value:
+        return _box(self._interpreter._namespace[name])
+
+    def get(self, name: str, default: Value | None = None) -> Value | None:
+        val = self._interpreter._namespace.get(name)
+        return default if val is None else _box(val)
+
+    def __setitem__(self, name: str, val: Value):
+        self._interpreter._bind(name, _unbox(val))
+
+    def __delitem__(self, name: str):
+        if name not in self._interpreter._namespace:
+            raise KeyError(name)
+        self._interpreter._bind(name, None)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._interpreter._namespace
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._interpreter._namespace)
+
+    def __len__(self) -> int:
+        return len(self._interpreter._namespace)
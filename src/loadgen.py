@@ -0,0 +1,86 @@
+from __future__ import annotations
+from argparse import ArgumentParser
+import asyncio
+import os
+from server import Histogram
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+from time import perf_counter, sleep
+
+PRELUDE = "f(t, v, s) = -1/2*g*t**2+v*t+s\nh(t)=f(t, 0, 0)\ng=9.81\n"
+
+async def _connect(args) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    if args.unix is not None:
+        return await asyncio.open_unix_connection(args.unix)
+    return await asyncio.open_connection(args.host, args.port)
+
+async def _session(args, latency: Histogram, errors: list[int], start: asyncio.Event):
+    await start.wait()
+    reader, writer = await _connect(args)
+    request = (args.query + "\n").encode()
+    try:
+        for first in range(0, args.requests, args.pipeline):
+            count = min(args.pipeline, args.requests - first)
+            sent = perf_counter()
+            writer.write(request * count)
+            for _ in range(count):
+                response = await reader.readline()
+                latency.record(perf_counter() - sent)
+                if not response.startswith(b"ok"):
+                    errors[0] += 1
+    finally:
+        writer.close()
+
+async def _run(args) -> tuple[Histogram, int, float]:
+    latency = Histogram()
+    errors = [0]
+    start = asyncio.Event()
+    sessions = [asyncio.create_task(_session(args, latency, errors, start)) for _ in range(args.sessions)]
+    await asyncio.sleep(0)
+    began = perf_counter()
+    start.set()
+    results = await asyncio.gather(*sessions, return_exceptions=True)
+    elapsed = perf_counter() - began
+    errors[0] += sum(isinstance(r, BaseException) for r in results)
+    return latency, errors[0], elapsed
+
+def _spawn(args, directory: str) -> subprocess.Popen:
+    prelude = os.path.join(directory, "prelude")
+    with open(prelude, "w") as f:
+        f.write(PRELUDE)
+    args.unix = os.path.join(directory, "socket")
+    server = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+    command = [sys.executable, server, "--unix", args.unix, "--prelude", prelude, "--max-sessions", str(args.sessions)]
+    process = subprocess.Popen(command)
+    while not os.path.exists(args.unix):
+        if process.poll() is not None:
+            raise SystemExit("server did not start")
+        sleep(0.05)
+    return process
+
+def main():
+    parser = ArgumentParser(description="measure request latency of the evaluation server under many sessions")
+    parser.add_argument("--unix", metavar="PATH", help="connect to a Unix socket instead of TCP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--spawn", action="store_true", help="start a local server with a sample prelude")
+    parser.add_argument("--sessions", type=int, default=1000, help="concurrent connections")
+    parser.add_argument("--requests", type=int, default=20, help="requests per session")
+    parser.add_argument("--pipeline", type=int, default=1, help="requests sent before reading responses")
+    parser.add_argument("--query", default="clamp(h(1), -10, 0) f(1, 5, 5)")
+    args = parser.parse_args()
+    with TemporaryDirectory() as directory:
+        process = _spawn(args, directory) if args.spawn else None
+        try:
+            latency, errors, elapsed = asyncio.run(_run(args))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+    summary = latency.summary()
+    print(f"{args.sessions} sessions, {summary['count']:,} requests in {elapsed:.2f}s ({summary['count'] / elapsed:,.0f}/s), {errors} errors")
+    print(f"latency p50 {summary['p50'] * 1e3:.2f}ms  p90 {summary['p90'] * 1e3:.2f}ms  p99 {summary['p99'] * 1e3:.2f}ms  max {summary['max'] * 1e3:.2f}ms")
+
+if __name__ == "__main__":
+    main()
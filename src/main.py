@@ -1,9 +1,24 @@
 from compiler import compile
 from interpreter import Interpreter
 from parser import Parser
+import sys
 from tokenizer import Tokenizer
 
+# runs each statement as soon as it is parsed, so memory does not grow with the input
+def run_stream(source, interpreter: Interpreter):
+    for statement in Parser(Tokenizer(source)):
+        for i in compile(statement):
+            interpreter.interpret(i)
+        interpreter.output_stack()
+
 def main():
+    if len(sys.argv) > 1:
+        if sys.argv[1] == "-":
+            run_stream(sys.stdin.buffer, Interpreter())
+        else:
+            with open(sys.argv[1], "rb") as f:
+                run_stream(f, Interpreter())
+        return
     text =\
 """
 f(t, v, s) = -1/2*g*t**2+v*t+s
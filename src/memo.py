@@ -0,0 +1,108 @@
+from __future__ import annotations
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Mapping
+from dataclasses import dataclass
+from instructions import Instruction, InstructionType
+
+"""
+Result caches for user functions that only depend on their parameters,
+constants, globals and other such functions.
+
+A function qualifies if it never calls a parameter and every global it
+loads is currently bound to a number, to one of the given pure builtins,
+to another qualifying function, or to nothing at all.  The transitive set
+of globals it loads is recorded, and storing to any of them drops both
+the function's cached results and the analysis itself.
+"""
+
+@dataclass(slots=True)
+class CacheStatistics:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+
+Function = tuple[int, list[Instruction]]
+
+class Memo:
+    __slots__ = "size", "statistics", "_pure_builtins", "_entries", "_dependents"
+
+    def __init__(self, size: int, pure_builtins: Iterable[Callable]):
+        self.size = size
+        self.statistics = CacheStatistics()
+        self._pure_builtins = frozenset(pure_builtins)
+        # id(function) -> (function, results or None if it does not qualify, loaded globals)
+        self._entries: dict[int, tuple[Function, OrderedDict | None, frozenset[str]]] = {}
+        # global -> ids of functions that load it (transitively)
+        self._dependents: dict[str, set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # forgets the functions whose ids are not in `live`
+    def retain(self, live: set[int]):
+        self._entries = {key: entry for key, entry in self._entries.items() if key in live}
+        for name, dependents in list(self._dependents.items()):
+            dependents &= live
+            if not dependents:
+                del self._dependents[name]
+
+    def results(self, func: Function, namespace: Mapping[str, object]) -> OrderedDict | None:
+        if (entry := self._entries.get(id(func))) is None:
+            entry = self._analyze(func, namespace, set())
+        return entry[1]
+
+    def _analyze(self, func: Function, namespace: Mapping[str, object], active: set[int]) -> tuple:
+        if (entry := self._entries.get(id(func))) is not None:
+            return entry
+        active.add(id(func))
+        pure = True
+        names = set()
+        previous = None
+        for i in func[1]:
+            match i.type:
+                case InstructionType.LOAD:
+                    names.add(i.argument)
+                case InstructionType.CALL if previous is not InstructionType.LOAD:
+                    pure = False
+                case InstructionType.STORE | InstructionType.FUNCTION:
+                    pure = False
+            previous = i.type
+        dependencies = set(names)
+        for name in names:
+            # numbers and arrays are bound as they are, callables as values
+            if (inner := getattr(namespace.get(name), "inner", None)) is None:
+                continue
+            if callable(inner):
+                pure &= inner in self._pure_builtins
+            elif id(inner) in active:
+                pure = False
+            else:
+                _, results, loaded = self._analyze(inner, namespace, active)
+                pure &= results is not None
+                dependencies |= loaded
+        active.discard(id(func))
+        entry = func, OrderedDict() if pure else None, frozenset(dependencies)
+        self._entries[id(func)] = entry
+        for name in dependencies:
+            self._dependents.setdefault(name, set()).add(id(func))
+        return entry
+
+    def lookup(self, results: OrderedDict, key: tuple) -> object | None:
+        if (result := results.get(key)) is None:
+            self.statistics.misses += 1
+            return None
+        self.statistics.hits += 1
+        results.move_to_end(key)
+        return result
+
+    def insert(self, results: OrderedDict, key: tuple, result: object):
+        results[key] = result
+        if len(results) > self.size:
+            results.popitem(last=False)
+            self.statistics.evictions += 1
+
+    def invalidate(self, name: str):
+        for key in self._dependents.pop(name, ()):
+            if (entry := self._entries.pop(key, None)) is not None and entry[1]:
+                self.statistics.invalidations += len(entry[1])
@@ -0,0 +1,74 @@
+from __future__ import annotations
+from collections.abc import Iterable, Iterator, MutableMapping
+
+"""
+The global bindings of an interpreter, stored by slot.
+
+Every name gets a slot the first time it is bound or looked up, and keeps
+it for the lifetime of the namespace, so code can be linked against the
+namespace once (its LOAD and STORE operands replaced by slots) and then
+read and write `values` by index.  An unbound name is a slot holding None;
+unbinding a name, or clearing the namespace, never frees its slot.  The
+`values` list itself is never replaced, so linked code and translated
+functions may hold on to it.
+
+As a mapping, a namespace only shows its bound names.
+"""
+
+class Namespace(MutableMapping[str, object]):
+    __slots__ = "values", "names", "slots"
+
+    def __init__(self, bindings: Iterable[tuple[str, object]] = ()):
+        self.values: list[object | None] = [] # by slot
+        self.names: list[str] = [] # by slot
+        self.slots: dict[str, int] = {}
+        self.update(bindings)
+
+    def slot(self, name: str) -> int:
+        if (slot := self.slots.get(name)) is None:
+            slot = self.slots[name] = len(self.names)
+            self.names.append(name)
+            self.values.append(None)
+        return slot
+
+    def get(self, name: str, default: object | None = None) -> object | None:
+        if (slot := self.slots.get(name)) is None or (val := self.values[slot]) is None:
+            return default
+        return val
+
+    def __getitem__(self, name: str) -> object:
+        if (val := self.get(name)) is None:
+            raise KeyError(name)
+        return val
+
+    def __setitem__(self, name: str, val: object):
+        self.values[self.slot(name)] = val
+
+    def __delitem__(self, name: str):
+        if self.get(name) is None:
+            raise KeyError(name)
+        self.values[self.slots[name]] = None
+
+    def __contains__(self, name: object) -> bool:
+        return self.get(name) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return (name for name, val in zip(self.names, self.values) if val is not None)
+
+    def __len__(self) -> int:
+        return len(self.values) - self.values.count(None)
+
+    def clear(self):
+        self.values[:] = [None] * len(self.values)
+
+    # a namespace with the same slots and bindings that changes independently,
+    # so code linked against this one runs against it too
+    def copy(self) -> Namespace:
+        namespace = Namespace()
+        namespace.values.extend(self.values)
+        namespace.names.extend(self.names)
+        namespace.slots.update(self.slots)
+        return namespace
+
+    def __repr__(self) -> str:
+        return f"Namespace({dict(self)!r})"
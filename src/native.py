@@ -0,0 +1,156 @@
+from collections.abc import Callable, Container, Mapping
+from dataclasses import dataclass
+from instructions import Instruction, InstructionType, Operation
+from types import CodeType
+
+"""
+Translates the instructions of a user function into the source of an
+equivalent Python function, which is then compiled with `compile()`.  A
+compiled `Translation` is bound to the runtime of an interpreter to get
+the function, so interpreters sharing a snapshot compile it only once.
+
+The translation keeps the evaluation order of the stack machine: every
+instruction that may raise (LOAD, OPERATION, CALL) becomes one statement,
+constants, PARAMs and locals are referenced directly.  Values are the
+interpreter's own: numbers are plain ints and floats, callables are
+`Value`s.  Values that may be callable (params, loaded globals, call
+results) are checked before their first arithmetic use, exactly where
+the interpreter would check them; ARITHMETIC operands are known to be
+numbers and never checked.
+
+The generated code refers to these runtime names, supplied by the caller:
+_globals the values of the global namespace by slot, read on every LOAD
+         for late binding, None where a name is unbound
+_invoke  calls a callable with a list of parameters
+_Value   the `Value` class
+_Error   the exception raised for interpreter errors
+
+and optionally, to check the size of int results under a budget:
+_multiply, _power  called for `*` and `**` instead of the operators
+"""
+
+_SYMBOLS = {
+    Operation.ADD:  "+",
+    Operation.SUB:  "-",
+    Operation.MULT: "*",
+    Operation.DIV:  "/",
+    Operation.IDIV: "//",
+    Operation.POW:  "**",
+}
+
+# operations that call a runtime function where the runtime supplies one
+_FUNCTIONS = {
+    Operation.MULT: "_multiply",
+    Operation.POW:  "_power",
+}
+
+_CALLABLE_ERROR = "raise _Error('{arg} cannot be applied to callable')"
+
+class _Translator:
+    __slots__ = "_slot", "_functions", "_lines", "_stack", "_constants", "_checked", "_temps", "_locals"
+
+    def __init__(self, slot: Callable[[str], int], functions: dict[Operation, str]):
+        self._slot = slot
+        self._functions = functions
+        self._lines = []
+        self._stack = [] # tuple[str, bool], the expression and whether it may be callable
+        self._constants = {}
+        self._checked = set()
+        self._temps = 0
+        self._locals = {} # slot -> stack entry, every stack entry is a plain name
+
+    def _temp(self) -> str:
+        self._temps += 1
+        return f"t{self._temps}"
+
+    def _constant(self, val: object) -> str:
+        name = f"c{len(self._constants)}"
+        self._constants[name] = val
+        return name
+
+    def _check(self, *entries: tuple[str, bool]) -> list[str]:
+        unchecked = list(dict.fromkeys(e for e, unknown in entries if unknown and e not in self._checked))
+        if unchecked:
+            test = " or ".join(f"{e}.__class__ is _Value" for e in unchecked)
+            self._lines.append(f"if {test}: {_CALLABLE_ERROR}")
+            self._checked.update(unchecked)
+        return [e for e, _ in entries]
+
+    def translate(self, argc: int, instructions: list[Instruction]) -> str | None:
+        stack = self._stack
+        for i in instructions:
+            arg = i.argument
+            match i.type:
+                case InstructionType.INT | InstructionType.FLOAT:
+                    stack.append((self._constant(arg), False))
+                case InstructionType.PARAM:
+                    if arg >= argc:
+                        return None
+                    stack.append((f"p{arg}", True))
+                case InstructionType.LOAD:
+                    t = self._temp()
+                    self._lines.append(f"{t} = _globals[{self._slot(arg)}]")
+                    self._lines.append(f"if {t} is None: raise _Error({f'unknown name `{arg}`'!r})")
+                    stack.append((t, True))
+                case InstructionType.OPERATION | InstructionType.ARITHMETIC if arg is Operation.NEG:
+                    if not stack:
+                        return None
+                    expr = stack.pop()[0] if i.type is InstructionType.ARITHMETIC else self._check(stack.pop())[0]
+                    t = self._temp()
+                    self._lines.append(f"{t} = -{expr}")
+                    stack.append((t, False))
+                case InstructionType.OPERATION | InstructionType.ARITHMETIC:
+                    if len(stack) < 2:
+                        return None
+                    rhs = stack.pop()
+                    lhs = stack.pop()
+                    lhs, rhs = (lhs[0], rhs[0]) if i.type is InstructionType.ARITHMETIC else self._check(lhs, rhs)
+                    t = self._temp()
+                    if (function := self._functions.get(arg)) is not None:
+                        self._lines.append(f"{t} = {function}({lhs}, {rhs})")
+                    else:
+                        self._lines.append(f"{t} = {lhs} {_SYMBOLS[arg]} {rhs}")
+                    stack.append((t, False))
+                case InstructionType.STORE_LOCAL:
+                    if not stack:
+                        return None
+                    self._locals[arg] = stack[-1]
+                case InstructionType.LOAD_LOCAL:
+                    if (entry := self._locals.get(arg)) is None:
+                        return None
+                    stack.append(entry)
+                case InstructionType.CALL:
+                    if len(stack) <= arg:
+                        return None
+                    func = stack.pop()[0]
+                    params = ", ".join(e for e, _ in stack[len(stack) - arg:])
+                    del stack[len(stack) - arg:]
+                    t = self._temp()
+                    self._lines.append(f"{t} = _invoke({func}, [{params}])")
+                    stack.append((t, True))
+                case _:
+                    return None
+        if len(stack) != 1:
+            return None
+        self._lines.append(f"return {stack[0][0]}")
+        params = ", ".join(f"p{i}" for i in range(argc))
+        body = "".join(f"\n    {line}" for line in self._lines)
+        return f"def function({params}):{body}"
+
+@dataclass(frozen=True, slots=True)
+class Translation:
+    code: CodeType
+    constants: dict[str, object]
+
+    def bind(self, runtime: Mapping[str, object]) -> Callable:
+        namespace = {**runtime, **self.constants}
+        exec(self.code, namespace)
+        return namespace["function"]
+
+# `runtime` holds the names the caller will supply, `slot` gives the slot
+# of a global name in `_globals`
+def translate(argc: int, instructions: list[Instruction], runtime: Container[str], slot: Callable[[str], int]) -> Translation | None:
+    translator = _Translator(slot, {op: name for op, name in _FUNCTIONS.items() if name in runtime})
+    if (source := translator.translate(argc, instructions)) is None:
+        return None
+    return Translation(compile(source, "<function>", "exec"), translator._constants)
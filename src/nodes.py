@@ -17,6 +17,9 @@ class NodeType(Enum):
     INT            = auto() # int
     FLOAT          = auto() # float
 
+    # see InstructionType
+    __hash__ = object.__hash__
+
 @dataclass(frozen=True, slots=True)
 class Node:
     type: NodeType
@@ -39,3 +42,87 @@ class Node:
             case NodeType.POWER: return f"({data[0]})**({data[1]})"
             case NodeType.CALL: return f"{data[0]}({','.join(map(str, data[1]))})"
             case NodeType.IDENTIFIER | NodeType.INT | NodeType.FLOAT: return str(data)
+
+# A flat `Node` tree: node types and data in postorder, so every node comes
+# after its operands and the root is last.  Operands are found by arity
+# alone, and a stack machine evaluates the nodes in order:
+# ASSIGNMENT     str, after its right-hand side
+# DEFINITION     tuple[str, tuple[str, ...]], the name and the parameters, after the body
+# NEGATION       None, after its operand
+# CALL           tuple[str, int], the name and the number of arguments, after the arguments
+# the other operations None, after both operands, literals and identifiers as in `Node`
+class Tree:
+    __slots__ = "types", "data"
+
+    def __init__(self, types: list[NodeType] | None = None, data: list[object] | None = None):
+        self.types = [] if types is None else types
+        self.data = [] if data is None else data
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def __eq__(self, other: object) -> bool:
+        return other.__class__ is Tree and self.types == other.types and self.data == other.data
+
+    def __repr__(self) -> str:
+        return f"Tree({len(self)} nodes)"
+
+    @property
+    def type(self) -> NodeType:
+        return self.types[-1]
+
+    @classmethod
+    def of(cls, node: Node) -> Tree:
+        types = []
+        data = []
+        # children are pushed left to right, so nodes come out in reverse postorder
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            types.append(node.type)
+            match node.type:
+                case NodeType.ASSIGNMENT:
+                    name, rhs = node.data
+                    data.append(name)
+                    stack.append(rhs)
+                case NodeType.DEFINITION:
+                    name, params, body = node.data
+                    data.append((name, tuple(params)))
+                    stack.append(body)
+                case NodeType.NEGATION:
+                    data.append(None)
+                    stack.append(node.data)
+                case NodeType.CALL:
+                    name, args = node.data
+                    data.append((name, len(args)))
+                    stack.extend(args)
+                case NodeType.IDENTIFIER | NodeType.INT | NodeType.FLOAT:
+                    data.append(node.data)
+                case _:
+                    data.append(None)
+                    stack.extend(node.data)
+        types.reverse()
+        data.reverse()
+        return cls(types, data)
+
+    def node(self) -> Node:
+        stack = []
+        for type, data in zip(self.types, self.data):
+            match type:
+                case NodeType.IDENTIFIER | NodeType.INT | NodeType.FLOAT:
+                    stack.append(Node(type, data))
+                case NodeType.NEGATION:
+                    stack[-1] = Node(type, stack[-1])
+                case NodeType.CALL:
+                    name, count = data
+                    args = tuple(stack[len(stack) - count:])
+                    del stack[len(stack) - count:]
+                    stack.append(Node(type, (name, args)))
+                case NodeType.ASSIGNMENT:
+                    stack[-1] = Node(type, (data, stack[-1]))
+                case NodeType.DEFINITION:
+                    stack[-1] = Node(type, (*data, stack[-1]))
+                case _:
+                    rhs = stack.pop()
+                    stack[-1] = Node(type, (stack[-1], rhs))
+        return stack[-1]
@@ -0,0 +1,137 @@
+from collections.abc import Callable
+from math import fsum, isfinite
+
+"""
+Numerical methods behind the higher-order builtins.  Functions come in as
+plain Python callables over numbers; `integrate` and `total` take an
+`evaluate` that maps a list of points to the list of values there, so
+the caller can evaluate whole batches at once.
+
+`integrate` is adaptive Gauss-Kronrod quadrature (7 Gauss, 15 Kronrod
+points) that refines many intervals at once: until the error estimates
+|K15 - G7| add up to less than the tolerance, each round halves every
+interval whose error estimate is above the average share of the
+tolerance, and evaluates all the new intervals in one batch.
+
+`solve` is the Illinois variant of regula falsi.  Its bracket always
+holds a sign change, and a step that does not halve it is followed by a
+bisection, so it converges at least half as fast as bisection.
+"""
+
+_NODES = (
+    0.991455371120812639206854697526329, 0.949107912342758524526189684047851,
+    0.864864423359769072789712788640926, 0.741531185599394439863864773280788,
+    0.586087235467691130294144845693013, 0.405845151377397166906606412076961,
+    0.207784955007898467600689403773245,
+)
+_KRONROD_WEIGHTS = (
+    0.022935322010529224963732008058970, 0.063092092629978553290700663189204,
+    0.104790010322250183839876322541518, 0.140653259715525918745189590510238,
+    0.169004726639267902826583426598550, 0.190350578064785409913256402421014,
+    0.204432940075298892414161999234649,
+)
+_GAUSS_WEIGHTS = 0.0, 0.129484966168869693270611432679082, 0.0, 0.279705391489276667901467771423780, 0.0, 0.381830050505118944950369775488975, 0.0
+_CENTER_KRONROD_WEIGHT = 0.209482141084727828012999174891714
+_CENTER_GAUSS_WEIGHT = 0.417959183673469387755102040816327
+
+# per interval: the points on the left of the center, the center, the points on the right
+_OFFSETS = tuple(-x for x in _NODES) + (0.0,) + _NODES[::-1]
+_KRONROD = _KRONROD_WEIGHTS + (_CENTER_KRONROD_WEIGHT,) + _KRONROD_WEIGHTS[::-1]
+_GAUSS = _GAUSS_WEIGHTS + (_CENTER_GAUSS_WEIGHT,) + _GAUSS_WEIGHTS[::-1]
+
+_RELATIVE_TOLERANCE = 1e-10
+_ABSOLUTE_TOLERANCE = 1e-12
+_MAX_EVALUATIONS = 5_000_000
+
+def integrate(evaluate: Callable[[list[float]], list], a: float, b: float) -> float:
+    if not isfinite(a) or not isfinite(b):
+        raise ValueError("bounds of `integrate()` must be finite")
+    if a == b:
+        return 0.0
+    intervals = [] # (lo, hi, estimate, error estimate)
+    split = [(a, b)]
+    evaluations = 0
+    while True:
+        points = []
+        for lo, hi in split:
+            center = (lo + hi) / 2
+            half = (hi - lo) / 2
+            points.extend([center + half * x for x in _OFFSETS])
+        evaluations += len(points)
+        values = evaluate(points)
+        for i, (lo, hi) in enumerate(split):
+            ys = values[15 * i:15 * i + 15]
+            half = (hi - lo) / 2
+            kronrod = half * sum([w * y for w, y in zip(_KRONROD, ys)])
+            gauss = half * sum([w * y for w, y in zip(_GAUSS, ys)])
+            if not isfinite(error := abs(kronrod - gauss)):
+                raise ValueError("`integrate()` did not converge")
+            intervals.append((lo, hi, kronrod, error))
+        estimate = fsum([i[2] for i in intervals])
+        tolerance = max(_ABSOLUTE_TOLERANCE, _RELATIVE_TOLERANCE * abs(estimate))
+        if fsum([i[3] for i in intervals]) <= tolerance:
+            return estimate
+        if evaluations >= _MAX_EVALUATIONS:
+            raise ValueError("`integrate()` did not converge")
+        # some interval is above the average share of the tolerance
+        share = tolerance / len(intervals)
+        kept = []
+        split = []
+        for interval in intervals:
+            lo, hi, _, error = interval
+            if error <= share:
+                kept.append(interval)
+                continue
+            center = (lo + hi) / 2
+            if center == lo or center == hi:
+                raise ValueError("`integrate()` did not converge")
+            split.append((lo, center))
+            split.append((center, hi))
+        intervals = kept
+
+_MAX_STEPS = 10_000
+
+def solve(f: Callable[[float], object], lo: float, hi: float) -> float:
+    if not isfinite(lo) or not isfinite(hi):
+        raise ValueError("bounds of `solve()` must be finite")
+    a, b = lo, hi
+    fa, fb = f(a), f(b)
+    if not fa:
+        return a
+    if not fb:
+        return b
+    if (fa < 0) == (fb < 0):
+        raise ValueError("`solve()` needs a sign change between its bounds")
+    side = 0 # which end moved last, its value is halved when it moves again
+    bisect = False
+    for _ in range(_MAX_STEPS):
+        width = abs(b - a)
+        c = (a + b) / 2 if bisect else (a * fb - b * fa) / (fb - fa)
+        if not min(a, b) < c < max(a, b):
+            c = (a + b) / 2
+            if c == a or c == b:
+                return c
+        fc = f(c)
+        if not fc:
+            return c
+        if (fc < 0) == (fb < 0):
+            b, fb = c, fc
+            if side < 0:
+                fa /= 2
+            side = -1
+        else:
+            a, fa = c, fc
+            if side > 0:
+                fb /= 2
+            side = 1
+        bisect = not bisect and abs(b - a) > width / 2
+    return (a + b) / 2
+
+_CHUNK = 1 << 16
+
+def total(evaluate: Callable[[list[int]], list], start: int, stop: int) -> int | float:
+    result = 0
+    for first in range(start, stop + 1, _CHUNK):
+        # in order, as f(start) + f(start + 1) + ... would add them
+        result = sum(evaluate(list(range(first, min(first + _CHUNK, stop + 1)))), result)
+    return result
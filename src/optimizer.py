@@ -0,0 +1,150 @@
+from dataclasses import dataclass
+from nodes import Node, NodeType, Tree
+from operator import add, floordiv, mul, pow, sub, truediv
+
+"""
+Rewrites `Tree`s, or `Node` trees, before compilation:
+- constant subtrees are folded with Python's own int/float semantics,
+  unless evaluating them raises (the error is then left for runtime)
+- runs of NEGATIONs collapse to at most one, or two if the operand might
+  be callable (negating a callable must still raise)
+- `x*1`, `1*x`, `x**1` and `x-0` become `x` where `x` is known to be a
+  number, `x+0` and `0+x` only where `x` is known to be an integer
+"""
+
+_OPERATORS = {
+    NodeType.ADDITION:       add,
+    NodeType.SUBTRACTION:    sub,
+    NodeType.MULTIPLICATION: mul,
+    NodeType.DIVISION:       truediv,
+    NodeType.IDIVISION:      floordiv,
+    NodeType.POWER:          pow,
+}
+
+_LITERALS = NodeType.INT, NodeType.FLOAT
+
+# integer operands give an integer
+_INT_OPERATORS = NodeType.ADDITION, NodeType.SUBTRACTION, NodeType.MULTIPLICATION, NodeType.IDIVISION
+
+# folding `2**100000` is fine, folding `9**9**9` would hang the compiler
+_MAX_FOLDED_BITS = 1 << 16
+
+@dataclass(slots=True)
+class Statistics:
+    removed: int = 0 # instructions
+    shared: int = 0 # repeated subexpressions loaded from a local instead, see sharing.py
+    specialized: int = 0 # OPERATIONs turned into ARITHMETIC, see inference.py
+
+# instructions compiled from `tree`: one per node, plus a LOAD per CALL and a STORE per DEFINITION
+def _size(tree: Tree) -> int:
+    return len(tree.types) + tree.types.count(NodeType.CALL) + tree.types.count(NodeType.DEFINITION)
+
+def _is_number(type: NodeType) -> bool:
+    return type in _OPERATORS or type in _LITERALS or type is NodeType.NEGATION
+
+def _literal_type(val: int | float) -> NodeType:
+    return NodeType.INT if isinstance(val, int) else NodeType.FLOAT
+
+def _fold(type: NodeType, x: int | float, y: int | float) -> int | float | None:
+    if type is NodeType.POWER and isinstance(x, int) and isinstance(y, int) and y * x.bit_length() > _MAX_FOLDED_BITS:
+        return None
+    try:
+        val = _OPERATORS[type](x, y)
+    except ArithmeticError:
+        return None
+    return val if isinstance(val, int | float) else None
+
+# which operand `lhs <type> rhs` reduces to, if any; operands are (root type, root data, known to be an int)
+def _identity(type: NodeType, lhs: tuple[NodeType, object, bool], rhs: tuple[NodeType, object, bool]) -> int | None:
+    one = lambda n: n[0] is NodeType.INT and n[1] == 1
+    zero = lambda n: n[0] is NodeType.INT and n[1] == 0
+    match type:
+        case NodeType.MULTIPLICATION if one(rhs) and _is_number(lhs[0]):
+            return 0
+        case NodeType.MULTIPLICATION if one(lhs) and _is_number(rhs[0]):
+            return 1
+        case NodeType.POWER if one(rhs) and _is_number(lhs[0]):
+            return 0
+        case NodeType.SUBTRACTION if zero(rhs) and _is_number(lhs[0]):
+            return 0
+        # -0.0 + 0 is 0.0, so only integers are left alone by adding 0
+        case NodeType.ADDITION if zero(rhs) and lhs[2]:
+            return 0
+        case NodeType.ADDITION if zero(lhs) and rhs[2]:
+            return 1
+
+# Rewrites in one pass over the nodes, building the result in postorder
+# too.  Every optimized operand is a contiguous run of result nodes, which
+# a stack of (start, known to be an int) tracks until its parent is done.
+def _optimize(tree: Tree) -> Tree:
+    types, data = tree.types, tree.data
+    result = Tree()
+    out_types, out_data = result.types, result.data
+    operands = []
+    for i, type in enumerate(types):
+        match type:
+            case NodeType.INT:
+                operands.append((len(out_types), True))
+                out_types.append(type)
+                out_data.append(data[i])
+            case NodeType.FLOAT | NodeType.IDENTIFIER:
+                operands.append((len(out_types), False))
+                out_types.append(type)
+                out_data.append(data[i])
+            case NodeType.NEGATION:
+                # a run of negations is rewritten as a whole, at its outermost one
+                if i + 1 < len(types) and types[i + 1] is NodeType.NEGATION:
+                    continue
+                count = 1
+                while types[i - count] is NodeType.NEGATION:
+                    count += 1
+                inner = out_types[-1]
+                if inner in _LITERALS:
+                    if count % 2:
+                        out_data[-1] = -out_data[-1]
+                    continue
+                if _is_number(inner):
+                    count %= 2
+                elif count > 2:
+                    count = 2 - count % 2
+                out_types.extend([type] * count)
+                out_data.extend([None] * count)
+            case NodeType.CALL:
+                count = data[i][1]
+                start = operands[-count][0] if count else len(out_types)
+                del operands[len(operands) - count:]
+                operands.append((start, False))
+                out_types.append(type)
+                out_data.append(data[i])
+            case NodeType.ASSIGNMENT | NodeType.DEFINITION:
+                out_types.append(type)
+                out_data.append(data[i])
+            case _:
+                rstart, rint = operands.pop()
+                lstart, lint = operands[-1]
+                lhs = out_types[rstart - 1], out_data[rstart - 1], lint
+                rhs = out_types[-1], out_data[-1], rint
+                if lhs[0] in _LITERALS and rhs[0] in _LITERALS and (folded := _fold(type, lhs[1], rhs[1])) is not None:
+                    del out_types[lstart:], out_data[lstart:]
+                    operands[-1] = lstart, isinstance(folded, int)
+                    out_types.append(_literal_type(folded))
+                    out_data.append(folded)
+                    continue
+                match _identity(type, lhs, rhs):
+                    case 0:
+                        del out_types[rstart:], out_data[rstart:]
+                    case 1:
+                        del out_types[lstart:rstart], out_data[lstart:rstart]
+                        operands[-1] = lstart, rint
+                    case None:
+                        operands[-1] = lstart, type in _INT_OPERATORS and lint and rint
+                        out_types.append(type)
+                        out_data.append(None)
+    return result
+
+def optimize(node: Node | Tree, statistics: Statistics | None = None) -> Node | Tree:
+    tree = node if node.__class__ is Tree else Tree.of(node)
+    optimized = _optimize(tree)
+    if statistics is not None:
+        statistics.removed += _size(tree) - _size(optimized)
+    return optimized if node.__class__ is Tree else optimized.node()
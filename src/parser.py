@@ -1,6 +1,6 @@
 from collections.abc import Iterable
 from dataclasses import dataclass
-from nodes import Node, NodeType
+from nodes import NodeType, Tree
 from tokens import Token, TokenType
 from typing import Self
 
@@ -30,6 +30,24 @@ class ParserError(Exception):
         what = "end of input" if self.actual is None else str(self.actual)
         return f"unexpected {what}"
 
+_OPERAND = TokenType.ID, TokenType.INT, TokenType.FLOAT, TokenType.LPAR, TokenType.MINUS
+
+# pending operators are (precedence, node type), open parentheses and calls have precedence 0
+_BINARY = {
+    TokenType.PLUS:  (1, NodeType.ADDITION),
+    TokenType.MINUS: (1, NodeType.SUBTRACTION),
+    TokenType.MULT:  (2, NodeType.MULTIPLICATION),
+    TokenType.DIV:   (2, NodeType.DIVISION),
+    TokenType.IDIV:  (2, NodeType.IDIVISION),
+    TokenType.EXP:   (4, NodeType.POWER),
+}
+_NEGATION = 3, NodeType.NEGATION
+_PARENTHESIS = 0, None
+_CALL = 0, NodeType.CALL
+
+# Parses by precedence climbing with explicit stacks instead of one method
+# per grammar rule, so nesting depth is only limited by memory.  Nodes are
+# appended to a `Tree` in postorder as soon as they are complete.
 class Parser:
     __slots__ = "_tokens", "_next"
 
@@ -38,116 +56,113 @@ class Parser:
         self._advance()
 
     def _advance(self):
-        try:
-            self._next = next(self._tokens)
-        except StopIteration:
-            self._next = None
-
-    def _next_type_is(self, type: TokenType) -> bool:
-        return self._next is not None and self._next.type is type
-
-    def _stmnt(self) -> Node:
-        first = self._sum()
-        if not self._next_type_is(TokenType.EQ):
-            return first
-        match first.type:
-            case NodeType.IDENTIFIER:
-                self._advance()
-                rhs = self._sum()
-                return Node(NodeType.ASSIGNMENT, (first.data, rhs))
-            case NodeType.CALL:
-                args = first.data[1]
-                if all(n.type is NodeType.IDENTIFIER for n in args):
-                    args = tuple(n.data for n in args)
-                    self._advance()
-                    rhs = self._sum()
-                    return Node(NodeType.DEFINITION, (first.data[0], args, rhs))
-        return first
-
-    def _sum(self) -> Node:
-        lhs = self._prod()
-        while self._next is not None:
-            match self._next.type:
-                case TokenType.PLUS:  nt = NodeType.ADDITION
-                case TokenType.MINUS: nt = NodeType.SUBTRACTION
-                case _: break
-            self._advance()
-            rhs = self._prod()
-            lhs = Node(nt, (lhs, rhs))
-        return lhs
-
-    def _prod(self) -> Node:
-        lhs = self._neg()
-        while self._next is not None:
-            match self._next.type:
-                case TokenType.MULT: nt = NodeType.MULTIPLICATION
-                case TokenType.DIV:  nt = NodeType.DIVISION
-                case TokenType.IDIV: nt = NodeType.IDIVISION
-                case _: break
-            self._advance()
-            rhs = self._neg()
-            lhs = Node(nt, (lhs, rhs))
-        return lhs
-
-    def _neg(self) -> Node:
-        count = 0
-        while self._next_type_is(TokenType.MINUS):
-            count += 1
-            self._advance()
-        node = self._pow()
-        for _ in range(count):
-            node = Node(NodeType.NEGATION, node)
-        return node
-
-    def _pow(self) -> Node:
-        stack = [self._val()]
-        while self._next_type_is(TokenType.EXP):
-            self._advance()
-            stack.append(self._neg())
-        rhs = stack.pop()
-        while stack:
-            lhs = stack.pop()
-            rhs = Node(NodeType.POWER, (lhs, rhs))
-        return rhs
-
-    def _val(self) -> Node:
-        EXPECTED = TokenType.ID, TokenType.INT, TokenType.FLOAT, TokenType.LPAR, TokenType.MINUS
-        if self._next is None:
-            raise ParserError(EXPECTED, None)
-        match self._next.type:
-            case TokenType.INT:
-                node = Node(NodeType.INT, self._next.value)
-            case TokenType.FLOAT:
-                node = Node(NodeType.FLOAT, self._next.value)
-            case TokenType.LPAR:
-                self._advance()
-                node = self._sum()
-                if not self._next_type_is(TokenType.RPAR):
-                    raise ParserError((TokenType.RPAR,), self._next)
-            case TokenType.ID:
-                id = self._next.value
-                self._advance()
-                if not self._next_type_is(TokenType.LPAR):
-                    return Node(NodeType.IDENTIFIER, id)
-                self._advance()
-                if self._next_type_is(TokenType.RPAR):
-                    node = Node(NodeType.CALL, (id, ()))
-                else:
-                    params = [self._sum()]
-                    while self._next_type_is(TokenType.COMMA):
-                        self._advance()
-                        params.append(self._sum())
-                    if not self._next_type_is(TokenType.RPAR):
-                        raise ParserError((TokenType.COMMA, TokenType.RPAR), self._next)
-                    node = Node(NodeType.CALL, (id, tuple(params)))
-            case _: raise ParserError(EXPECTED, self._next)
+        self._next = next(self._tokens, None)
+
+    def _stmnt(self) -> Tree:
+        tree = Tree()
+        self._sum(tree)
+        if self._next is None or self._next.type is not TokenType.EQ:
+            return tree
+        types, data = tree.types, tree.data
+        if len(types) == 1 and types[0] is NodeType.IDENTIFIER:
+            name = data[0]
+            root = NodeType.ASSIGNMENT, name
+        elif types[-1] is NodeType.CALL and len(types) == data[-1][1] + 1 and all(t is NodeType.IDENTIFIER for t in types[:-1]):
+            root = NodeType.DEFINITION, (data[-1][0], tuple(data[:-1]))
+        else:
+            return tree
         self._advance()
-        return node
+        tree = Tree()
+        self._sum(tree)
+        tree.types.append(root[0])
+        tree.data.append(root[1])
+        return tree
+
+    # appends one <sum> to `tree`
+    def _sum(self, tree: Tree):
+        types, data = tree.types, tree.data
+        tokens = self._tokens
+        token = self._next
+        operators = []
+        calls = [] # [name, arguments before the current one] of open calls
+        while True:
+            # an operand
+            while token is not None and token.type is TokenType.MINUS:
+                operators.append(_NEGATION)
+                token = next(tokens, None)
+            if token is None:
+                raise ParserError(_OPERAND, None)
+            match token.type:
+                case TokenType.INT:
+                    types.append(NodeType.INT)
+                    data.append(token.value)
+                    token = next(tokens, None)
+                case TokenType.FLOAT:
+                    types.append(NodeType.FLOAT)
+                    data.append(token.value)
+                    token = next(tokens, None)
+                case TokenType.ID:
+                    id = token.value
+                    token = next(tokens, None)
+                    if token is None or token.type is not TokenType.LPAR:
+                        types.append(NodeType.IDENTIFIER)
+                        data.append(id)
+                    else:
+                        token = next(tokens, None)
+                        if token is None or token.type is not TokenType.RPAR:
+                            operators.append(_CALL)
+                            calls.append([id, 0])
+                            continue
+                        types.append(NodeType.CALL)
+                        data.append((id, 0))
+                        token = next(tokens, None)
+                case TokenType.LPAR:
+                    operators.append(_PARENTHESIS)
+                    token = next(tokens, None)
+                    continue
+                case _:
+                    raise ParserError(_OPERAND, token)
+            # binary operators, and the ends of parentheses, arguments and calls
+            while True:
+                if token is not None and (operator := _BINARY.get(token.type)) is not None:
+                    precedence = operator[0]
+                    # ** is right associative
+                    if precedence == 4:
+                        precedence = 5
+                    while operators and operators[-1][0] >= precedence:
+                        types.append(operators.pop()[1])
+                        data.append(None)
+                    operators.append(operator)
+                    token = next(tokens, None)
+                    break
+                while operators and operators[-1][0]:
+                    types.append(operators.pop()[1])
+                    data.append(None)
+                if not operators:
+                    self._next = token
+                    return
+                type = None if token is None else token.type
+                if operators[-1] is _PARENTHESIS:
+                    if type is not TokenType.RPAR:
+                        raise ParserError((TokenType.RPAR,), token)
+                    operators.pop()
+                elif type is TokenType.COMMA:
+                    calls[-1][1] += 1
+                    token = next(tokens, None)
+                    break
+                elif type is TokenType.RPAR:
+                    operators.pop()
+                    id, count = calls.pop()
+                    types.append(NodeType.CALL)
+                    data.append((id, count + 1))
+                else:
+                    raise ParserError((TokenType.COMMA, TokenType.RPAR), token)
+                token = next(tokens, None)
 
     def __iter__(self) -> Self:
         return self
 
-    def __next__(self) -> Node:
+    def __next__(self) -> Tree:
         if self._next is None:
             raise StopIteration
         return self._stmnt()
@@ -0,0 +1,60 @@
+from __future__ import annotations
+from batch import evaluate_query, prepare, Result
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from interpreter import Interpreter, Snapshot
+from itertools import islice
+import os
+import threading
+
+"""
+Evaluates many independent one-line queries against a shared prelude on
+a pool of threads, without pickling anything.
+
+The prelude runs once, and its bindings and compiled functions are frozen
+into a `Snapshot`.  Each thread evaluates in a context of its own made
+from the snapshot, so threads share no mutable state and scale across
+cores on free-threaded CPython (with the GIL they take turns).  As in
+`batch`, a query that assigns sees its own assignments, and the context
+is reset to the snapshot before the next query.  Results come back in
+input order.
+"""
+
+class ThreadPool:
+    __slots__ = "snapshot", "_threads", "_executor", "_contexts"
+
+    # `threads` defaults to the number of CPUs
+    def __init__(self, prelude: str = "", threads: int | None = None, **options):
+        self.snapshot: Snapshot = prepare(prelude, **options).snapshot()
+        self._threads = threads or os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(self._threads, thread_name_prefix="evaluate")
+        self._contexts = threading.local()
+
+    def _context(self) -> Interpreter:
+        if (context := getattr(self._contexts, "interpreter", None)) is None:
+            context = self._contexts.interpreter = self.snapshot.context()
+        return context
+
+    def _evaluate_chunk(self, queries: list[str]) -> list[Result]:
+        context = self._context()
+        return [evaluate_query(context, q, context.reset) for q in queries]
+
+    def evaluate(self, queries: Iterable[str], chunk_size: int = 100) -> Iterator[Result]:
+        queries = iter(queries)
+        pending = deque()
+        while chunk := list(islice(queries, chunk_size)):
+            pending.append(self._executor.submit(self._evaluate_chunk, chunk))
+            if len(pending) > 2 * self._threads:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+    def close(self):
+        self._executor.shutdown(cancel_futures=True)
+
+    def __enter__(self) -> ThreadPool:
+        return self
+
+    def __exit__(self, *exception: object):
+        self.close()
@@ -0,0 +1,259 @@
+from __future__ import annotations
+from bytecode import ARITHMETIC, Code, OPERATION, OPERATIONS, TYPES
+from collections import Counter
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass
+from instructions import InstructionType, Operation
+from json import dumps
+from threading import Event, Thread
+from time import perf_counter
+
+"""
+Profiles an `Interpreter` it is attached to.
+
+Instructions are counted per `InstructionType` and `Operation`.  Function
+bodies have no jumps, so each body is counted as a whole when it starts,
+from a histogram computed once per body; a body that raises is counted
+as if it had run to the end.
+
+Calls of user functions and builtins are recorded on a call tree, one
+node per distinct call path, so collapsed stacks for flame graphs come
+straight from the tree.  Calls answered from the memo do not run and
+are not recorded.
+- exact mode times every call: inclusive time counts only the outermost
+  activation of a recursive function, exclusive time excludes callees
+- sampling mode (`interval` set) only maintains the current path, and a
+  thread notes where the interpreter is every `interval` seconds while
+  the profiler is running (`with profiler: ...`); times are estimated
+  from the samples, call counts stay exact, instructions are not counted
+
+An interpreter without a profiler checks for one once per call and per
+top-level instruction, and does nothing else.
+"""
+
+TOP_LEVEL = "<top level>"
+
+_TYPE_INDICES = {t: i for i, t in enumerate(TYPES)}
+_OPERATION_INDICES = {o: i for i, o in enumerate(OPERATIONS)}
+
+@dataclass(frozen=True, slots=True)
+class FunctionProfile:
+    name: str
+    calls: int
+    inclusive: float # seconds
+    exclusive: float # seconds
+
+class Profiler:
+    __slots__ = (
+        "interval", "namespace", "_instructions", "_operations", "_names", "_histograms", "_stack", "_nodes",
+        "_children", "_calls", "_exclusive", "_inclusive", "_active", "_sampler", "_stopped",
+    )
+
+    def __init__(self, interval: float | None = None):
+        self.interval = interval
+        # counts indexed by opcode and by operation index
+        self._instructions = [0] * len(TYPES)
+        self._operations = [0] * len(OPERATIONS)
+        # bindings to name callables by, the interpreter sets its own
+        self.namespace: Mapping[str, object] = {}
+        # id(callable) -> (callable, name)
+        self._names: dict[int, tuple[object, str]] = {}
+        # id(code) -> (code, (opcode, count) pairs, (operation index, count) pairs)
+        self._histograms: dict[int, tuple[Code, tuple, tuple]] = {}
+        # active calls, node indices when sampling, [node, start, time in callees] otherwise
+        self._stack = []
+        # the call tree, node 0 is the top level
+        self._nodes: list[tuple[int, str]] = [(0, TOP_LEVEL)] # (parent, name)
+        self._children: dict[tuple[int, int], int] = {} # (parent, id(callee)) -> node
+        self._calls = [0]
+        self._exclusive = [0.0] # seconds, or samples when sampling
+        self._inclusive: Counter[str] = Counter()
+        self._active: Counter[str] = Counter()
+        self._sampler = None
+        self._stopped = Event()
+
+    @property
+    def sampling(self) -> bool:
+        return self.interval is not None
+
+    def __enter__(self) -> Profiler:
+        self.start()
+        return self
+
+    def __exit__(self, *exception):
+        self.stop()
+
+    def start(self):
+        if self.sampling and self._sampler is None:
+            self._stopped.clear()
+            self._sampler = Thread(target=self._sample, name="profiler", daemon=True)
+            self._sampler.start()
+
+    def stop(self):
+        if self._sampler is not None:
+            self._stopped.set()
+            self._sampler.join()
+            self._sampler = None
+
+    def _sample(self):
+        stack = self._stack
+        exclusive = self._exclusive
+        while not self._stopped.wait(self.interval):
+            try:
+                node = stack[-1]
+            except IndexError:
+                node = 0
+            exclusive[node] += 1
+
+    @property
+    def instructions(self) -> Counter[InstructionType]:
+        return Counter({t: n for t, n in zip(TYPES, self._instructions) if n})
+
+    @property
+    def operations(self) -> Counter[Operation]:
+        return Counter({o: n for o, n in zip(OPERATIONS, self._operations) if n})
+
+    def instruction(self, type: InstructionType, argument: object):
+        if self.interval is not None:
+            return
+        self._instructions[_TYPE_INDICES[type]] += 1
+        if type is InstructionType.OPERATION or type is InstructionType.ARITHMETIC:
+            self._operations[_OPERATION_INDICES[argument]] += 1
+
+    def execute(self, code: Code):
+        if self.interval is not None:
+            return
+        if (entry := self._histograms.get(id(code))) is None:
+            operations = Counter(arg for op, arg in zip(code.opcodes, code.operands) if op == OPERATION or op == ARITHMETIC)
+            entry = self._histograms[id(code)] = code, tuple(Counter(code.opcodes).items()), tuple(operations.items())
+        _, types, operations = entry
+        counts = self._instructions
+        for op, n in types:
+            counts[op] += n
+        counts = self._operations
+        for op, n in operations:
+            counts[op] += n
+
+    def _node(self, parent: int, callee: object) -> int:
+        if (entry := self._names.get(id(callee))) is None:
+            unknown = "<builtin>" if callable(callee) else "<function>"
+            name = next((n for n, v in self.namespace.items() if getattr(v, "inner", None) is callee), unknown)
+            entry = self._names[id(callee)] = callee, name
+        node = self._children[parent, id(callee)] = len(self._nodes)
+        self._nodes.append((parent, entry[1]))
+        self._calls.append(0)
+        self._exclusive.append(0.0)
+        return node
+
+    def enter(self, callee: object):
+        stack = self._stack
+        if self.interval is not None:
+            parent = stack[-1] if stack else 0
+            if (node := self._children.get((parent, id(callee)))) is None:
+                node = self._node(parent, callee)
+            self._calls[node] += 1
+            stack.append(node)
+            return
+        parent = stack[-1][0] if stack else 0
+        if (node := self._children.get((parent, id(callee)))) is None:
+            node = self._node(parent, callee)
+        self._calls[node] += 1
+        self._active[self._nodes[node][1]] += 1
+        stack.append([node, perf_counter(), 0.0])
+
+    def leave(self):
+        if self.interval is not None:
+            self._stack.pop()
+            return
+        node, start, callees = self._stack.pop()
+        elapsed = perf_counter() - start
+        self._exclusive[node] += elapsed - callees
+        if self._stack:
+            self._stack[-1][2] += elapsed
+        name = self._nodes[node][1]
+        self._active[name] -= 1
+        if not self._active[name]:
+            self._inclusive[name] += elapsed
+
+    # leaves the calls an exception unwound, up to `depth` active calls
+    def unwind(self, depth: int):
+        while len(self._stack) > depth:
+            self.leave()
+
+    def call(self, callee: object, run: Callable[..., object], *args) -> object:
+        depth = len(self._stack)
+        self.enter(callee)
+        try:
+            result = run(*args)
+        except BaseException:
+            self.unwind(depth)
+            raise
+        self.leave()
+        return result
+
+    def _path(self, node: int) -> list[str]:
+        path = []
+        while node:
+            node, name = self._nodes[node]
+            path.append(name)
+        path.reverse()
+        return path
+
+    def functions(self) -> list[FunctionProfile]:
+        calls = Counter()
+        exclusive = Counter()
+        inclusive = Counter(self._inclusive)
+        for (_, name), n, t in zip(self._nodes[1:], self._calls[1:], self._exclusive[1:]):
+            calls[name] += n
+            exclusive[name] += t
+        if self.sampling:
+            inclusive = Counter()
+            for node, samples in enumerate(self._exclusive):
+                if samples:
+                    for name in set(self._path(node)):
+                        inclusive[name] += samples
+            scale = self.interval
+        else:
+            scale = 1.0
+        profiles = [FunctionProfile(name, n, inclusive[name] * scale, exclusive[name] * scale) for name, n in calls.items()]
+        return sorted(profiles, key=lambda p: (-p.exclusive, p.name))
+
+    def summary(self) -> dict[str, object]:
+        summary = {
+            "mode": "sampling" if self.sampling else "exact",
+            "instructions": {t.name: n for t, n in self.instructions.items()},
+            "operations": {o.name: n for o, n in self.operations.items()},
+            "functions": [{"name": p.name, "calls": p.calls, "inclusive": p.inclusive, "exclusive": p.exclusive} for p in self.functions()],
+        }
+        if self.sampling:
+            summary["interval"] = self.interval
+            summary["samples"] = int(sum(self._exclusive))
+        return summary
+
+    def json(self) -> str:
+        return dumps(self.summary(), indent=2)
+
+    def text(self) -> str:
+        lines = []
+        if self.sampling:
+            lines.append(f"{int(sum(self._exclusive)):,} samples every {self.interval * 1e3:g}ms")
+        else:
+            lines.append(f"{'instruction':<16}{'count':>14}")
+            for t, n in self.instructions.items():
+                lines.append(f"{t.name:<16}{n:>14,}")
+            lines.append(f"{'operation':<16}{'count':>14}")
+            for o, n in self.operations.items():
+                lines.append(f"{o.name:<16}{n:>14,}")
+        lines.append(f"{'function':<16}{'calls':>14}{'inclusive':>14}{'exclusive':>14}")
+        for p in self.functions():
+            lines.append(f"{p.name:<16}{p.calls:>14,}{p.inclusive * 1e3:>12.3f}ms{p.exclusive * 1e3:>12.3f}ms")
+        return "\n".join(lines)
+
+    # one line per call path, weighted by exclusive microseconds, or samples when sampling
+    def collapsed(self) -> str:
+        # different functions bound to the same name share their paths
+        weights = Counter()
+        for node, weight in enumerate(self._exclusive):
+            if weight:
+                weights[";".join(self._path(node)) or TOP_LEVEL] += weight if self.sampling else weight * 1e6
+        return "\n".join(f"{path} {round(weight)}" for path, weight in weights.items() if round(weight))
@@ -0,0 +1,201 @@
+from __future__ import annotations
+from argparse import ArgumentParser
+import asyncio
+from batch import add_budget_arguments, budget_from, prepare
+from compiler import compile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from interpreter import Interpreter, Snapshot
+from json import dumps
+from math import log2
+import os
+from parser import Parser
+from time import perf_counter
+from tokenizer import Tokenizer
+
+"""
+An asyncio server with a line protocol.  Every request line is evaluated
+as a script in the connection's session, and answered by one line:
+    ok <values left on the stack, space separated>
+    err <exception type>: <message>
+A session is a context of a snapshot of the bindings built from a
+prelude, so sessions never see each other's assignments, and share the
+prelude's compiled functions instead of each compiling them again.  Clients may
+send any number of requests without waiting; a session answers them in
+order.
+
+Evaluation runs on a thread pool, at most `max_concurrency` at a time
+across all sessions, so the event loop keeps accepting and reading while
+long evaluations run.  The limits of a `budget` option apply to each
+request line as a whole, so that one request cannot hold a thread for
+long.  The request `:stats` answers with the latency
+histogram as JSON instead of being evaluated, and a line longer than the
+server's `limit` with an error, without ending the session.
+"""
+
+STATS = ":stats"
+
+# each power of two is split into this many buckets, about 9% wide
+_BUCKETS_PER_OCTAVE = 8
+
+@dataclass(slots=True)
+class Histogram:
+    # counts[i] holds samples of at most 2**((i + 1) / _BUCKETS_PER_OCTAVE) microseconds
+    counts: list[int] = field(default_factory=lambda: [0] * 40 * _BUCKETS_PER_OCTAVE)
+    total: int = 0
+    maximum: float = 0.0
+
+    def record(self, seconds: float):
+        micros = max(seconds * 1e6, 1.0)
+        self.counts[min(int(log2(micros) * _BUCKETS_PER_OCTAVE), len(self.counts) - 1)] += 1
+        self.total += 1
+        self.maximum = max(self.maximum, seconds)
+
+    # upper bound of the bucket holding the p-th percentile, in seconds
+    def percentile(self, p: float) -> float:
+        rank = p / 100 * self.total
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(2 ** ((i + 1) / _BUCKETS_PER_OCTAVE) / 1e6, self.maximum)
+        return 0.0
+
+    def summary(self) -> dict[str, float]:
+        return {
+            "count": self.total,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.maximum,
+        }
+
+@dataclass(slots=True)
+class ServerStatistics:
+    sessions: int = 0
+    rejected: int = 0 # connections over `max_sessions`
+    requests: int = 0
+    errors: int = 0
+    latency: Histogram = field(default_factory=Histogram)
+
+def evaluate(interpreter: Interpreter, line: str) -> str:
+    try:
+        with interpreter.evaluation():
+            for statement in Parser(Tokenizer(line)):
+                interpreter.execute(compile(statement, compact=True))
+        return "ok " + " ".join(map(str, interpreter.take_stack()))
+    # like a query in `batch`, a request fails on its own, whatever it raises
+    except Exception as e:
+        interpreter.take_stack()
+        return f"err {type(e).__name__}: {e}"
+
+# discards the rest of a line longer than the reader's limit, so that the
+# session goes on with the next request
+async def _skip_line(reader: asyncio.StreamReader):
+    while True:
+        try:
+            await reader.readuntil(b"\n")
+            return
+        except asyncio.LimitOverrunError as e:
+            await reader.readexactly(e.consumed)
+        except asyncio.IncompleteReadError:
+            return
+
+class Server:
+    __slots__ = "statistics", "_snapshot", "_max_sessions", "_sessions", "_slots", "_executor"
+
+    def __init__(self, prelude: str = "", max_sessions: int = 10000, max_concurrency: int | None = None, **options):
+        self.statistics = ServerStatistics()
+        self._snapshot: Snapshot = prepare(prelude, **options).snapshot()
+        self._max_sessions = max_sessions
+        self._sessions = 0
+        max_concurrency = max_concurrency or os.cpu_count() or 1
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_concurrency, thread_name_prefix="evaluate")
+
+    def session(self) -> Interpreter:
+        return self._snapshot.context()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        if self._sessions >= self._max_sessions:
+            self.statistics.rejected += 1
+            writer.write(b"err ServerError: too many sessions\n")
+            writer.close()
+            return
+        self._sessions += 1
+        self.statistics.sessions += 1
+        interpreter = self.session()
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    line = await reader.readuntil(b"\n")
+                except asyncio.IncompleteReadError as e:
+                    line = e.partial # the last line, without a newline
+                except asyncio.LimitOverrunError:
+                    self.statistics.requests += 1
+                    self.statistics.errors += 1
+                    writer.write(b"err ServerError: line too long\n")
+                    await _skip_line(reader)
+                    continue
+                if not line:
+                    break
+                start = perf_counter()
+                line = line.decode("latin-1").rstrip("\r\n")
+                if line == STATS:
+                    response = dumps(self.statistics.latency.summary())
+                else:
+                    async with self._slots:
+                        response = await loop.run_in_executor(self._executor, evaluate, interpreter, line)
+                    self.statistics.requests += 1
+                    self.statistics.errors += response.startswith("err")
+                writer.write(response.encode("latin-1") + b"\n")
+                # only wait for the client when it stops reading
+                if writer.transport.get_write_buffer_size() > 1 << 16:
+                    await writer.drain()
+                self.statistics.latency.record(perf_counter() - start)
+        except ConnectionError:
+            pass # the client went away
+        finally:
+            self._sessions -= 1
+            writer.close()
+
+    async def serve(self, path: str | None = None, host: str = "127.0.0.1", port: int = 7777, limit: int = 1 << 20) -> asyncio.AbstractServer:
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle, path, limit=limit, backlog=4096)
+        return await asyncio.start_server(self.handle, host, port, limit=limit, backlog=4096)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+async def _main(args):
+    prelude = ""
+    if args.prelude is not None:
+        with open(args.prelude) as f:
+            prelude = f.read()
+    server = Server(prelude, args.max_sessions, args.max_concurrency, native=args.native, memo_size=args.memo, budget=budget_from(args))
+    listener = await server.serve(args.unix, args.host, args.port)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+def main():
+    parser = ArgumentParser(description="evaluate request lines from many sessions")
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--prelude", metavar="FILE", help="definitions every session starts with")
+    parser.add_argument("--max-sessions", type=int, default=10000, help="connections served at once")
+    parser.add_argument("--max-concurrency", type=int, default=None, help="evaluations running at once, defaults to the number of CPUs")
+    parser.add_argument("--native", action="store_true", help="run user functions as native Python functions")
+    parser.add_argument("--memo", type=int, default=0, metavar="SIZE", help="cache results of pure user functions")
+    add_budget_arguments(parser)
+    try:
+        asyncio.run(_main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
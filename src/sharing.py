@@ -0,0 +1,104 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from nodes import NodeType, Tree
+
+"""
+Finds repeated subexpressions in a `Tree`, so they are computed once.
+
+Subtrees are numbered by structure in one pass over the nodes: two nodes
+get the same number when their types, data and operands' numbers match.
+Where a subtree occurs again, the compiler emits a LOAD_LOCAL of the value
+the first occurrence left in a local slot with STORE_LOCAL.  The first
+occurrence still runs first and in place, so errors are raised exactly
+as before.
+
+Only subtrees without CALLs are shared: any name may be rebound to an
+impure builtin.  There are no assignments inside expressions, but globals
+stay the same only until the next CALL, which may run a builtin that
+rebinds them, so a global is numbered apart on each side of a CALL;
+parameters belong to the frame.  A subtree is shared when that saves
+instructions: (occurrences - 1) * (size - 1) > 1, counting occurrences
+that are not inside a larger shared subtree.
+"""
+
+_CONTAINERS = NodeType.CALL, NodeType.ASSIGNMENT, NodeType.DEFINITION
+
+@dataclass(frozen=True, slots=True)
+class Sharing:
+    stores: dict[int, int] # node -> the slot its value is stored in
+    loads: dict[int, tuple[int, int]] # first node of a repeated subtree -> (its root, slot)
+    slots: int
+
+# how the first `stop` nodes of `tree`, with parameters `params`, share subtrees, None if they do not
+def share(tree: Tree, stop: int, params: tuple[str, ...] = ()) -> Sharing | None:
+    types, data = tree.types, tree.data
+    numbers = {}
+    calls = 0 # CALLs so far, globals loaded before one are different leaves from those after it
+    # per node: structural number, or -1 for subtrees that must not be shared, and its first node
+    number = [0] * stop
+    start = [0] * stop
+    operands = [] # node indices of the roots of pending operands
+    for i in range(stop):
+        type = types[i]
+        match type:
+            case NodeType.INT:
+                key = type, data[i]
+                count = 0
+            case NodeType.IDENTIFIER:
+                key = type, data[i], -1 if data[i] in params else calls
+                count = 0
+            case NodeType.FLOAT:
+                # 0.0 == -0.0
+                key = type, data[i].hex()
+                count = 0
+            case NodeType.NEGATION:
+                count = 1
+            case NodeType.CALL:
+                count = data[i][1]
+                calls += 1
+            case NodeType.ASSIGNMENT | NodeType.DEFINITION:
+                count = 1
+            case _:
+                count = 2
+        if count:
+            children = operands[len(operands) - count:]
+            del operands[len(operands) - count:]
+            start[i] = start[children[0]]
+            if type in _CONTAINERS or any(number[c] < 0 for c in children):
+                number[i] = -1
+                operands.append(i)
+                continue
+            key = type, *(number[c] for c in children)
+        elif type is NodeType.CALL:
+            start[i] = i
+            number[i] = -1
+            operands.append(i)
+            continue
+        else:
+            start[i] = i
+        number[i] = numbers.setdefault(key, len(numbers))
+        operands.append(i)
+    occurrences = {}
+    for i, n in enumerate(number):
+        if n >= 0 and i > start[i]:
+            occurrences.setdefault(n, []).append(i)
+    # larger subtrees first, their copies take the copies of their parts with them
+    candidates = sorted((n for n, nodes in occurrences.items() if len(nodes) > 1), key=lambda n: start[occurrences[n][0]] - occurrences[n][0])
+    if not candidates:
+        return None
+    removed = bytearray(stop)
+    stores = {}
+    loads = {}
+    for n in candidates:
+        nodes = [i for i in occurrences[n] if not removed[i]]
+        size = nodes[0] - start[nodes[0]] + 1 if nodes else 0
+        if (len(nodes) - 1) * (size - 1) <= 1:
+            continue
+        slot = len(stores)
+        stores[nodes[0]] = slot
+        for i in nodes[1:]:
+            loads[start[i]] = i, slot
+            removed[start[i]:i + 1] = b"\1" * (i + 1 - start[i])
+    if not stores:
+        return None
+    return Sharing(stores, loads, len(stores))
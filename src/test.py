@@ -1,6 +1,28 @@
+import arrays
 from collections.abc import Callable
-from nodes import Node, NodeType
+from batch import evaluate, Result
+from bytecode import Code, encode
+import asyncio
+from cache import compile_script, ScriptCache, ScriptCacheStatistics
+from compiler import compile
+from contextlib import redirect_stdout
+from instructions import Instruction, InstructionType, Operation
+from interpreter import Budget, BudgetExceeded, Interpreter, InterpreterError, Value, ValueType
+from incremental import UpdateStatistics
+from inliner import Inliner, InliningStatistics
+from io import BytesIO, StringIO
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from json import loads
+from math import inf, isclose
+from memo import CacheStatistics
+from nodes import Node, NodeType, Tree
+from optimizer import Statistics
+from os import mkdir, path, remove
 from parser import Parser, ParserError
+from pool import ThreadPool
+from profiler import Profiler
+from server import Server
 from tokens import Token, TokenType
 from tokenizer import TokenError, Tokenizer
 
@@ -48,6 +70,38 @@ def tokenizer() -> str | None:
         if a != e:
             return f"failed at {s!r}\nexpected: {e}\nactual:   {a}"
 
+def _tokens(source: object, chunk_size: int = 1 << 16) -> list[tuple[Token, int]] | int:
+    try:
+        return [(t, t.pos) for t in Tokenizer(source, chunk_size)]
+    except TokenError as e:
+        return e.pos
+
+def stream() -> str | None:
+    texts = [
+        "A=5*3-1", "5***2", "5///2", "  .5  ", "foo(foo, A)", " . ", "abc;", "3.14e",
+        "f(t, v, s) = -1/2*g*t**2+v*t+s\nh(t)=f(t, 0, 0)\ng=9.81\nclamp(h(1), -10, 0)\n12.5 ** 2 // 3\n",
+        "x" * 100 + " " * 50 + "1" * 30 + ".25**" + "y" * 10 + ";",
+        # lines without boundaries are cut between runs of characters
+        "a*b**c//d/e" * 20 + "1/2.5//3.**4*.5" * 20 + "ab12cd3.4.5ef/*/**//***",
+    ]
+    for s in texts:
+        e = _tokens(s)
+        for k in 1, 2, 3, 7, 64:
+            for source in StringIO(s), BytesIO(s.encode()):
+                if (a := _tokens(source, k)) != e:
+                    return f"failed at {s!r} in chunks of {k}\nexpected: {e}\nactual:   {a}"
+    contexts = [
+        (" " * 100 + ";" + " " * 100, TokenError(" " * 40 + ";" + " " * 40, 100, 60)),
+        ("1+" * 50 + "$", TokenError("1+" * 20 + "$", 100, 60)),
+    ]
+    for s, e in contexts:
+        try:
+            a = list(Tokenizer(s))
+        except TokenError as error:
+            a = error
+        if a != e or str(a) != str(e):
+            return f"failed at context of {s!r}\nexpected: {e!r}\nactual:   {a!r}"
+
 def parser() -> str | None:
     a = Token(TokenType.ID, "A", None)
     eq = Token(TokenType.EQ, None, None)
@@ -72,6 +126,798 @@ def parser() -> str | None:
             ))
         ))),
     ]
+    for tokens, e in tests:
+        tree = next(Parser(tokens))
+        if tree.node() != e or Tree.of(e) != tree:
+            return f"failed at {tokens}\nexpected: {e}\nactual:   {tree.node()}"
+    operand = "ID", "INT", "FLOAT", "LPAR", "MINUS"
+    tests = [
+        ("1+2*3-4 a/b//c*d", ["((1)+((2)*(3)))-(4)", "(((a)/(b))//(c))*(d)"]),
+        ("-a*b", ["(-(a))*(b)"]),
+        ("-2**2 2**-x**y 2**-3*4", ["-((2)**(2))", "(2)**(-((x)**(y)))", "((2)**(-(3)))*(4)"]),
+        ("f(x, y+1, g(z)) f() f(x)(y) x (y) b -b", ["f(x,(y)+(1),g(z))", "f()", "f(x)", "y", "x(y)", "(b)-(b)"]),
+        ("f(x, y) = x*y\nf() = 5", ["f(x,y)=(x)*(y)", "f()=5"]),
+        ("(x) = 1", ["x=1"]),
+        ("f(x, 1) = 2", ["f(x,1)", (operand, "EQ")]),
+        ("a = b = 1", ["a=b", (operand, "EQ")]),
+        ("1 +", [(operand, None)]),
+        ("(1", [(("RPAR",), None)]),
+        ("(a b)", [(("RPAR",), "ID")]),
+        ("f(1", [(("COMMA", "RPAR"), None)]),
+        ("f(x=1)", [(("COMMA", "RPAR"), "EQ")]),
+        ("f(1,)", [(operand, "RPAR")]),
+    ]
+    for s, e in tests:
+        a = []
+        try:
+            for tree in Parser(Tokenizer(s)):
+                a.append(str(tree.node()))
+        except ParserError as error:
+            a.append((tuple(t.name for t in error.expected), error.actual and error.actual.type.name))
+        if a != e:
+            return f"failed at {s!r}\nexpected: {e}\nactual:   {a}"
+    # nesting is only limited by memory
+    depth = 100_000
+    tests = [
+        ("(" * depth + "x + 1" + ")" * depth, "3"),
+        ("(" + "-" * (depth + 1) + "x)", "-2"),
+        ("f(" * depth + "x" + ")" * depth, str(depth + 2)),
+        ("1**" * depth + "x", "1"),
+    ]
+    for s, e in tests:
+        for compact in (False, True):
+            if (a := run("x = 2\nf(y) = y + 1\n" + s, compact=compact)) != e:
+                return f"failed at {s[:20]!r}... nested {depth} deep\nexpected: {e}\nactual:   {a}"
+
+def run(text: str, interpreter: Interpreter | None = None, optimize: bool = True, compact: bool = False, inliner: Inliner | None = None, cse: bool = False, specialize: bool = False) -> str:
+    if interpreter is None:
+        interpreter = Interpreter()
+    output = StringIO()
+    try:
+        for statement in Parser(Tokenizer(text)):
+            interpreter.execute(compile(statement, optimize, compact=compact, inliner=inliner, cse=cse, specialize=specialize))
+    except (InterpreterError, ArithmeticError) as e:
+        return f"{type(e).__name__}: {e}"
+    with redirect_stdout(output):
+        interpreter.output_stack()
+    return output.getvalue().strip().replace("\n", " ")
+
+INTERPRETER_TESTS = [
+    ("f(t, v, s) = -1/2*g*t**2+v*t+s\nh(t)=f(t, 0, 0)\ng=9.81\nclamp(h(1), -10, 0)\nf(1, 5, 5)",
+        "-4.905 5.095"),
+    ("f() = 5\nf()\nf max", "5 <function object> <builtin function>"),
+    ("7//2 7/2 2**-1 (-2**2) ((-2)**2) (--3)", "3 3.5 0.5 -4 4 3"),
+    ("int(2.7) float(3) abs(-3) sign(-2.5) min(1, 2.5) max(1, 2.5)", "2 3.0 3 -1.0 1 2.5"),
+    ("k(x, y) = x(y)\nk(abs, -4)", "4"),
+    ("x", "InterpreterError: unknown name `x`"),
+    ("max + 1", "InterpreterError: {arg} cannot be applied to callable"),
+    ("-max", "InterpreterError: {arg} cannot be applied to callable"),
+    ("f(x) = x\nf(1, 2)", "InterpreterError: call with {actual} parameters instead of {expected}"),
+    ("a = 1\na(2)", "InterpreterError: called non-callable"),
+    ("clamp(1, 2, 1)", "InterpreterError: builtin raised InterpreterError(explaination='cannot `clamp()` between lo=2 and hi=1')"),
+    ("1/0", "ZeroDivisionError: division by zero"),
+    ("f(x) = 1 // x\nf(0)", "ZeroDivisionError: integer division or modulo by zero"),
+]
+
+def interpreter() -> str | None:
+    for s, e in INTERPRETER_TESTS:
+        if (a := run(s)) != e:
+            return f"failed at {s!r}\nexpected: {e}\nactual:   {a}"
+    # numbers are raw inside, but every value that leaves the interpreter is a `Value`
+    interpreter = Interpreter()
+    if (a := run("f(x) = x\na = 1\nb = 2.0\n(-b) (a / 2) f a b", interpreter)) != "-2.0 0.5 <function object> 1 2.0":
+        return f"printed {a}"
+    for statement in Parser(Tokenizer("a max")):
+        interpreter.execute(compile(statement))
+    expected = [Value(ValueType.INT, 1), Value(ValueType.BUILTIN, interpreter.bindings()["max"].inner)]
+    if (a := interpreter.take_stack()) != expected:
+        return f"stack {a}\nexpected {expected}"
+    bindings = interpreter.bindings()
+    if {n: v.type for n, v in bindings.items() if n in "abf"} != {"a": ValueType.INT, "b": ValueType.FLOAT, "f": ValueType.FUNCTION}:
+        return f"bindings {bindings}"
+    other = Interpreter()
+    other.rebind(bindings)
+    if (a := run("f(a) + b", other)) != "3.0":
+        return f"rebound interpreter computed {a}"
+    # globals are linked to slots, bound late and visible through `globals`
+    for options in ({}, {"native": True}, {"memo_size": 2}, {"incremental": True}):
+        interpreter = Interpreter(**options)
+        view = interpreter.globals
+        if (a := run("f(x) = g * x\nf(1)", interpreter, compact=True)) != "InterpreterError: unknown name `g`":
+            return f"unbound global gave {a}"
+        interpreter.take_stack()
+        view["g"] = Value(ValueType.INT, 3)
+        if (a := run("f(2)", interpreter, compact=True)) != "6" or view["g"] != Value(ValueType.INT, 3):
+            return f"{options} bound global gave {a}"
+        view["g"] = Value(ValueType.FLOAT, 0.5)
+        if (a := run("f(2)", interpreter)) != "1.0":
+            return f"{options} rebound global gave {a}"
+        del view["g"]
+        if (a := run("f(2)", interpreter, compact=True)) != "InterpreterError: unknown name `g`" or "g" in view or view.get("g") is not None:
+            return f"{options} unbound global gave {a}"
+        interpreter.take_stack()
+        if "f" not in view or len(view) != len(interpreter.bindings()) or view["max"].type is not ValueType.BUILTIN:
+            return f"{options} view {dict(view)}"
+    interpreter = Interpreter(incremental=True)
+    run("g = 1\nh = 2 * g", interpreter)
+    interpreter.globals["g"] = Value(ValueType.INT, 4)
+    if interpreter.globals["h"] != Value(ValueType.INT, 8):
+        return f"dependent of a bound global is {interpreter.globals['h']}"
+
+def native() -> str | None:
+    tests = INTERPRETER_TESTS + [
+        ("f(x) = x*x + x\nf(3) f(0.5)", "12 0.75"),
+        ("f(x) = g*x\ng = 2\nf(3)\ng = 0.5\nf(3)", "6 1.5"),
+        ("f(x) = -x\nf(2) f(-2.5)", "-2 2.5"),
+        ("f(x) = x + 1\nf(max)", "InterpreterError: {arg} cannot be applied to callable"),
+        ("f(x) = -x\nf(max)", "InterpreterError: {arg} cannot be applied to callable"),
+        ("f(x) = y + x\nf(max)", "InterpreterError: unknown name `y`"),
+        ("f(x) = x(1)\nf(2)", "InterpreterError: called non-callable"),
+        ("f(x) = 1 / x\nf(0)", "ZeroDivisionError: division by zero"),
+    ]
+    for s, e in tests:
+        if (a := run(s, Interpreter(native=True))) != e:
+            return f"failed at {s!r}\nexpected: {e}\nactual:   {a}"
+
+def memo() -> str | None:
+    for s, e in INTERPRETER_TESTS:
+        if (a := run(s, Interpreter(memo_size=2))) != e:
+            return f"failed at {s!r}\nexpected: {e}\nactual:   {a}"
+    tests = [
+        ("f(t) = g*t\ng = 2\nf(3) f(3) f(3.0)", "6 6 6.0", CacheStatistics(1, 2, 0, 0)),
+        ("f(t) = g*t\ng = 2\nf(3)\ng = 3\nf(3)", "6 9", CacheStatistics(0, 2, 0, 1)),
+        ("f(t) = g*t\nh(t) = f(t) + 1\ng = 1\nh(1) h(1)\ng = 2\nh(1)", "2 2 3", CacheStatistics(1, 4, 0, 2)),
+        ("f(t) = t\nf(1) f(2) f(3) f(1)", "1 2 3 1", CacheStatistics(0, 4, 2, 0)),
+        ("f(t) = -t\nf(0.0) f(-0.0)", "-0.0 0.0", CacheStatistics()),
+        ("k(x, y) = x(y)\nk(abs, 1) k(abs, 1)", "1 1", CacheStatistics()),
+        ("f(t) = t\nf() = 1\nf()", "1", CacheStatistics(0, 1, 0, 0)),
+    ]
+    for s, e, st in tests:
+        interpreter = Interpreter(memo_size=2)
+        if (a := run(s, interpreter)) != e or interpreter.memo_statistics != st:
+            return f"failed at {s!r}\nexpected: {e} {st}\nactual:   {a} {interpreter.memo_statistics}"
+    # rebound functions are dropped from the tables keyed by their ids
+    for options in ({"memo_size": 1000}, {"native": True}, {"memo_size": 1000, "native": True}):
+        interpreter = Interpreter(**options)
+        for k in range(2000):
+            run(f"f(x) = x + {k}\ng(x) = f(x) * 2\ng(1) g(2)", interpreter)
+        if (a := run("g(1)", interpreter)) != "4000" or interpreter._tables() > 2 * 256:
+            return f"failed at rebinding 2000 times with {options}\nexpected: 4000\nactual:   {a} with {interpreter._tables()} table entries"
+
+def frames() -> str | None:
+    # deeper than Python's recursion limit
+    depth = 5000
+    names = ["f" + "".join(chr(ord("a") + i // 26 ** k % 26) for k in range(3)) for i in range(depth)]
+    chain = f"{names[0]}(x) = x + 1\n" + "".join(f"{n}(x) = {m}(x) + 1\n" for m, n in zip(names, names[1:]))
+    for compact in (False, True):
+        for s, e in [(chain + f"{names[-1]}(0)", str(depth)), (chain + f"{names[-1]}(max)", "InterpreterError: {arg} cannot be applied to callable")]:
+            if (a := run(s, optimize=False, compact=compact)) != e:
+                return f"failed at {s[-40:]!r}\nexpected: {e}\nactual:   {a}"
+    for options in ({}, {"native": True}):
+        if (a := run("f(x) = f(x) + 1\nf(1)", Interpreter(**options))) != (e := "CallDepthError: maximum call depth exceeded"):
+            return f"failed at unbounded recursion with {options}\nexpected: {e}\nactual:   {a}"
+    tests = [
+        ("f(x) = x + g(x)\ng(y) = y * 2\nf(3)", "9"),
+        ("f(x, y) = x - y\ng(x) = f(x, 1) * f(1, x)\ng(3)", "-4"),
+        ("f(x) = y\nf(1)", "InterpreterError: unknown name `y`"),
+    ]
+    for s, e in tests:
+        if (a := run(s)) != e:
+            return f"failed at {s!r}\nexpected: {e}\nactual:   {a}"
+
+def inlining() -> str | None:
+    for s, e in INTERPRETER_TESTS:
+        for options in ({}, {"native": True}, {"memo_size": 2}):
+            if (a := run(s, Interpreter(**options), inliner=Inliner())) != e:
+                return f"failed at {s!r} with {options}\nexpected: {e}\nactual:   {a}"
+    tests = [
+        ("f(x) = x*2\nh(x) = f(3) + x\nh(1)", "7", InliningStatistics(1, 1)),
+        ("f(t, v, s) = v*t + s\nh(t) = f(t, 2, 1)\nk(t) = h(t) * h(2)\nk(1) k(0.5)", "15 10.0", InliningStatistics(3, 2)),
+        # rebinding the callee falls back to a real call
+        ("f(x) = x*2\nh(x) = f(x) + 1\nh(1)\nf(x) = x*3\nh(1)\nf = abs\nh(-1)\nf = 2\nh(1)",
+            "InterpreterError: called non-callable", InliningStatistics(1, 1)),
+        ("f(x) = x*2\nh(x) = f(x) + 1\nh(1)\nf(x) = x*3\nh(1)\nf = abs\nh(-1)", "3 4 2", InliningStatistics(1, 1)),
+        ("f(x) = x*2\nh(x) = f(x) + 1\nf = 1\nh(1)", "InterpreterError: called non-callable", InliningStatistics(1, 1)),
+        ("h(x) = f(x) + 1\nf(x) = x*2\nh(1)", "3", InliningStatistics(0, 0)),
+        # arguments that could raise or repeat work are not substituted
+        ("f(x) = x*x\nh(x) = f(-x) + f(y)\ny = 2\nh(3)", "13", InliningStatistics(0, 0)),
+        ("f(x) = 1\nh(x) = f(x, x)\nh(1)", "InterpreterError: call with {actual} parameters instead of {expected}", InliningStatistics(0, 0)),
+        # the callee's globals must not be captured by the caller's parameters
+        ("f(x) = x + g\ng = 1\nh(g) = f(g)\nh(5)", "6", InliningStatistics(0, 0)),
+        ("k(x, y) = x(y)\nh(y) = k(abs, y)\nm(q) = k(q, -3)\nm(abs) h(-2)", "3 2", InliningStatistics(1, 1)),
+        ("f(x) = x + 1\nh(x) = f(x)\nh(max)", "InterpreterError: {arg} cannot be applied to callable", InliningStatistics(1, 1)),
+        ("f(x) = 1 / x\nh(x) = f(0) + x\nh(1)", "ZeroDivisionError: division by zero", InliningStatistics(1, 1)),
+    ]
+    for s, e, st in tests:
+        for compact in (False, True):
+            inliner = Inliner()
+            if (a := run(s, compact=compact, inliner=inliner)) != e or inliner.statistics != st:
+                return f"failed at {s!r}\nexpected: {e} {st}\nactual:   {a} {inliner.statistics}"
+            if (a := run(s, Interpreter(native=True), compact=compact, inliner=Inliner())) != e:
+                return f"failed at {s!r} with native\nexpected: {e}\nactual:   {a}"
+    # nesting is only limited by memory, as in the parser
+    depth = 100_000
+    for s, e in [("f(" * depth + "x" + ")" * depth, str(depth + 2)), ("(" * depth + "f(x) + 1" + ")" * depth, "4")]:
+        for compact in (False, True):
+            inliner = Inliner()
+            if (a := run("f(y) = y + 1\nh(x) = " + s + "\nh(2)", compact=compact, inliner=inliner)) != e or inliner.statistics != InliningStatistics(1, 1):
+                return f"failed at {s[:20]!r}... nested {depth} deep\nexpected: {e}\nactual:   {a} {inliner.statistics}"
+
+def sharing() -> str | None:
+    tests = INTERPRETER_TESTS + [
+        ("p(t, a, b) = (t*t+1)*a + (t*t+1)*b - (a*b+t)/(t*t+1)\np(2, 3, 4) p(0.5, 1, 2)", "32.2 1.75"),
+        ("a = 2\nb = 3\n(a+b)*(a+b)*(a+b) (a*b - -a) + (a*b - -a)", "125 16"),
+        ("f(x) = (x*x+1) + (x*x+1)\nf(max)", "InterpreterError: {arg} cannot be applied to callable"),
+        ("f(x) = (1/x + 1) * (1/x + 1)\nf(0)", "ZeroDivisionError: division by zero"),
+        ("h(x) = (x + g(x)*2) * (x + g(x)*2)\ng(x) = x + 1\nh(1)", "25"),
+    ]
+    for s, e in tests:
+        for compact in (False, True):
+            for options in ({}, {"native": True}, {"memo_size": 2}, {"incremental": True}):
+                if (a := run(s, Interpreter(**options), compact=compact, cse=True)) != e:
+                    return f"failed at {s!r} with {options}\nexpected: {e}\nactual:   {a}"
+    # a builtin that rebinds a global between two occurrences of it
+    interpreters = []
+    def bump(x: Value) -> Value:
+        interpreters[0].globals["g"] = Value(ValueType.INT, 10)
+        return x
+    for options in ({}, {"native": True}, {"memo_size": 2}, {"incremental": True}):
+        interpreters[:] = Interpreter([("bump", bump)], **options),
+        if (a := run("g = 1\nf(x) = g*x + bump(x) + g*x\nf(2)", interpreters[0], cse=True)) != "24":
+            return f"rebinding builtin with {options} gave {a}"
+    tests = [
+        ("f(t, a, b) = (t*t+1)*a + (t*t+1)*b", 1),
+        ("(a+b)*(a+b)*(a+b) + (a*b + 1)", 2),
+        ("y = (a*b - c)/(a*b - c)", 1),
+        # calls may be impure, and 0.0 == -0.0 and 2 == 2.0 are different literals
+        ("f(x)*2 + f(x)*2", 0),
+        ("x*0.0 + x*-0.0 + x*2 + x*2.0", 0),
+        # sharing `-a` twice does not pay for its STORE_LOCAL
+        ("-a*2 + -a", 0),
+        ("a*b + a*b", 1),
+        # a call may rebind globals, not parameters
+        ("a*b + f(1) + a*b", 0),
+        ("f(x, a) = a*x + g(x) + a*x", 1),
+    ]
+    for s, e in tests:
+        statistics = Statistics()
+        code = compile(next(Parser(Tokenizer(s))), statistics=statistics, cse=True)
+        if code[0].type is InstructionType.FUNCTION:
+            code = code[0].argument[1]
+        if (a := sum(i.type is InstructionType.LOAD_LOCAL for i in code)) != e or statistics.shared != e:
+            return f"failed at {s!r}\nexpected {e} shared subexpressions\nactual:   {a} {code}"
+
+def specialization() -> str | None:
+    tests = INTERPRETER_TESTS + [
+        ("f(x, y) = x*y + x*2 - -y\nf(3, 4) f(1.5, max)", "InterpreterError: {arg} cannot be applied to callable"),
+        ("f(x, y) = x*y + x*2 - -y\nf(3, 4) f(abs, 2)", "InterpreterError: {arg} cannot be applied to callable"),
+        ("f(x) = x*2 + x**x - x/x + x//x\nf(3) f(0.5) f(0)", "ZeroDivisionError: division by zero"),
+        ("g = 2\nh(x) = g*x + g\nk(x) = g*x + max(g, x)*g\nh(3) k(3)", "8 12"),
+        ("p(t, a) = (t*t+1)*a + (t*t+1)/a\np(2, 5)", "26.0"),
+    ]
+    for s, e in tests:
+        for compact in (False, True):
+            for options in ({}, {"native": True}, {"memo_size": 2}, {"incremental": True}):
+                for cse in (False, True):
+                    if (a := run(s, Interpreter(**options), compact=compact, cse=cse, specialize=True)) != e:
+                        return f"failed at {s!r} with {options}\nexpected: {e}\nactual:   {a}"
+    tests = [
+        ("f(t, v, s) = -1/2*g*t**2+v*t+s", 2, 2), # the products after `t**2`, and the sum of two results
+        ("f(x) = -x*x*x + x", 3, 3),
+        ("f(x) = 2*(3+x)", 1, 1),
+        ("f(x) = x + 1", 0, 0),
+        # a call may rebind globals, not parameters: `g` is checked again in `h(x)*g`
+        ("f(x) = g*x + h(x)*g + x*g", 3, 3),
+        ("f(x) = g*x + h(x) + x*g", 1, 1),
+        ("f(x) = (x*x+1)*(x*x+1)", 4, 2),
+    ]
+    for s, *expected in tests:
+        for cse, e in zip((False, True), expected):
+            statistics = Statistics()
+            code = compile(next(Parser(Tokenizer(s))), statistics=statistics, cse=cse, specialize=True)[0].argument[1]
+            if (a := sum(i.type is InstructionType.ARITHMETIC for i in code)) != e or statistics.specialized != e:
+                return f"failed at {s!r} with {cse=}\nexpected {e} specialized operations\nactual:   {a} {code}"
+    if arrays.numpy is not None:
+        interpreter = Interpreter()
+        run("p(x, y) = x**y + x//y - x/y + -x*y", interpreter, specialize=True)
+        xs = [-3, -2, -1, 1, 2, 3]
+        a = interpreter.call("p", xs, xs).tolist()
+        if a != (e := [interpreter.call("p", x, x) for x in xs]):
+            return f"failed on arrays\nexpected: {e}\nactual:   {a}"
+        try:
+            a = repr(interpreter.call("p", xs, [1, 0, 1, 1, 1, 1]))
+        except ZeroDivisionError as error:
+            a = repr(error)
+        if a != "ZeroDivisionError('division by zero')":
+            return f"failed on arrays\nexpected: ZeroDivisionError('division by zero')\nactual:   {a}"
+
+def profiling() -> str | None:
+    for s, e in INTERPRETER_TESTS:
+        for compact in (False, True):
+            for options in ({}, {"native": True}, {"memo_size": 2}):
+                for profiler in (Profiler(), Profiler(0.001)):
+                    if (a := run(s, Interpreter(profiler=profiler, **options), compact=compact)) != e:
+                        return f"failed at {s!r} with {options} and {profiler.summary()['mode']} profiling\nexpected: {e}\nactual:   {a}"
+    script = "f(t, v, s) = -1/2*g*t**2+v*t+s\nh(t)=f(t, 0, 0)\ng=9.81\nk(x)=h(x)+1/x\nk(2) f(1, 5, 5) clamp(k(2), 1, 2) k(0)"
+    # the body of `k(0)` raises at DIV, but counts as a whole
+    instructions = {"LOAD": 15, "STORE": 4, "PARAM": 25, "CALL": 11, "OPERATION": 30, "INT": 21, "FLOAT": 5, "FUNCTION": 3}
+    operations = {"ADD": 11, "MULT": 12, "DIV": 3, "POW": 4}
+    functions = {"f": 4, "h": 3, "k": 3, "clamp": 1}
+    paths = {"k", "k;h", "k;h;f", "f", "clamp"}
+    for compact in (False, True):
+        profiler = Profiler()
+        if (a := run(script, Interpreter(profiler=profiler), compact=compact)) != "ZeroDivisionError: division by zero":
+            return f"profiled script returned {a}"
+        summary = loads(profiler.json())
+        if summary["instructions"] != instructions or summary["operations"] != operations:
+            return f"counted {summary['instructions']} {summary['operations']}\nexpected {instructions} {operations}"
+        if {f["name"]: f["calls"] for f in summary["functions"]} != functions:
+            return f"counted calls {summary['functions']}\nexpected {functions}"
+        if any(not 0 <= f["exclusive"] <= f["inclusive"] for f in summary["functions"]):
+            return f"inconsistent times {summary['functions']}"
+        if {line.rsplit(" ", 1)[0] for line in profiler.collapsed().splitlines()} - paths:
+            return f"collapsed stacks {profiler.collapsed()!r}\nexpected paths {paths}"
+        if profiler._stack:
+            return "calls left active after an error"
+    profiler = Profiler(0.001)
+    with profiler:
+        run(script.replace("k(0)", "k(1)"), Interpreter(profiler=profiler, native=True))
+    summary = profiler.summary()
+    if summary["mode"] != "sampling" or summary["instructions"] or {f["name"]: f["calls"] for f in summary["functions"]} != functions:
+        return f"sampled {summary}"
+
+def optimizer() -> str | None:
+    tests = [
+        ("-1/2*g", [
+            Instruction(InstructionType.FLOAT, -0.5),
+            Instruction(InstructionType.LOAD, "g"),
+            Instruction(InstructionType.OPERATION, Operation.MULT),
+        ], 3),
+        ("2**10 + 1/2 + 7//2", [Instruction(InstructionType.FLOAT, 1027.5)], 10),
+        ("(1/0)*1", [
+            Instruction(InstructionType.INT, 1),
+            Instruction(InstructionType.INT, 0),
+            Instruction(InstructionType.OPERATION, Operation.DIV),
+        ], 2),
+        ("x*1", [
+            Instruction(InstructionType.LOAD, "x"),
+            Instruction(InstructionType.INT, 1),
+            Instruction(InstructionType.OPERATION, Operation.MULT),
+        ], 0),
+        ("----x", [
+            Instruction(InstructionType.LOAD, "x"),
+            Instruction(InstructionType.OPERATION, Operation.NEG),
+            Instruction(InstructionType.OPERATION, Operation.NEG),
+        ], 2),
+        ("---(x+1)", [
+            Instruction(InstructionType.LOAD, "x"),
+            Instruction(InstructionType.INT, 1),
+            Instruction(InstructionType.OPERATION, Operation.ADD),
+            Instruction(InstructionType.OPERATION, Operation.NEG),
+        ], 2),
+    ]
+    for s, e, r in tests:
+        statistics = Statistics()
+        a = compile(next(Parser(Tokenizer(s))), statistics=statistics)
+        if a != e or statistics.removed != r:
+            return f"failed at {s!r}\nexpected: {e} ({r} removed)\nactual:   {a} ({statistics.removed} removed)"
+    same = [
+        "x = -0.0\nx + 0 x - 0 x * 1 (x * 1) + 0",
+        "x = 3\n(x + 0) + 0 --x 2**-1 (x*2)**1 1*(x/1)",
+        "(-8)**(1/3)",
+        "f(x) = 2**1000 // 3**500 + x*1\nf(2)",
+        "0**-1", "max*1", "--max", "f(x) = -(-x)\nf(abs)",
+    ]
+    for s in same:
+        if (a := run(s)) != (e := run(s, optimize=False)):
+            return f"failed at {s!r}\nexpected: {e}\nactual:   {a}"
+
+def array() -> str | None:
+    if arrays.numpy is None:
+        return None
+    interpreter = Interpreter()
+    run("g = 9.81\nf(t, v, s) = -1/2*g*t**2+v*t+s\np(x, y) = x**y + x//y - x/y\n"
+        "b(x) = clamp(x, -2, 2) + sign(x) + abs(x) + max(x, 1) + min(1, x) + int(x) + float(x)", interpreter)
+    xs = [-3, -2, -1, 1, 2, 3]
+    tests = [
+        ("f", (xs, 3.0, 1)),
+        ("f", (2.5, xs, xs)),
+        ("p", (xs, xs)),
+        ("p", ([float(x) for x in xs], 2)),
+        ("b", (xs,)),
+        ("b", ([x / 2 for x in xs],)),
+    ]
+    for name, args in tests:
+        actual = interpreter.call(name, *args)
+        for i, a in enumerate(actual):
+            e = interpreter.call(name, *(x[i] if isinstance(x, list) else x for x in args))
+            if a != e or isinstance(e, int) != (actual.dtype.kind == "i"):
+                return f"failed at {name}{args} [{i}]\nexpected: {e!r}\nactual:   {a!r}"
+    # where int64 would overflow, and for complex results, elements are computed as scalars
+    script = "q(x) = x**30 - x*x*x\nr(x) = x - 9223372036854775807 - 9223372036854775807\ns(x) = x**0.5 + int(x**3)"
+    tests = [("q", [3, 10, -7]), ("r", [-1, 1]), ("s", [-4.0, 2.25])]
+    for specialize in (False, True):
+        overflowing = Interpreter()
+        run(script, overflowing, specialize=specialize)
+        for name, xs in tests:
+            if (a := list(overflowing.call(name, xs))) != (e := [overflowing.call(name, x) for x in xs]):
+                return f"failed at {name}({xs})\nexpected: {e}\nactual:   {a}"
+        limited = Interpreter(budget=Budget(bits=64))
+        run(script, limited, specialize=specialize)
+        try:
+            a = limited.call("q", [3, 10])
+        except BudgetExceeded as error:
+            a = error
+        if a != BudgetExceeded("integer size limit exceeded"):
+            return f"failed at q([3, 10]) with 64 bits\nactual:   {a!r}"
+    errors = [
+        ("p", ([1, 2], [1, 0]), "ZeroDivisionError('division by zero')"),
+        ("clamp", ([1, 2], [0, 3], [2, 2]), "InterpreterError(explaination=\"builtin raised InterpreterError(explaination='cannot `clamp()` between lo=array([0, 3]) and hi=array([2, 2])')\")"),
+    ]
+    for name, args, e in errors:
+        try:
+            a = repr(interpreter.call(name, *args))
+        except (InterpreterError, ArithmeticError) as error:
+            a = repr(error)
+        if a != e:
+            return f"failed at {name}{args}\nexpected: {e}\nactual:   {a}"
+
+def differentiation() -> str | None:
+    script = (
+        "g = 9.81\nf(t, v, s) = -1/2*g*t**2+v*t+s\nh(t) = f(t, 0, 0)\nk(x) = h(x) + 1/x\n"
+        "p(x) = x**0.5 + 2**x\nq(x, y) = x**y - x//y\nn(x) = -x*-x - -x\nc(x) = 3\nz(x) = float(x)*int(x) + sign(x)\n"
+        "r(x, y) = abs(x - y) + max(x, y)*2 + min(x, 3) + clamp(x*y, 0, 10)\ni(x) = x"
+    )
+    tests = [
+        ("f", (2, 5, 5), -4.62, (-14.62, 2, 1)),
+        ("k", (2,), -19.12, (-19.87,)),
+        ("p", (4,), 18.0, (0.25 + 16 * 0.6931471805599453,)),
+        ("p", (0.25,), 0.5 + 2**0.25, (1.0 + 2**0.25 * 0.6931471805599453,)),
+        ("q", (2, 3), 8, (12, 8 * 0.6931471805599453)),
+        ("q", (0, 2.5), 0.0, (0.0, 0.0)),
+        ("n", (3,), 12, (7,)),
+        ("c", (1.5,), 3, (0,)),
+        ("z", (2.5,), 6.0, (2.0,)),
+        # piecewise, ties take the derivative of the branch the builtin returns
+        ("r", (1, 4), 16, (4, 4)),
+        ("r", (3, 5), 25, (-1, 3)),
+        ("r", (-2, 0.5), 1.5, (0, 3)),
+        ("i", (7,), 7, (1,)),
+    ]
+    for options in ({}, {"native": True}, {"memo_size": 2}):
+        interpreter = Interpreter(**options)
+        run(script, interpreter)
+        for name, args, e, de in tests:
+            a, da = interpreter.gradient(name, *args)
+            if not isclose(a, e) or len(da) != len(de) or not all(map(isclose, da, de)):
+                return f"failed at {name}{args} with {options}\nexpected: {e} {de}\nactual:   {a} {da}"
+            if interpreter.call(name, *args) != a:
+                return f"failed at {name}{args} with {options}\nvalue {a} differs from {interpreter.call(name, *args)}"
+    errors = [
+        ("k", (0,), "ZeroDivisionError('division by zero')"),
+        ("p", (0,), "ZeroDivisionError('0.0 cannot be raised to a negative power')"),
+        ("f", (1, 2), "InterpreterError(explaination='call with {actual} parameters instead of {expected}')"),
+        ("max", (1, 2), "InterpreterError(explaination='`max` is not a user function')"),
+        ("y", (1,), "InterpreterError(explaination='unknown name `y`')"),
+        ("i", (max,), "TypeError('expected a number, got <built-in function max>')"),
+    ]
+    for name, args, e in errors:
+        try:
+            a = repr(interpreter.gradient(name, *args))
+        except (InterpreterError, ArithmeticError, TypeError) as error:
+            a = repr(error)
+        if a != e:
+            return f"failed at {name}{args}\nexpected: {e}\nactual:   {a}"
+
+def higher_order() -> str | None:
+    script = "f(x) = x**2\ng(x) = 1/(1+x*x)\nh(x) = x**3 - 2*x - 5\nk(n) = 1/n**2\nc(a) = integrate(f, 0, a) - 9\np(q) = integrate(q, 0, 1)\n"
+    tests = [
+        ("integrate(f, 0, 3)", 9.0),
+        ("integrate(f, 3, 0)", -9.0),
+        ("integrate(f, 1, 1)", 0.0),
+        ("integrate(g, 0, 1)*4", 3.141592653589793),
+        ("s(x) = x**-0.5\nintegrate(s, 0, 1)", 2.0),
+        ("integrate(abs, -1, 2)", 2.5),
+        ("p(f)", 1 / 3),
+        ("solve(h, 2, 3)", 2.0945514815423265),
+        ("solve(h, 3, 2)", 2.0945514815423265),
+        ("solve(c, 1, 4)", 3.0),
+        ("solve(f, 0, 1)", 0),
+        ("sum(k, 1, 1000)", 1.6439345666815615),
+    ]
+    exact = [
+        ("sum(f, 1, 10) sum(f, 5, 1) sum(f, -2, -2)", "385 0 4"),
+        ("r(x) = 1/x**3\nintegrate(r, -1, 2)", "InterpreterError: builtin raised ValueError('`integrate()` did not converge')"),
+        ("integrate(1, 0, 1)", "InterpreterError: builtin raised InterpreterError(explaination='called non-callable')"),
+        ("integrate(f, max, 1)", "InterpreterError: builtin raised InterpreterError(explaination='bounds of `integrate()` must be numbers')"),
+        ("t(x, y) = x\nsolve(t, 0, 1)", "InterpreterError: builtin raised InterpreterError(explaination='call with {actual} parameters instead of {expected}')"),
+        ("solve(f, 1, 2)", "InterpreterError: builtin raised ValueError('`solve()` needs a sign change between its bounds')"),
+        ("sum(f, 1, 2.5)", "InterpreterError: builtin raised InterpreterError(explaination='bounds of `sum()` must be integers')"),
+        ("u(x) = max\nsum(u, 1, 2)", "InterpreterError: builtin raised InterpreterError(explaination='function returned a callable')"),
+        ("u(x) = max\nintegrate(u, 1, 2)", "InterpreterError: builtin raised InterpreterError(explaination='function returned a callable')"),
+        # errors of user code called back pass through builtins as they are
+        ("u(x) = integrate(abs, 0, max)\nsum(u, 1, 2)", "InterpreterError: builtin raised InterpreterError(explaination='bounds of `integrate()` must be numbers')"),
+        ("u(x) = 1 // (x - 2)\nsum(u, 1, 3)", "ZeroDivisionError: integer division or modulo by zero"),
+        ("u(x) = sum(u, 1, 2)\nu(1)", "CallDepthError: maximum call depth exceeded"),
+    ]
+    numpy = arrays.numpy
+    try:
+        # with NumPy integrals are evaluated in batches, without one point at a time
+        for arrays.numpy in {numpy, None}:
+            for options in ({}, {"native": True}, {"memo_size": 2}, {"profiler": Profiler()}):
+                for s, e in tests:
+                    a = run(script + s, Interpreter(**options))
+                    try:
+                        close = isclose(float(a), e, rel_tol=1e-9)
+                    except ValueError:
+                        close = False
+                    if not close:
+                        return f"failed at {s!r} with {options}\nexpected: {e}\nactual:   {a}"
+                for s, e in exact:
+                    if (a := run(script + s, Interpreter(**options))) != e:
+                        return f"failed at {s!r} with {options}\nexpected: {e}\nactual:   {a}"
+    finally:
+        arrays.numpy = numpy
+    interpreter = Interpreter(memo_size=4)
+    run(script + "m(a) = integrate(f, 0, a)\nm(2) m(2)", interpreter)
+    if interpreter.memo_statistics.hits != 1:
+        return f"integrals of pure functions are not memoized: {interpreter.memo_statistics}"
+
+def incremental() -> str | None:
+    for s, e in INTERPRETER_TESTS:
+        if (a := run(s, Interpreter(incremental=True))) != e:
+            return f"failed at {s!r}\nexpected: {e}\nactual:   {a}"
+    script = ["f(t, v, s) = -1/2*g*t**2+v*t+s", "h(t) = f(t, 0, 0)", "g = 9.81", "u = 5", "y = h(1)", "z = y*2 + u", "w = 1/g", "v = u"]
+    tests = [
+        ("g = 10", "y z w", "-5.0 -5.0 0.1", [("g", "10"), ("w", "0.1"), ("y", "-5.0"), ("z", "-5.0")], UpdateStatistics(1, 3, 4)),
+        ("g = 9.81", "y z w", "-4.905 -4.8100000000000005 0.1019367991845056", [], UpdateStatistics(1, 0, 0)),
+        ("u = 1", "z v", "-8.81 1", [("u", "1"), ("v", "1"), ("z", "-8.81")], UpdateStatistics(1, 2, 3)),
+        ("f(t, v, s) = t", "y z", "1 7", [("f", "<function object>"), ("y", "1"), ("z", "7")], UpdateStatistics(1, 2, 3)),
+        ("g = 0", "y z w", "InterpreterError: unknown name `w`", [("g", "0"), ("w", "None"), ("y", "0.0"), ("z", "5.0")], UpdateStatistics(1, 3, 4)),
+        ("y = 1", "z", "7", [("y", "1"), ("z", "7")], UpdateStatistics(1, 1, 2)),
+    ]
+    for s, names, e, changes, st in tests:
+        interpreter = Interpreter(incremental=True)
+        run("\n".join(script), interpreter)
+        interpreter.update_statistics.__init__()
+        actual = []
+        interpreter.subscribe(lambda n, v: actual.append((n, str(v))))
+        run(s, interpreter)
+        if (a := run(names, interpreter)) != e or actual != changes or interpreter.update_statistics != st:
+            return f"failed at {s!r}\nexpected: {e} {changes} {st}\nactual:   {a} {actual} {interpreter.update_statistics}"
+    interpreter = Interpreter(incremental=True)
+    run("a = 1\nb = a + 1\na = b * 2", interpreter)
+    if (a := run("b a", interpreter)) != "5 4" or interpreter.dependencies("a") != {"b"}:
+        return f"failed at cycle\nexpected: 5 4\nactual:   {a}"
+
+def _decoded(instructions: list[Instruction] | Code) -> list[Instruction]:
+    return [Instruction(i.type, (i.argument[0], _decoded(i.argument[1]))) if i.type is InstructionType.FUNCTION else i for i in instructions]
+
+def bytecode() -> str | None:
+    options = [{}, {"native": True}, {"memo_size": 2}, {"incremental": True}]
+    for s, e in INTERPRETER_TESTS:
+        for o in options:
+            if (a := run(s, Interpreter(**o), compact=True)) != e:
+                return f"failed at {s!r} {o}\nexpected: {e}\nactual:   {a}"
+    text = "f(t, v, s) = -1/2*g*t**2+v*t+s\nh(t)=f(t, 0, 0)\ng=9.81\ng=0.0\ng=-0.0\nk(x, y) = x(y) + x(y)\n1 + 1.0 + 2**70"
+    for statement in Parser(Tokenizer(text)):
+        e = compile(statement)
+        code = compile(statement, compact=True)
+        if (a := _decoded(code)) != e or _decoded(encode(e)) != e:
+            return f"failed at {statement}\nexpected: {e}\nactual:   {a}"
+    code = compile(Parser(Tokenizer("a + a*a - 1 + 1")).__next__(), optimize=False, compact=True)
+    if code.names != ("a",) or code.constants != (1,) or code.nbytes() != 5 * len(code):
+        return f"failed at pools\nexpected: ('a',) (1,)\nactual:   {code.names} {code.constants}"
+
+def _execute(programs: list[Code]) -> str:
+    interpreter = Interpreter()
+    output = StringIO()
+    try:
+        for code in programs:
+            interpreter.execute(code)
+    except (InterpreterError, ArithmeticError) as e:
+        return f"{type(e).__name__}: {e}"
+    with redirect_stdout(output):
+        interpreter.output_stack()
+    return output.getvalue().strip().replace("\n", " ")
+
+def cache() -> str | None:
+    with TemporaryDirectory() as directory:
+        for s, e in INTERPRETER_TESTS:
+            first = ScriptCache(directory)
+            second = ScriptCache(directory)
+            for c, st in (first, ScriptCacheStatistics(0, 1, 0, 1)), (second, ScriptCacheStatistics(1, 0, 0, 0)):
+                programs = c.load(s)
+                if (a := _execute(programs)) != e or c.statistics != st:
+                    return f"failed at {s!r}\nexpected: {e} {st}\nactual:   {a} {c.statistics}"
+            if list(map(_decoded, programs)) != list(map(_decoded, compile_script(s))):
+                return f"failed at {s!r}\ndecoded code differs"
+        text = INTERPRETER_TESTS[0][0]
+        c = ScriptCache(directory)
+        c.load(text, optimize=False)
+        with open(c.path(text), "r+b") as f:
+            f.truncate(10)
+        c.load(text)
+        c.load(text)
+        if c.statistics != (st := ScriptCacheStatistics(1, 2, 1, 2)):
+            return f"failed at truncated entry\nexpected: {st}\nactual:   {c.statistics}"
+        with open(c.path(text), "r+b") as f:
+            data = bytearray(f.read())
+            data[-20] ^= 1
+            f.seek(0)
+            f.write(data)
+        # an entry that cannot be opened, like one without permission
+        remove(c.path(text, optimize=False))
+        mkdir(c.path(text, optimize=False))
+        c = ScriptCache(directory)
+        for optimize in (True, False):
+            if (a := _execute(c.load(text, optimize))) != (e := INTERPRETER_TESTS[0][1]):
+                return f"failed at damaged entry\nexpected: {e}\nactual:   {a}"
+        if c.statistics != (st := ScriptCacheStatistics(0, 2, 2, 1)):
+            return f"failed at damaged entries\nexpected: {st}\nactual:   {c.statistics}"
+        # entries of scripts with many functions load no slower than compiling them
+        names = ["f" + "".join(chr(ord("a") + i // 26 ** k % 26) for k in range(3)) for i in range(3000)]
+        text = "".join(f"{n}(a, b) = a*b - {i}\n{n}(1, 2)\n" for i, n in enumerate(names))
+        c.load(text)
+        cached = fresh = inf
+        for _ in range(3):
+            start = perf_counter()
+            _execute(c.load(text))
+            cached = min(cached, perf_counter() - start)
+            start = perf_counter()
+            _execute(compile_script(text))
+            fresh = min(fresh, perf_counter() - start)
+        if cached > fresh:
+            return f"failed at many functions\ncached: {cached:.3f}s, compiled: {fresh:.3f}s"
+
+def batch() -> str | None:
+    prelude = "f(t, v, s) = -1/2*g*t**2+v*t+s\nh(t)=f(t, 0, 0)\ng=9.81\n1 2"
+    queries = ["clamp(h(1), -10, 0)", "f(1, 5, 5)", "g = 1\nh(2)", "h(2)", "1/0", "x", "f(", "1 ;", "", "f() = 5\nf()", "f(1, 1, 1) 2", "10**5000", "r(x) = r(x)\nr(1)"]
+    expected = [
+        Result("-4.905"), Result("5.095"), Result("-2.0"), Result("-19.62"),
+        Result(None, "ZeroDivisionError: division by zero"), Result(None, "InterpreterError: unknown name `x`"),
+        Result(None, "ParserError: unexpected end of input"), Result(None, "TokenError: unknown token ';'"),
+        Result(""), Result("5"), Result("-2.9050000000000002 2"),
+        Result(None, "ValueError: Exceeds the limit (4300 digits) for integer string conversion; use sys.set_int_max_str_digits() to increase the limit"),
+        Result(None, "CallDepthError: maximum call depth exceeded"),
+    ]
+    for workers in 1, 2:
+        for chunk_size in 1, 4:
+            if (a := list(evaluate(prelude, queries * 3, workers, chunk_size))) != expected * 3:
+                return f"failed with {workers} workers, chunks of {chunk_size}\nexpected: {expected * 3}\nactual:   {a}"
+
+def budget() -> str | None:
+    prelude = "f(x) = x + 1\ng(x) = f(x)*2\n"
+    tests = [
+        ("9**9**9", Budget(bits=1 << 20), "BudgetExceeded: integer size limit exceeded"),
+        ("f(x) = x*x\nf(f(f(f(f(f(f(f(f(f(f(f(f(f(f(f(f(f(f(3)))))))))))))))))))", Budget(bits=1 << 16), "BudgetExceeded: integer size limit exceeded"),
+        ("f(x) = x**x\nf(9) f(10.0)", Budget(bits=30), "387420489 10000000000.0"),
+        ("f(x) = x**x\nf(10)", Budget(bits=30), "BudgetExceeded: integer size limit exceeded"),
+        ("x = 10**400\n2**x", Budget(bits=4096), "BudgetExceeded: integer size limit exceeded"),
+        ("f(x) = 2**x\nf(10**400)", Budget(bits=4096), "BudgetExceeded: integer size limit exceeded"),
+        ("f(x) = 3**x - 3**x\nf(2584)", Budget(bits=4096), "0"),
+        ("f(x) = 3**x - 3**x\nf(2585)", Budget(bits=4096), "BudgetExceeded: integer size limit exceeded"),
+        # the call statement runs 3 instructions, `g` 5 and `f` 3
+        (prelude + "g(1)", Budget(instructions=11), "4"),
+        (prelude + "g(1)", Budget(instructions=10), "BudgetExceeded: instruction limit exceeded"),
+        (prelude + "g(1) g(1)", Budget(instructions=11), "4 4"),
+        (prelude + "g(1)", Budget(depth=2), "4"),
+        (prelude + "g(1)", Budget(depth=1), "BudgetExceeded: call depth limit exceeded"),
+        ("f(x) = f(x)\nf(1)", Budget(depth=50), "BudgetExceeded: call depth limit exceeded"),
+        ("f(x) = f(x)\nintegrate(f, 0, 1)", Budget(depth=50), "BudgetExceeded: call depth limit exceeded"),
+        ("f(x) = x\nsum(f, 1, 100000000)", Budget(seconds=0.01), "BudgetExceeded: time limit exceeded"),
+        ("sum(abs, 1, 100000000000)", Budget(seconds=0.01), "BudgetExceeded: time limit exceeded"),
+        ("integrate(abs, 0, 1) sum(abs, 1, 100000000000)", Budget(seconds=0.01), "BudgetExceeded: time limit exceeded"),
+        # Python's stack runs out first, native translations call each other on it
+        ("f(x) = f(x)\nf(1)", Budget(depth=1000), "BudgetExceeded: call depth limit exceeded"),
+        ("f(x) = f(x)\nintegrate(f, 0, 1)", Budget(depth=100000), "BudgetExceeded: call depth limit exceeded"),
+    ]
+    for s, b, e in tests:
+        for compact in (False, True):
+            for options in ({}, {"native": True}, {"memo_size": 2}, {"incremental": True}):
+                for specialize in (False, True):
+                    if (a := run(s, Interpreter(**options, budget=b), compact=compact, specialize=specialize)) != e:
+                        return f"failed at {s!r} with {b} and {options}\nexpected: {e}\nactual:   {a}"
+    interpreter = Interpreter(budget=Budget(depth=1))
+    run(prelude, interpreter)
+    try:
+        a = interpreter.call("g", 1)
+    except InterpreterError as error:
+        a = error
+    if not isinstance(a, BudgetExceeded):
+        return f"failed at call\nactual:   {a!r}"
+    # a query is one evaluation, however many statements it has
+    queries = ["g(1)", "g(1) g(1)", "g(1)"]
+    expected = [Result("4"), Result(None, "BudgetExceeded: instruction limit exceeded"), Result("4")]
+    for workers in 1, 2:
+        if (a := list(evaluate(prelude, queries, workers, budget=Budget(instructions=11)))) != expected:
+            return f"failed with {workers} workers\nexpected: {expected}\nactual:   {a}"
+
+def snapshot() -> str | None:
+    prelude = "f(t, v, s) = -1/2*g*t**2+v*t+s\nh(t)=f(t, 0, 0)\ng=9.81"
+    for options in ({}, {"native": True}, {"memo_size": 2}, {"incremental": True}):
+        interpreter = Interpreter(**options)
+        run(prelude, interpreter)
+        snapshot = interpreter.snapshot()
+        bodies = dict(snapshot.bodies)
+        first, second = snapshot.context(), snapshot.context()
+        tests = [
+            (first, "h(1) g = 1\nh(2)", "-4.905 -2.0"),
+            (second, "h(2) k(x) = h(x)*2\nk(1)", "-19.62 -9.81"),
+            (first, "k(1)", "InterpreterError: unknown name `k`"),
+            (interpreter, "g = 2\nh(1)", "-1.0"),
+            (second, "h(1) k(1)", "-4.905 -9.81"),
+            (snapshot.context(), "h(1)", "-4.905"),
+        ]
+        for context, s, e in tests:
+            if (a := run(s, context)) != e:
+                return f"failed at {s!r} with {options}\nexpected: {e}\nactual:   {a}"
+        if options.get("native") and not all(snapshot.translations.values()):
+            return f"failed, the snapshot holds no translations: {snapshot.translations}"
+        if snapshot.bodies != bodies or str(snapshot.namespace["g"]) != "9.81" or "k" in snapshot.namespace:
+            return f"failed with {options}, the snapshot changed"
+        for context in first, second:
+            context.reset()
+            context.take_stack()
+        if (a := [run("h(1)", first), run("h(1)", second), run("k(1)", second)]) != (e := ["-4.905", "-4.905", "InterpreterError: unknown name `k`"]):
+            return f"failed at reset with {options}\nexpected: {e}\nactual:   {a}"
+    try:
+        Interpreter().reset()
+        return "failed, reset an interpreter without a snapshot"
+    except InterpreterError:
+        pass
+    queries = [f"x = {i}\nh(x) + x" if i % 3 else f"h({i}) x" for i in range(300)] + ["10**5000", "r(x) = r(x)\nr(1)", "h(1)"]
+    expected = list(evaluate(prelude, queries, 1))
+    for options in ({}, {"native": True}, {"memo_size": 2}):
+        for threads, chunk_size in (1, 1), (4, 1), (4, 16):
+            with ThreadPool(prelude, threads, **options) as pool:
+                if (a := list(pool.evaluate(queries, chunk_size))) != expected:
+                    return f"failed with {threads} threads, chunks of {chunk_size} and {options}\nexpected: {expected}\nactual:   {a}"
+
+async def _sessions(server: Server, socket: str, requests: list[list[str]]) -> list[list[str]]:
+    async def session(lines: list[str]) -> list[str]:
+        reader, writer = await asyncio.open_unix_connection(socket)
+        writer.write("".join(f"{line}\n" for line in lines).encode())
+        responses = [(await reader.readline()).decode().rstrip("\n") for _ in lines]
+        writer.close()
+        return responses
+    listener = await server.serve(socket)
+    async with listener:
+        return await asyncio.gather(*map(session, requests))
+
+def server() -> str | None:
+    requests = [
+        ["g", "g = 1", "h(2)", "x", "1/0 2", "1 ;", "h(2) h(1)"],
+        ["h(2)", "f(t, v, s) = t", "h(3)", "y = 2 y*y"],
+        ["g", "10**5000", "r(x) = r(x)", "r(1)", "1"],
+        # longer than the server's limit of 1 MiB
+        ["1", "1" * (3 << 20), "2"],
+    ]
+    expected = [
+        ["ok 9.81", "ok ", "ok -2.0", "err InterpreterError: unknown name `x`", "err ZeroDivisionError: division by zero", "err TokenError: unknown token ';'", "ok -2.0 -0.5"],
+        ["ok -19.62", "ok ", "ok 3", "ok 4"],
+        ["ok 9.81", "err ValueError: Exceeds the limit (4300 digits) for integer string conversion; use sys.set_int_max_str_digits() to increase the limit",
+            "ok ", "err CallDepthError: maximum call depth exceeded", "ok 1"],
+        ["ok 1", "err ServerError: line too long", "ok 2"],
+    ]
+    server = Server("f(t, v, s) = -1/2*g*t**2+v*t+s\nh(t)=f(t, 0, 0)\ng=9.81", max_concurrency=2)
+    try:
+        with TemporaryDirectory() as directory:
+            actual = asyncio.run(_sessions(server, path.join(directory, "socket"), requests))
+    finally:
+        server.close()
+    if actual != expected:
+        return f"failed\nexpected: {expected}\nactual:   {actual}"
+    if server.statistics.requests != 19 or server.statistics.errors != 6 or server.statistics.latency.total != 18:
+        return f"failed at statistics\nactual:   {server.statistics}"
+    server = Server(max_sessions=1)
+    try:
+        with TemporaryDirectory() as directory:
+            actual = asyncio.run(_sessions(server, path.join(directory, "socket"), [["1", ":stats"], ["2"]]))
+    finally:
+        server.close()
+    if loads(actual[0][1].removeprefix("ok "))["count"] != 1 or actual[1] != ["err ServerError: too many sessions"]:
+        return f"failed at limits\nactual:   {actual}"
 
 def test(name: str, function: Callable[[], str | None], errors: list[str]):
     result = function()
@@ -85,7 +931,27 @@ def test(name: str, function: Callable[[], str | None], errors: list[str]):
 def main():
     tests = [
         ("Tokenizer", tokenizer),
+        ("Stream", stream),
         ("Parser", parser),
+        ("Interpreter", interpreter),
+        ("Native", native),
+        ("Frames", frames),
+        ("Inlining", inlining),
+        ("Sharing", sharing),
+        ("Specialization", specialization),
+        ("Profiling", profiling),
+        ("Optimizer", optimizer),
+        ("Memo", memo),
+        ("Array", array),
+        ("Differentiation", differentiation),
+        ("Higher order", higher_order),
+        ("Budget", budget),
+        ("Incremental", incremental),
+        ("Bytecode", bytecode),
+        ("Cache", cache),
+        ("Batch", batch),
+        ("Snapshot", snapshot),
+        ("Server", server),
     ]
     errors = []
     for n, t in tests:
@@ -1,81 +1,195 @@
-from collections.abc import Callable
+from collections.abc import Iterator
 from dataclasses import dataclass
+from gc import disable, enable, isenabled
+from itertools import accumulate, islice, repeat
+from re import compile
 from tokens import Token, TokenType
-from typing import Self
+from typing import BinaryIO, TextIO
 
 @dataclass(frozen=True, slots=True)
 class TokenError(Exception):
     text: str
-    pos: int
+    pos: int # in the whole input
+    start: int = 0 # of `text` in the whole input
 
     def __str__(self) -> str:
-        text = self.text[self.pos:]
+        text = self.text[self.pos - self.start:]
         return f"unknown token {text!r}"
 
+# errors keep this much text around the position instead of the whole input
+_CONTEXT = 40
+
+def _error(text: str, pos: int, offset: int) -> TokenError:
+    start = max(0, pos - _CONTEXT)
+    return TokenError(text[start:pos + 1 + _CONTEXT], offset + pos, offset + start)
+
+_WHITESPACE = compile(r"[ \t\n]+")
+_IDENTIFIER = compile(r"[a-zA-Z_]+")
+_NUMBER = compile(r"([0-9]+)(\.[0-9]*)?|\.[0-9]+") # INT iff only group 1 matched
+_LETTERS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_"
+_DIGITS = "0123456789."
+
+_SIMPLE = {
+    "=": TokenType.EQ,
+    "(": TokenType.LPAR,
+    ")": TokenType.RPAR,
+    "+": TokenType.PLUS,
+    "-": TokenType.MINUS,
+    ",": TokenType.COMMA,
+}
+
+# dispatch on the first character of a token
+_ID, _NUM, _SPACE, _STAR, _SLASH = range(5)
+_KIND = {
+    **dict.fromkeys(_LETTERS, _ID),
+    **dict.fromkeys(_DIGITS, _NUM),
+    **dict.fromkeys(" \t\n", _SPACE),
+    "*": _STAR,
+    "/": _SLASH,
+}
+
+# no token continues past one of these
+_BOUNDARY = compile(r"[ \t\n=(),+\-]")
+
+# characters that can continue a token, mapped to those that can be next to
+# them in one; no token spans the start of a run of them
+_RUNS = {**dict.fromkeys(_LETTERS, _LETTERS), **dict.fromkeys(_DIGITS, _DIGITS), "*": "*", "/": "/"}
+
+_OPERATORS = {
+    **_SIMPLE,
+    "**": TokenType.EXP,
+    "*": TokenType.MULT,
+    "//": TokenType.IDIV,
+    "/": TokenType.DIV,
+}
+
+# strings are scanned in pieces of about this many characters
+_PIECE = 1 << 16
+
+# captures the tokens that a scan one after another finds, in order,
+# leaving what is between them
+_TOKEN = compile(r"([a-zA-Z_]+|[0-9]+(?:\.[0-9]*)?|\.[0-9]+|\*\*?|//?|[=(),+\-])")
+_new = tuple.__new__
+
 class Tokenizer:
-    __slots__ = "_text", "_pos"
-
-    def __init__(self, text: str):
-        self._text = text
-        self._pos = 0
-
-    def _skip_while(self, pred: Callable[[str], bool]):
-        while self._pos < len(self._text) and pred(self._text[self._pos]):
-            self._pos += 1
-
-    def _simple_token(self) -> Token | None:
-        mapping = (
-            ("=",  TokenType.EQ),
-            ("(",  TokenType.LPAR),
-            (")",  TokenType.RPAR),
-            ("+",  TokenType.PLUS),
-            ("-",  TokenType.MINUS),
-            ("**", TokenType.EXP),
-            ("*",  TokenType.MULT),
-            ("//", TokenType.IDIV),
-            ("/",  TokenType.DIV),
-            (",",  TokenType.COMMA),
-        )
-        for s, t in mapping:
-            if self._text.startswith(s, self._pos):
-                start = self._pos
-                self._pos += len(s)
-                return Token(t, None, start)
-
-    def _identifier(self) -> Token | None:
-        start = self._pos
-        self._skip_while(lambda c: c in "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_")
-        return None if self._pos == start else Token(TokenType.ID, self._text[start:self._pos], start)
-
-    # TODO extend syntax
-    def _literal(self) -> Token | None:
-        start = self._pos
-        if (c := self._text[self._pos]).isdigit():
-            self._pos += 1
-            self._skip_while(lambda c: c.isdigit())
-            if self._pos == len(self._text) or self._text[self._pos] != ".":
-                return Token(TokenType.INT, int(self._text[start:self._pos]), start)
-            self._pos += 1
-        elif c != "." or self._pos + 1 == len(self._text) or not self._text[self._pos + 1].isdigit():
-            return None
+    __slots__ = "_tokens",
+
+    # `source` can also be a file object, including stdin and mmap objects,
+    # which is then read in chunks; bytes are taken as latin-1 so that
+    # positions are byte offsets
+    def __init__(self, source: str | TextIO | BinaryIO, chunk_size: int = 1 << 16):
+        if isinstance(source, str):
+            self._tokens = _scan(source)
         else:
-            self._pos += 2
-        self._skip_while(lambda c: c.isdigit())
-        return Token(TokenType.FLOAT, float(self._text[start:self._pos]), start)
+            self._tokens = _stream(source, chunk_size)
 
-    def __iter__(self) -> Self:
-        return self
+    def __iter__(self) -> Iterator[Token]:
+        return self._tokens
 
     def __next__(self) -> Token:
-        self._skip_while(lambda c: c in " \t\n")
-        if self._pos == len(self._text):
-            raise StopIteration
-        funcs = (
-            self._simple_token,
-            self._identifier,
-            self._literal,
-        )
-        for f in funcs:
-            if (t := f()) is not None:
-                return t
-        raise TokenError(self._text, self._pos)
+        return next(self._tokens)
+
+def _stream(source: TextIO | BinaryIO, chunk_size: int) -> Iterator[Token]:
+    # read1 returns what is available instead of waiting for a full chunk
+    read = getattr(source, "read1", None) or source.read
+    buffer = ""
+    offset = 0 # of `buffer` in the whole input
+    while chunk := read(chunk_size):
+        if chunk.__class__ is not str:
+            chunk = str(chunk, "latin-1")
+        buffer = buffer + chunk if buffer else chunk
+        # only the last run is carried, however few boundaries the text has
+        run = _RUNS.get(buffer[-1])
+        if cut := len(buffer) if run is None else len(buffer.rstrip(run)):
+            yield from _scan(buffer, offset, cut)
+            buffer = buffer[cut:]
+            offset += cut
+    yield from _scan(buffer, offset)
+
+# Tokens of text[:end] at positions shifted by `offset`, scanned in
+# pieces that end after a boundary.  A piece is scanned in bulk when
+# that covers it, and one token after another otherwise, which finds
+# the unknown token.
+def _scan(text: str, offset: int = 0, end: int | None = None) -> Iterator[Token]:
+    if end is None:
+        end = len(text)
+    # token texts repeat, so each is typed and converted once
+    types = dict(_OPERATORS)
+    values = dict.fromkeys(_OPERATORS)
+    start = 0
+    while start < end:
+        stop = end if (m := _BOUNDARY.search(text, start + _PIECE, end)) is None else m.end()
+        if (tokens := _bulk(text, start, stop, offset, types, values)) is None:
+            yield from _sequential(text, start, stop, offset)
+        else:
+            yield from tokens
+        start = stop
+
+# Splits the piece around its tokens and builds them in C from the parts.
+# These are the tokens a scan one after another finds iff only whitespace
+# is left between them.  Splitting creates no match objects, only
+# strings, which the garbage collector does not track.
+def _bulk(text: str, start: int, end: int, offset: int, types: dict[str, TokenType], values: dict[str, str | int | float | None]) -> list[Token] | None:
+    parts = _TOKEN.split(text[start:end])
+    if "".join(parts[::2]).strip(" \t\n"):
+        return None
+    texts = parts[1::2]
+    for new in set(texts).difference(types):
+        if _KIND[new[0]] == _ID:
+            types[new] = TokenType.ID
+            values[new] = new
+        elif new.isdigit():
+            types[new] = TokenType.INT
+            values[new] = int(new)
+        else:
+            types[new] = TokenType.FLOAT
+            values[new] = float(new)
+    # each token starts where the text before it ends
+    positions = islice(accumulate(map(len, parts), initial=offset + start), 1, None, 2)
+    tokens = map(_new, repeat(Token), zip(map(types.__getitem__, texts), map(values.__getitem__, texts), positions))
+    # all of them are kept, so collecting garbage while building them
+    # would only traverse them again and again
+    if not isenabled():
+        return list(tokens)
+    disable()
+    try:
+        return list(tokens)
+    finally:
+        enable()
+
+def _sequential(text: str, pos: int, end: int, offset: int) -> Iterator[Token]:
+    while pos < end:
+        c = text[pos]
+        if (t := _SIMPLE.get(c)) is not None:
+            yield Token(t, None, offset + pos)
+            pos += 1
+        elif (kind := _KIND.get(c)) == _ID:
+            m = _IDENTIFIER.match(text, pos)
+            yield Token(TokenType.ID, m[0], offset + pos)
+            pos = m.end()
+        elif kind == _NUM:
+            if (m := _NUMBER.match(text, pos)) is None:
+                raise _error(text, pos, offset)
+            if m.lastindex == 1:
+                yield Token(TokenType.INT, int(m[0]), offset + pos)
+            else:
+                yield Token(TokenType.FLOAT, float(m[0]), offset + pos)
+            pos = m.end()
+        elif kind == _SPACE:
+            pos = _WHITESPACE.match(text, pos).end()
+        elif kind == _STAR:
+            if text.startswith("**", pos):
+                yield Token(TokenType.EXP, None, offset + pos)
+                pos += 2
+            else:
+                yield Token(TokenType.MULT, None, offset + pos)
+                pos += 1
+        elif kind == _SLASH:
+            if text.startswith("//", pos):
+                yield Token(TokenType.IDIV, None, offset + pos)
+                pos += 2
+            else:
+                yield Token(TokenType.DIV, None, offset + pos)
+                pos += 1
+        else:
+            raise _error(text, pos, offset)
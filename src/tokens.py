@@ -1,5 +1,5 @@
-from dataclasses import dataclass, field
 from enum import auto, Enum
+from typing import NamedTuple
 
 class TokenType(Enum):
     ID    = auto()
@@ -16,11 +16,25 @@ class TokenType(Enum):
     DIV   = auto()
     COMMA = auto()
 
-@dataclass(frozen=True, slots=True)
-class Token:
+# A tuple, so that the tokenizer can build tokens in bulk with
+# `tuple.__new__`.  Tokens compare and hash without their positions.
+class Token(NamedTuple):
     type: TokenType
     value: str | int | float | None
-    pos: int = field(compare=False)
+    pos: int
+
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is not Token:
+            return NotImplemented
+        return self[0] is other[0] and self[1] == other[1]
+
+    def __ne__(self, other: object) -> bool:
+        if other.__class__ is not Token:
+            return NotImplemented
+        return self[0] is not other[0] or self[1] != other[1]
+
+    def __hash__(self) -> int:
+        return hash((self[0], self[1]))
 
     def __repr__(self) -> str:
         return f"Token({self.type}, {self.value!r})"